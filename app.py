@@ -1,27 +1,57 @@
+import functools
+import html
+import json
+
 import streamlit as st
 import pandas as pd
 from datetime import datetime
 
-from utils.battery_functions import (
-    add_battery,
-    delete_battery,
-    filter_inventory,
-    handover_status,
-    read_batteries,
-    scan_battery,
-    status_color,
-    update_voltage,
-)
+from utils.battery_functions import INVENTORY_SORT_COLUMNS, inventory_page, status_color
 from utils.stakeholder_functions import (
     add_stakeholder,
     delete_stakeholder,
     read_stakeholders,
     update_stakeholder,
 )
+from utils.excel_handler import read_upload
+from utils.instrumentation import begin_trace, end_trace, resume_trace, span
+from utils.exports import FORMATS as EXPORT_FORMATS, export_bytes, export_name
+from utils.kpis import bucket_counts, voltage_buckets
+from utils.mailer import get_mailer, send_subscription_reports
+from utils.reports import ACTIVITY_DAYS, FORECAST_DAYS, ReportBuilder
+from utils.schema import STATUSES
+from utils.subscriptions import FREQUENCIES
+from utils.sites import ALL_SITES, battery_api, get_sites
+from utils.thresholds import BUCKETS, PROFILES_JSON, get_profiles
 
 
 st.set_page_config(page_title="Volt Guard Buddy", layout="wide")
 
+# --- Diagnostics: optional per-rerun trace of table I/O and battery/stakeholder calls ---
+if st.sidebar.toggle("Diagnostics", key="vg_diagnostics", help="Time every storage call and battery/stakeholder function in this rerun"):
+    # The rerun finish() asks for after a write carries on the trace of the run that made the write
+    carried = st.session_state.pop("vg_trace", None)
+    rerun_trace = resume_trace(carried) if carried is not None else begin_trace(f"rerun {datetime.now():%Y-%m-%d %H:%M:%S}")
+else:
+    end_trace()
+    rerun_trace = None
+
+# --- Site: with VOLT_GUARD_SITES set, battery calls go to the chosen site or to every site ---
+sites = get_sites()
+site_choice = st.sidebar.selectbox("Site", [ALL_SITES, *sites.names], key="vg_site") if sites else None
+bf = battery_api(site_choice)
+# Battery ids are per site, so changes need a single site selected
+read_only = site_choice == ALL_SITES
+
+
+@st.cache_resource
+def start_workers():
+    """Start the process-wide background workers once, whichever tab or site is open."""
+    battery_api(ALL_SITES if sites else None).start_alerts()
+
+
+start_workers()
+
 # --- Global Styles (lightweight CSS to match provided wireframe look) ---
 st.markdown(
     """
@@ -46,6 +76,28 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
+BADGE_HTML = {
+    "green": "<span class='vg-badge badge-green'>Active</span>",
+    "yellow": "<span class='vg-badge badge-yellow'>Low</span>",
+    "red": "<span class='vg-badge badge-red'>Critical</span>",
+    "gray": "<span class='vg-badge badge-gray'>Unknown</span>",
+}
+
+EXPORT_LABELS = {
+    "filtered": "Filtered view",
+    "batteries": "All batteries",
+    "checks": "Check history",
+}
+
+SORT_LABELS = {
+    "id": "ID",
+    "product_number": "Product Number",
+    "current_voltage": "Voltage",
+    "last_checked_date": "Last Checked",
+    "status": "Status",
+    "total_checks": "Total Checks",
+}
+
 # --- Header ---
 st.markdown(
     "<div class='vg-container'><div class='vg-title'>🔋 Battery Management System</div><div class='vg-muted'>Monitor battery voltage, track maintenance schedules, and automate stakeholder notifications</div></div>",
@@ -54,15 +106,9 @@ st.markdown(
 
 # --- Dashboard KPIs ---
 def compute_dashboard():
-    b_df = read_batteries()
-    if b_df is None or b_df.empty:
-        return 0, 0, 0, 0
-    vol = pd.to_numeric(b_df["current_voltage"], errors="coerce")
-    total = len(b_df)
-    active = (b_df["status"].astype(str).str.lower() == "active").sum()
-    low = (vol.between(10.5, 11, inclusive="left")).sum()
-    need = (vol < 10.5).sum()
-    return int(total), int(active), int(low), int(need)
+    with span("app.compute_dashboard"):
+        kpis = bf.dashboard_kpis()
+    return kpis["total"], kpis["active"], kpis["low"], kpis["need_charging"]
 
 total_k, active_k, low_k, need_k = compute_dashboard()
 colk1, colk2, colk3, colk4 = st.columns(4)
@@ -88,31 +134,93 @@ with colk4:
     )
 
 
-tab_scanner, tab_inventory, tab_stakeholders, tab_reports = st.tabs(
-    ["Scanner", "Inventory", "Stakeholders", "Reports"]
-)
+# --- Tabs: only the open tab runs, and each widget group in it is a fragment, so
+# using a widget reruns just its group, not the header or the rest of the tab ---
+def rendered(name: str):
+    """Time each call of a render function as one span."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            with span(name, "render"):
+                return fn(*args, **kwargs)
+        return run
+    return wrap
+
+
+def finish(where: str, message: str, warning: str | None = None, details: pd.DataFrame | None = None) -> None:
+    """Rerun after a write so the KPIs and tables read before it catch up, then show `message` at `where`."""
+    st.session_state[f"vg_flash_{where}"] = (message, warning, details)
+    if rerun_trace is not None:
+        st.session_state["vg_trace"] = rerun_trace
+    st.rerun()
+
+
+def show_flash(where: str) -> None:
+    flash = st.session_state.pop(f"vg_flash_{where}", None)
+    if flash is not None:
+        message, warning, details = flash
+        st.success(message)
+        if warning:
+            st.warning(warning)
+        if details is not None and not details.empty:
+            st.dataframe(details, width="stretch", hide_index=True)
+
+
+@st.fragment
+@rendered("app.tab_scanner")
+def scanner_tab():
+    st.header("Scanner")
 
+    # Enter in the box (what a barcode scanner sends) scans like the button does
+    def request_scan():
+        st.session_state["scanner_submitted"] = True
 
-with tab_scanner:
-    st.header("Scanner")
-    identifier = st.text_input("Enter Product Number or Battery ID", key="scanner_input")
+    identifier = st.text_input("Enter Product Number or Battery ID", key="scanner_input", on_change=request_scan)
+    suggestion_slot = st.container()
     col1, col2 = st.columns([1, 1])
     with col1:
         scan_clicked = st.button("Scan / Find Battery")
     with col2:
-        add_clicked = st.button("Add New Battery")
-
-    if scan_clicked and identifier.strip():
-        found = scan_battery(identifier.strip())
-        if found is not None:
-            st.success(
-                f"Found Battery ID {found['id']} | Product {found['product_number']} | Voltage {found['current_voltage']} | Last Check {found['last_checked_date']}"
+        add_clicked = st.button("Add New Battery", disabled=read_only, help="Select a site to add batteries" if read_only else None)
+    show_flash("scanner")
+
+    scan_requested = scan_clicked or st.session_state.pop("scanner_submitted", False)
+    found = bf.scan_battery(identifier.strip()) if scan_requested and identifier.strip() else None
+    if found is not None:
+        found_v = "" if pd.isna(found["current_voltage"]) else f"{found['current_voltage']:.2f}V"
+        st.success(
+            f"Found Battery ID {found['id']} | Product {found['product_number']} | Voltage {found_v} | Last Check {found['last_checked_date']}"
+        )
+        # Across sites the match carries its site; its history lives there
+        found_api = battery_api(found["site"]) if "site" in found.index else bf
+        history = found_api.battery_history(int(found["id"]))
+        if not history.empty:
+            st.caption(f"{len(history)} check(s) on record, latest first")
+            st.dataframe(
+                history.head(10)[["checked_at", "voltage_reading", "voltage_during_check", "checked_by", "notes"]],
+                hide_index=True,
+                width="stretch",
             )
-        else:
-            st.warning("Battery not found. You can add it using 'Add New Battery'.")
+    elif scan_requested and identifier.strip():
+        st.warning("Battery not found. You can add it using 'Add New Battery'.")
     elif scan_clicked:
         st.error("Please enter a value to scan.")
 
+    # Autocomplete only while the input is not a battery that was just found
+    suggestions = (
+        bf.complete_product_number(identifier, 8)
+        if found is None and identifier.strip() and not identifier.strip().isdigit()
+        else []
+    )
+    if suggestions and suggestions != [identifier.strip()]:
+        def use_suggestion():
+            st.session_state["scanner_input"] = st.session_state["scanner_suggestion"] or st.session_state["scanner_input"]
+            st.session_state["scanner_suggestion"] = None
+            st.session_state["scanner_submitted"] = True
+
+        with suggestion_slot:
+            st.pills("Matching product numbers", suggestions, key="scanner_suggestion", on_change=use_suggestion)
+
     with st.expander("Add Battery"):
         pn = st.text_input("Product Number", key="add_pn")
         pm = st.text_input("Packing Month (YYYY-MM)", key="add_pm")
@@ -121,11 +229,55 @@ with tab_scanner:
             if not pn.strip():
                 st.error("Product Number is required.")
             else:
-                added = add_battery(pn.strip(), pm.strip() or None, float(iv) if iv else None)
-                st.success(f"Added Battery ID {added['id']} for product {added['product_number']}")
+                added = bf.add_battery(pn.strip(), pm.strip() or None, float(iv) if iv else None)
+                finish("scanner", f"Added Battery ID {added['id']} for product {added['product_number']}")
 
 
-with tab_inventory:
+@st.fragment
+@rendered("app.manifest_import")
+def manifest_import():
+    with st.expander("Import Supplier Manifest"):
+        st.markdown(
+            "<div class='vg-muted'>CSV or XLSX with a <b>product_number</b> column and optionally packing_month "
+            "and current_voltage. Product numbers already in stock or repeated in the file are skipped.</div>",
+            unsafe_allow_html=True,
+        )
+        if read_only:
+            st.caption("Select a site in the sidebar to import batteries.")
+        show_flash("manifest")
+        with st.form("manifest_form"):
+            manifest_file = st.file_uploader("Manifest File", type=["csv", "xlsx"])
+            manifest_pm = st.text_input("Packing Month (YYYY-MM, used when the file has none)")
+            manifest_sub = st.form_submit_button("Import Batteries", disabled=read_only)
+            if manifest_sub:
+                if manifest_file is None:
+                    st.error("Please choose a file to import.")
+                else:
+                    try:
+                        result = bf.import_batteries(
+                            read_upload(manifest_file, manifest_file.name),
+                            packing_month=manifest_pm.strip() or None,
+                        )
+                    except Exception as e:
+                        st.error(str(e))
+                    else:
+                        counts = result["status"].value_counts()
+                        inserted = result[result["status"] == "inserted"]
+                        skipped = result[result["status"] != "inserted"]
+                        finish(
+                            "manifest",
+                            f"Added {len(inserted)} batteries"
+                            + (f" (IDs {inserted['id'].min()}-{inserted['id'].max()})." if not inserted.empty else "."),
+                            f"Skipped {counts.get('duplicate', 0)} duplicate(s) and {counts.get('invalid', 0)} invalid row(s)."
+                            if not skipped.empty
+                            else None,
+                            skipped[["product_number", "status", "error"]],
+                        )
+
+
+@st.fragment
+@rendered("app.inventory_table")
+def inventory_table():
     st.markdown("<div class='vg-section-title'>Battery Inventory</div>", unsafe_allow_html=True)
     # Filters & Export
     fc1, fc2, fc3, fc4, fc5 = st.columns([2, 1, 1, 1, 1])
@@ -137,113 +289,122 @@ with tab_inventory:
         f_vmin = st.number_input("Min Voltage", value=0.0, step=0.1)
     with fc4:
         f_vmax = st.number_input("Max Voltage", value=100.0, step=0.1)
-    with fc5:
-        # Export button
-        bdf_export = read_batteries()
-        if bdf_export is None:
-            bdf_export = pd.DataFrame()
-        st.download_button(
-            label="Export CSV",
-            data=bdf_export.to_csv(index=False).encode("utf-8"),
-            file_name="battery_inventory.csv",
-            mime="text/csv",
-        )
-
-    inv_df = filter_inventory(
+    inv_filters = dict(
         product_query=f_product or None,
         status=f_status or None,
         voltage_min=f_vmin if f_vmin > 0 else None,
         voltage_max=f_vmax if f_vmax < 100 else None,
     )
+    with fc5:
+        # Export: the payload is only built when the button is clicked
+        with st.popover("Export"):
+            ex_dataset = st.selectbox(
+                "Data",
+                options=list(EXPORT_LABELS),
+                format_func=EXPORT_LABELS.get,
+                key="export_dataset",
+            )
+            ex_format = st.radio("Format", options=list(EXPORT_FORMATS), horizontal=True, key="export_format")
+            st.download_button(
+                label="Download",
+                data=functools.partial(bf.export_bytes if sites else export_bytes, ex_dataset, ex_format, inv_filters),
+                file_name=export_name(ex_dataset, ex_format),
+                mime=EXPORT_FORMATS[ex_format][0],
+                on_click="ignore",
+            )
+
+    inv_df = bf.filter_inventory(**inv_filters)
 
     # Metrics
+    if f_product or f_status or f_vmin > 0 or f_vmax < 100:
+        inv_counts = bucket_counts(inv_df)
+    else:
+        inv_counts = bf.dashboard_kpis()
     colm1, colm2, colm3, colm4 = st.columns(4)
     with colm1:
         st.metric("Total", len(inv_df))
-    with colm2:
-        st.metric("Red (<10.5V)", (pd.to_numeric(inv_df["current_voltage"], errors="coerce") < 10.5).sum())
-    with colm3:
-        st.metric(
-            "Yellow (10.5-11V)",
-            (
-                (pd.to_numeric(inv_df["current_voltage"], errors="coerce") >= 10.5)
-                & (pd.to_numeric(inv_df["current_voltage"], errors="coerce") < 11)
-            ).sum(),
-        )
-    with colm4:
-        st.metric("Green (>=11V)", (pd.to_numeric(inv_df["current_voltage"], errors="coerce") >= 11).sum())
-
-    # Render with style badges and days since check
-    def _badge(v: float | None) -> str:
-        c = status_color(v if v is not None else None)
-        label = (
-            "Active"
-            if c == "green"
-            else ("Low" if c == "yellow" else ("Critical" if c == "red" else "Unknown"))
+    # With threshold profiles the ranges differ by product, so they move to the tooltip
+    profiles = get_profiles()
+    for col, bucket in zip((colm2, colm3, colm4), ("red", "yellow", "green")):
+        title = bucket.capitalize() if len(profiles) else f"{bucket.capitalize()} ({profiles.label(bucket)})"
+        col.metric(title, inv_counts[bucket], help=profiles.label(bucket))
+
+    # Paging & sorting: only the visible page is decorated and rendered
+    pc1, pc2, pc3, pc4 = st.columns([2, 1, 1, 1])
+    with pc1:
+        sort_by = st.selectbox(
+            "Sort by",
+            options=list(INVENTORY_SORT_COLUMNS),
+            format_func=lambda c: SORT_LABELS.get(c, c),
         )
-        klass = {"green": "badge-green", "yellow": "badge-yellow", "red": "badge-red", "gray": "badge-gray"}.get(
-            c, "badge-gray"
-        )
-        return f"<span class='vg-badge {klass}'>{label}</span>"
-
-    df_show = inv_df.copy()
-    # Days since last check
-    if not df_show.empty:
-        df_show["days_since_check"] = (
-            pd.Timestamp.now() - pd.to_datetime(df_show["last_checked_date"], errors="coerce")
-        ).dt.days
-        df_show["status_badge"] = [
-            _badge(v if pd.notna(v) else None)
-            for v in pd.to_numeric(df_show["current_voltage"], errors="coerce")
-        ]
-
-        # Order and rename
-        df_show = df_show[
-            [
-                "product_number",
-                "current_voltage",
-                "status_badge",
-                "last_checked_date",
-                "days_since_check",
-                "id",
-            ]
-        ].rename(
-            columns={
-                "product_number": "Product Number",
-                "current_voltage": "Voltage (V)",
-                "status_badge": "Status",
-                "last_checked_date": "Last Checked",
-                "days_since_check": "Days Since Check",
-                "id": "ID",
+    with pc2:
+        sort_desc = st.toggle("Descending")
+    with pc3:
+        page_size = st.selectbox("Rows per page", options=[25, 50, 100, 250], index=1)
+    total_pages = max(1, -(-len(inv_df) // page_size))
+    with pc4:
+        page_no = st.number_input("Page", min_value=1, max_value=total_pages, value=1, step=1, key="inventory_page")
+
+    page_df, total_rows, total_pages = inventory_page(
+        inv_df, page=int(page_no), page_size=page_size, sort_by=sort_by, ascending=not sort_desc
+    )
+    if not page_df.empty:
+        df_show = pd.DataFrame(
+            {
+                "Product Number": page_df["product_number"],
+                "Voltage (V)": page_df["current_voltage"].astype("float64").round(2),
+                "Status": voltage_buckets(page_df["current_voltage"], page_df["product_number"]).map(BADGE_HTML),
+                "Last Checked": page_df["last_checked_date"].dt.strftime("%Y-%m-%d %H:%M").fillna(""),
+                "Days Since Check": (pd.Timestamp.now() - page_df["last_checked_date"])
+                .dt.days.astype("Int64")
+                .astype("string")
+                .fillna(""),
+                "ID": page_df["id"],
             }
         )
+        if "site" in page_df.columns:
+            df_show.insert(0, "Site", page_df["site"])
+        # Cell values are user data; only the badges built above are trusted HTML
+        for column in df_show.columns.drop("Status"):
+            df_show[column] = df_show[column].astype("string").fillna("").map(html.escape)
 
         # Display with HTML for badges
-        st.write(
-            df_show.to_html(escape=False, index=False),
-            unsafe_allow_html=True,
-        )
+        with span("app.render_inventory_table", "render"):
+            st.write(
+                df_show.to_html(escape=False, index=False, na_rep=""),
+                unsafe_allow_html=True,
+            )
+        first_row = (int(page_no) - 1) * page_size + 1
+        st.caption(f"Showing {first_row}-{first_row + len(page_df) - 1} of {total_rows} (page {int(page_no)} of {total_pages})")
     else:
         st.info("No batteries found.")
 
+
+@st.fragment
+@rendered("app.inventory_actions")
+def inventory_actions():
     st.subheader("Row Actions")
+    if read_only:
+        st.caption("Battery IDs are per site: select a site in the sidebar to update, delete or hand over a battery.")
     row_id = st.number_input("Select Battery ID", step=1, min_value=0)
     ac1, ac2, ac3 = st.columns([1, 1, 1])
     with ac1:
-        open_update = st.toggle("Open Update Voltage Form")
+        open_update = st.toggle("Open Update Voltage Form", disabled=read_only)
     with ac2:
-        open_delete = st.toggle("Open Delete Confirmation")
+        open_delete = st.toggle("Open Delete Confirmation", disabled=read_only)
     with ac3:
-        open_handover = st.toggle("Open Handover")
+        open_handover = st.toggle("Open Handover", disabled=read_only)
+    show_flash("actions")
 
     if open_update:
         st.markdown("<div class='vg-card'>", unsafe_allow_html=True)
         st.markdown("<div class='vg-section-title'>Update Battery</div>", unsafe_allow_html=True)
-        last_df = read_batteries()
-        last_row = last_df.loc[last_df["id"] == int(row_id)] if not last_df.empty else pd.DataFrame()
-        last_v = None
-        if not last_row.empty:
-            last_v = pd.to_numeric(last_row.iloc[0]["current_voltage"], errors="coerce")
+        # Index lookup by id rather than reading the whole table
+        last_row = bf.scan_battery(str(int(row_id))) if row_id else None
+        last_v = last_product = None
+        if last_row is not None and int(last_row["id"]) == int(row_id):
+            last_v = last_row["current_voltage"]
+            last_product = last_row["product_number"]
             st.markdown(
                 f"<div class='vg-muted'>Last Reading: <b>{'' if pd.isna(last_v) else f'{last_v:.2f}V'}</b></div>",
                 unsafe_allow_html=True,
@@ -256,7 +417,7 @@ with tab_inventory:
                 "yellow": "<span class='vg-badge badge-yellow'>Low - Needs attention</span>",
                 "green": "<span class='vg-badge badge-green'>Full</span>",
                 "gray": "<span class='vg-badge badge-gray'>Unknown</span>",
-            }[status_color(float(uv))]
+            }[status_color(float(uv), last_product)]
             st.markdown(badge_html, unsafe_allow_html=True)
             uvd = st.number_input("Voltage During Check (optional)", step=0.1, format="%.2f")
             uby = st.text_input("Checked By")
@@ -264,16 +425,17 @@ with tab_inventory:
             sub = st.form_submit_button("Update Battery")
             if sub:
                 try:
-                    update_voltage(
+                    bf.update_voltage(
                         int(row_id),
                         float(uv),
                         uby.strip(),
                         notes.strip() or None,
                         float(uvd) if uvd else None,
                     )
-                    st.success(f"Updated battery {int(row_id)} to {float(uv):.2f}V")
                 except Exception as e:
                     st.error(str(e))
+                else:
+                    finish("actions", f"Updated battery {int(row_id)} to {float(uv):.2f}V")
         st.markdown("</div>", unsafe_allow_html=True)
 
 
@@ -285,8 +447,8 @@ with tab_inventory:
         with coldd2:
             if st.button("Delete"):
                 if confirm and row_id:
-                    if delete_battery(int(row_id)):
-                        st.success("Deleted.")
+                    if bf.delete_battery(int(row_id)):
+                        finish("actions", "Deleted.")
                     else:
                         st.error("Battery not found.")
                 else:
@@ -297,21 +459,65 @@ with tab_inventory:
         with colh1:
             if st.button("Hand Over to SPD"):
                 try:
-                    res = handover_status(int(row_id), "SPD")
-                    st.success("Status updated to SPD")
+                    bf.handover_status(int(row_id), "SPD")
                 except Exception as e:
                     st.error(str(e))
+                else:
+                    finish("actions", "Status updated to SPD")
         with colh2:
             if st.button("Hand Over to Production"):
                 try:
-                    res = handover_status(int(row_id), "production")
-                    st.success("Status updated to production")
+                    bf.handover_status(int(row_id), "production")
                 except Exception as e:
                     st.error(str(e))
-
-
-with tab_stakeholders:
+                else:
+                    finish("actions", "Status updated to production")
+
+
+@st.fragment
+@rendered("app.inventory_upload")
+def inventory_upload():
+    with st.expander("Bulk Voltage Upload (meter export)"):
+        st.markdown(
+            "<div class='vg-muted'>CSV or XLSX with columns <b>battery_id</b>, <b>voltage_reading</b> and optionally "
+            "checked_by, notes, voltage_during_check, checked_at."
+            + (" With all sites selected, a <b>site</b> column routes each reading to its site." if read_only else "")
+            + "</div>",
+            unsafe_allow_html=True,
+        )
+        show_flash("upload")
+        with st.form("bulk_voltage_form"):
+            readings_file = st.file_uploader("Readings File", type=["csv", "xlsx"])
+            bulk_by = st.text_input("Checked By (used when the file has none)")
+            bulk_sub = st.form_submit_button("Upload Readings")
+            if bulk_sub:
+                if readings_file is None:
+                    st.error("Please choose a file to upload.")
+                else:
+                    try:
+                        result = bf.bulk_update_voltages(
+                            read_upload(readings_file, readings_file.name),
+                            checked_by=bulk_by.strip() or None,
+                        )
+                    except Exception as e:
+                        st.error(str(e))
+                    else:
+                        failed = result[result["status"] == "failed"]
+                        stale = int((result["status"] == "stale").sum())
+                        finish(
+                            "upload",
+                            f"Updated {len(result) - len(failed)} of {len(result)} readings."
+                            + (f" {stale} predate the battery's last check and were added to its history only." if stale else ""),
+                            f"{len(failed)} readings failed." if not failed.empty else None,
+                            failed,
+                        )
+
+
+@st.fragment
+@rendered("app.tab_stakeholders")
+def stakeholders_tab():
     st.markdown("<div class='vg-section-title'>Email Stakeholders</div>", unsafe_allow_html=True)
+    show_flash("stakeholders")
     stk_df = read_stakeholders()
 
     with st.form("add_stakeholder_form"):
@@ -322,15 +528,33 @@ with tab_stakeholders:
             email = st.text_input("Email")
         with c3:
             sub = st.form_submit_button("+ Add Stakeholder")
+        # Empty fields place no restriction: the stakeholder gets every battery
+        s1, s2, s3, s4 = st.columns([2, 2, 2, 1])
+        with s1:
+            prefixes = st.text_input("Product prefixes", placeholder="e.g. LFP, NMC-12", help="Comma-separated; any case")
+        with s2:
+            statuses = st.multiselect("Statuses", STATUSES)
+        with s3:
+            bands = st.multiselect("Voltage bands", BUCKETS)
+        with s4:
+            frequency = st.selectbox("Digest", FREQUENCIES)
         if sub:
             if not name.strip() or not email.strip():
                 st.error("Name and Email required.")
             else:
-                added = add_stakeholder(name.strip(), email.strip())
-                st.success(f"Added stakeholder {added['name']}")
+                added = add_stakeholder(name.strip(), email.strip(), prefixes, statuses, bands, frequency)
+                finish("stakeholders", f"Added stakeholder {added['name']}")
 
     if stk_df is not None and not stk_df.empty:
-        st.table(stk_df.rename(columns={"name": "Name", "email": "Email", "id": "ID"}))
+        st.table(stk_df.fillna("").rename(columns={
+            "id": "ID",
+            "name": "Name",
+            "email": "Email",
+            "product_prefixes": "Product Prefixes",
+            "statuses": "Statuses",
+            "voltage_bands": "Voltage Bands",
+            "frequency": "Digest",
+        }))
     else:
         st.info("No stakeholders added yet.")
 
@@ -342,40 +566,203 @@ with tab_stakeholders:
         with st.form("edit_stakeholder_form"):
             new_name = st.text_input("New Name (optional)")
             new_email = st.text_input("New Email (optional)")
+            edit_subscription = st.checkbox("Replace subscription")
+            new_prefixes = st.text_input("Product prefixes", key="edit_prefixes")
+            new_statuses = st.multiselect("Statuses", STATUSES, key="edit_statuses")
+            new_bands = st.multiselect("Voltage bands", BUCKETS, key="edit_bands")
+            new_frequency = st.selectbox("Digest", FREQUENCIES, key="edit_frequency")
             subm = st.form_submit_button("Update")
             if subm:
+                # Empty strings clear a field; None keeps what is stored
+                subscription = (
+                    dict(product_prefixes=new_prefixes, statuses=",".join(new_statuses), voltage_bands=",".join(new_bands), frequency=new_frequency)
+                    if edit_subscription else {}
+                )
                 try:
-                    update_stakeholder(int(stk_id), new_name.strip() or None, new_email.strip() or None)
-                    st.success("Stakeholder updated.")
+                    update_stakeholder(int(stk_id), new_name.strip() or None, new_email.strip() or None, **subscription)
                 except Exception as e:
                     st.error(str(e))
+                else:
+                    finish("stakeholders", "Stakeholder updated.")
     with cse2:
         st.warning("This will remove the stakeholder.")
         confirm_s = st.checkbox("Confirm remove")
         if st.button("Delete Stakeholder"):
             if confirm_s and stk_id:
-                ok = delete_stakeholder(int(stk_id))
-                st.success("Deleted." if ok else "Not found.")
+                if delete_stakeholder(int(stk_id)):
+                    finish("stakeholders", "Deleted.")
+                else:
+                    st.error("Not found.")
             else:
                 st.error("Please confirm and provide a valid ID.")
 
 
-with tab_reports:
+# Refreshed on its own while the Reports tab is open, since alerts are raised in the background
+@st.fragment(run_every="30s")
+@rendered("app.alerts_panel")
+def alerts_panel():
+    st.subheader("Alerts")
+    raised = bf.recent_alerts(20)
+    upcoming = bf.upcoming_alerts(20)
+    ac1, ac2 = st.columns(2)
+    with ac1:
+        st.caption("Raised (newest first)")
+        if raised.empty:
+            st.caption("No alerts raised yet.")
+        else:
+            st.dataframe(raised, width="stretch", hide_index=True)
+    with ac2:
+        st.caption("Next due")
+        if upcoming.empty:
+            st.caption("Nothing scheduled.")
+        else:
+            st.dataframe(
+                upcoming.assign(due_at=upcoming["due_at"].dt.strftime("%Y-%m-%d %H:%M")),
+                width="stretch",
+                hide_index=True,
+            )
+
+
+@st.fragment
+@rendered("app.tab_reports")
+def reports_tab():
     st.header("Reports")
-    b_df = read_batteries()
+    b_df = bf.read_batteries()
     stk_df = read_stakeholders()
     if b_df is not None and not b_df.empty:
-        critical = b_df[pd.to_numeric(b_df["current_voltage"], errors="coerce") < 10.5]
-        st.subheader("Critical (<10.5V)")
-        st.dataframe(critical, use_container_width=True)
+        week = bf.recent_checks(ACTIVITY_DAYS)
+        rc1, rc2 = st.columns(2)
+        rc1.metric(f"Checks in the last {ACTIVITY_DAYS} days", len(week))
+        rc2.metric(f"Batteries checked in the last {ACTIVITY_DAYS} days", int(week["battery_id"].nunique()))
+
+        profiles = get_profiles()
+        critical = b_df[voltage_buckets(b_df["current_voltage"], b_df["product_number"]) == "red"]
+        st.subheader("Critical")
+        st.caption(profiles.label("red"))
+        st.dataframe(critical, width="stretch")
+        with st.expander("Voltage threshold profiles"):
+            st.caption(
+                f"Each product uses the first profile whose family or pattern matches it, else the default. "
+                f"Edit `{PROFILES_JSON}` to change them."
+            )
+            st.dataframe(profiles.frame(), hide_index=True, width="stretch")
+
+        st.subheader("Forecast")
+        horizon = st.number_input("Will go critical within (days)", min_value=1, value=30, step=1)
+        forecast = bf.voltage_forecast(within_days=horizon)
+        if forecast.empty:
+            st.caption(f"No batteries are forecast to drop below their critical voltage within {horizon} days.")
+        else:
+            st.caption(
+                f"{len(forecast)} batteries will drop below their critical voltage within {horizon} days, "
+                "based on each battery's discharge rate across its check history."
+            )
+            st.dataframe(
+                pd.DataFrame({
+                    "Battery ID": forecast["id"],
+                    "Product Number": forecast["product_number"],
+                    "Current Voltage": forecast["current_voltage"].round(2),
+                    "Discharge (V/day)": forecast["discharge_per_day"].round(4),
+                    "Critical At (V)": forecast["critical_voltage"].round(2),
+                    "Critical On": forecast["critical_on"].dt.strftime("%Y-%m-%d"),
+                    "Days Left": forecast["days_to_critical"].round().astype("int64"),
+                    "Checks": forecast["checks"],
+                }),
+                width="stretch",
+                hide_index=True,
+            )
+        alerts_panel()
     else:
         st.info("No batteries found.")
 
+    mailer = get_mailer()
     btn_disabled = stk_df.empty if stk_df is not None else True
-    if st.button("Send Email Report (Simulated)", disabled=btn_disabled):
-        if btn_disabled:
-            st.error("No stakeholders available. Add stakeholders first.")
+    if not mailer.settings.configured:
+        st.caption("SMTP is not configured: set VOLT_GUARD_SMTP_HOST (and optionally _PORT, _USER, _PASSWORD, _FROM) to send reports.")
+    digest = st.selectbox("Send to", ["All stakeholders", *FREQUENCIES], format_func=lambda f: f if f == "All stakeholders" else f"{f.capitalize()} digest subscribers")
+    if st.button("Send Email Report", disabled=btn_disabled or not mailer.settings.configured):
+        # Built once here and narrowed to each subscription; the background worker sends them
+        has_batteries = b_df is not None and not b_df.empty
+        builder = ReportBuilder(
+            b_df,
+            forecast if has_batteries else bf.voltage_forecast(within_days=FORECAST_DAYS),
+            forecast_days=horizon if has_batteries else FORECAST_DAYS,
+            recent=week if has_batteries else bf.recent_checks(ACTIVITY_DAYS),
+        )
+        frequency = None if digest == "All stakeholders" else digest
+        st.session_state["email_deliveries"] = send_subscription_reports(builder, stk_df, frequency, mailer)
+        if st.session_state["email_deliveries"]:
+            st.success(f"{len(st.session_state['email_deliveries'])} report(s) queued, one per distinct subscription.")
         else:
-            st.success("Email report would be sent here (SMTP not configured).")
+            st.info("No stakeholders subscribe to that digest.")
+
+    deliveries = [mailer.status(i) for i in st.session_state.get("email_deliveries", [])]
+    deliveries = [d for d in deliveries if d is not None]
+    if deliveries:
+        delivered = sum(d["delivered"] for d in deliveries)
+        recipients = sum(d["recipients"] for d in deliveries)
+        failed = [d for d in deliveries if d["failed"]]
+        pending = sum(d["status"] in ("queued", "sending") for d in deliveries)
+        st.caption(
+            f"Last send ({deliveries[0]['queued_at']}): {len(deliveries)} report(s), "
+            f"{delivered}/{recipients} delivered" + (f", {pending} in progress" if pending else "")
+            + (f", {sum(len(d['failed']) for d in failed)} failed: {failed[0]['error']}" if failed else "")
+        )
 
 
+tab_scanner, tab_inventory, tab_stakeholders, tab_reports = st.tabs(
+    ["Scanner", "Inventory", "Stakeholders", "Reports"], key="vg_tab", on_change="rerun"
+)
+# Switching tabs reruns the app; only the open tab's body runs and reads anything
+if tab_scanner.open:
+    with tab_scanner:
+        scanner_tab()
+        manifest_import()
+if tab_inventory.open:
+    with tab_inventory:
+        inventory_table()
+        inventory_actions()
+        inventory_upload()
+if tab_stakeholders.open:
+    with tab_stakeholders:
+        stakeholders_tab()
+if tab_reports.open:
+    with tab_reports:
+        reports_tab()
+
+
+# --- Diagnostics panel: everything traced in this rerun up to here ---
+def format_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+if rerun_trace is not None:
+    with st.sidebar:
+        summary = rerun_trace.summary()
+        io_calls = summary[summary["category"] == "io"]
+        st.metric("Rerun wall time", f"{rerun_trace.elapsed * 1000:.0f} ms")
+        dc1, dc2, dc3 = st.columns(3)
+        dc1.metric("I/O calls", int(io_calls["calls"].sum()))
+        dc2.metric("Read", format_bytes(io_calls["bytes_read"].sum()))
+        dc3.metric("Written", format_bytes(io_calls["bytes_written"].sum()))
+        st.dataframe(
+            summary.assign(
+                total_ms=summary["total_ms"].round(2),
+                mean_ms=summary["mean_ms"].round(3),
+                max_ms=summary["max_ms"].round(2),
+            ),
+            hide_index=True,
+            width="stretch",
+        )
+        st.caption("Nested calls include the time, rows and bytes of the calls they make.")
+        st.download_button(
+            "Export trace",
+            data=json.dumps(rerun_trace.to_chrome()),
+            file_name=f"volt_guard_trace_{datetime.now():%Y%m%d_%H%M%S}.json",
+            mime="application/json",
+            help="Chrome trace-event format: open in ui.perfetto.dev or chrome://tracing",
+            on_click="ignore",
+        )
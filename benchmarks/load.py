@@ -0,0 +1,383 @@
+"""Load-test the Streamlit app with concurrent simulated sessions.
+
+Each backend runs in a fresh subprocess with its own data directory seeded
+with synthetic batteries and check history. That process starts
+`--sessions` session processes. Each one drives `app.py` headlessly through
+Streamlit's AppTest with Diagnostics on, and runs a seeded random mix of
+scan, filter, update-voltage, handover and add-battery flows against the
+same data. Updates and handovers pick from a small set of hot batteries so
+sessions contend for the same rows.
+
+Every rerun records its wall time and the storage I/O that the app's own
+trace reports. After the sessions finish, the tables are audited for
+duplicate ids, lost updates and KPI drift. Results are written as JSON,
+and the exit status is non-zero when an anomaly or app error is found.
+
+    python -m benchmarks.load --sessions 8 --rounds 25 --batteries 5000
+    python -m benchmarks.load --sessions 4 --rounds 10 --backends sqlite --hot 5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.run import BACKENDS, RESULTS_DIR, ROOT, _git_revision
+
+
+APP = ROOT / "app.py"
+# Relative frequency of each flow in a session's mix
+FLOWS = {"scan": 0.35, "filter": 0.25, "update_voltage": 0.25, "handover": 0.10, "add_battery": 0.05}
+HANDOVER_STATUSES = {"SPD": "Hand Over to SPD", "production": "Hand Over to Production"}
+
+_UPDATED = re.compile(r"Updated battery (\d+) to ([\d.]+)V")
+_ADDED = re.compile(r"Added Battery ID (\d+) for product (\S+)")
+
+
+class Session:
+	"""One simulated user: an AppTest of the app with its own session state."""
+
+	def __init__(self, index: int, seed: int, products: list[str], hot_ids: list[int], timeout: float):
+		from streamlit.testing.v1 import AppTest
+
+		self.index = index
+		self.name = f"load-{index:02d}"
+		self.rng = np.random.default_rng(seed + index)
+		self.products = products
+		self.hot_ids = hot_ids
+		self.at = AppTest.from_file(str(APP), default_timeout=timeout)
+		self.at.session_state["vg_diagnostics"] = True
+		self.tab: Optional[str] = None
+		self.added = 0
+		self.samples: list[dict] = []
+		self.acks: list[dict] = []
+		self.errors: list[dict] = []
+
+	def _widget(self, kind: str, label: str) -> Any:
+		for widget in getattr(self.at, kind):
+			if widget.label == label:
+				return widget
+		raise LookupError(f"No {kind} labelled {label!r} on the {self.tab} tab")
+
+	def rerun(self, flow: str, step: str, tab: str) -> list[str]:
+		"""Run the script once on `tab` and record a sample; returns the success messages shown."""
+		self.at.session_state["vg_tab"] = tab
+		started = time.perf_counter()
+		self.at.run()
+		sample = {"session": self.index, "flow": flow, "step": step, "ms": (time.perf_counter() - started) * 1000}
+		self.tab = tab
+		sidebar = self.at.sidebar
+		if len(sidebar.dataframe):
+			summary = sidebar.dataframe[0].value
+			io = summary[summary["category"] == "io"]
+			sample.update(
+				io_calls=int(io["calls"].sum()),
+				bytes_read=int(io["bytes_read"].sum()),
+				bytes_written=int(io["bytes_written"].sum()),
+			)
+		wall = [m.value for m in sidebar.metric if m.label == "Rerun wall time"]
+		if wall:
+			sample["script_ms"] = float(wall[0].split()[0])
+		self.samples.append(sample)
+		for e in self.at.exception:
+			self.errors.append({"session": self.index, "flow": flow, "step": step, "error": e.message})
+		for e in self.at.error:
+			self.errors.append({"session": self.index, "flow": flow, "step": step, "error": e.value})
+		return [s.value for s in self.at.success]
+
+	def open(self, tab: str) -> None:
+		"""Switch tabs so the tab's widgets exist; the switch is a rerun of its own."""
+		if self.tab != tab:
+			self.rerun("switch_tab", tab.lower(), tab)
+
+	def scan(self) -> None:
+		self.open("Scanner")
+		identifier = self.products[self.rng.integers(len(self.products))] if self.rng.random() < 0.8 else str(self.rng.choice(self.hot_ids))
+		self.at.text_input(key="scanner_input").set_value(identifier)
+		self._widget("button", "Scan / Find Battery").click()
+		shown = self.rerun("scan", "submit", "Scanner")
+		if not any(s.startswith("Found Battery ID") for s in shown):
+			self.errors.append({"session": self.index, "flow": "scan", "step": "submit", "error": f"{identifier} not found"})
+
+	def filter(self) -> None:
+		self.open("Inventory")
+		from benchmarks.synthetic import PRODUCT_PREFIXES
+
+		self._widget("text_input", "Filter: Product Number contains").set_value(str(self.rng.choice(["", *PRODUCT_PREFIXES])))
+		self._widget("selectbox", "Status").set_value(str(self.rng.choice(["", "active", "SPD", "production"])))
+		low = round(float(self.rng.uniform(0, 11.5)), 1)
+		self._widget("number_input", "Min Voltage").set_value(low)
+		self._widget("number_input", "Max Voltage").set_value(round(low + float(self.rng.uniform(0.5, 5)), 1))
+		self.rerun("filter", "submit", "Inventory")
+
+	def _row_action(self, flow: str, battery_id: int, form: str) -> None:
+		"""Select a battery and open one row-action form, closing the others."""
+		self.open("Inventory")
+		self._widget("number_input", "Select Battery ID").set_value(battery_id)
+		for label in ("Open Update Voltage Form", "Open Handover"):
+			self._widget("toggle", label).set_value(label == form)
+		self.rerun(flow, "open_form", "Inventory")
+
+	def update_voltage(self) -> None:
+		battery_id = int(self.rng.choice(self.hot_ids))
+		voltage = round(float(self.rng.uniform(10.5, 12.9)), 2)
+		self._row_action("update_voltage", battery_id, "Open Update Voltage Form")
+		self._widget("number_input", "Current Reading (V)").set_value(voltage)
+		self._widget("text_input", "Checked By").set_value(self.name)
+		self._widget("button", "Update Battery").click()
+		for shown in self.rerun("update_voltage", "submit", "Inventory"):
+			match = _UPDATED.fullmatch(shown)
+			if match and int(match[1]) == battery_id:
+				self.acks.append({"kind": "update_voltage", "session": self.index, "battery_id": battery_id, "voltage": voltage})
+
+	def handover(self) -> None:
+		battery_id = int(self.rng.choice(self.hot_ids))
+		status = str(self.rng.choice(list(HANDOVER_STATUSES)))
+		self._row_action("handover", battery_id, "Open Handover")
+		self._widget("button", HANDOVER_STATUSES[status]).click()
+		if f"Status updated to {status}" in self.rerun("handover", "submit", "Inventory"):
+			self.acks.append({"kind": "handover", "session": self.index, "battery_id": battery_id, "status": status})
+
+	def add_battery(self) -> None:
+		self.open("Scanner")
+		self.added += 1
+		product = f"LOAD-{self.index:02d}-{self.added:05d}"
+		self.at.text_input(key="add_pn").set_value(product)
+		self._widget("button", "Add New Battery").click()
+		for shown in self.rerun("add_battery", "submit", "Scanner"):
+			match = _ADDED.fullmatch(shown)
+			if match and match[2] == product:
+				self.acks.append({"kind": "add_battery", "session": self.index, "battery_id": int(match[1]), "product_number": product})
+
+	def play(self, rounds: int) -> None:
+		flows = list(FLOWS)
+		weights = np.array(list(FLOWS.values()))
+		for flow in self.rng.choice(flows, rounds, p=weights / weights.sum()):
+			try:
+				getattr(self, flow)()
+			except Exception as e:
+				# A widget missing or a script timeout: note it and start the next flow from a fresh tab
+				self.errors.append({"session": self.index, "flow": str(flow), "step": "driver", "error": f"{type(e).__name__}: {e}"})
+				self.tab = None
+
+
+def run_session(index: int, args: dict, products: list[str], hot_ids: list[int], barrier: Any) -> dict:
+	"""Play one session; every session waits for the others to warm up before the first flow."""
+	session = Session(index, args["seed"], products, hot_ids, args["timeout"])
+	session.rerun("cold_start", "first_run", "Scanner")
+	barrier.wait()
+	started = time.perf_counter()
+	session.play(args["rounds"])
+	return {
+		"session": index,
+		"seconds": time.perf_counter() - started,
+		"samples": session.samples,
+		"acks": session.acks,
+		"errors": session.errors,
+	}
+
+
+def audit(initial: pd.DataFrame, acks: pd.DataFrame) -> list[dict]:
+	"""Anomalies in the tables after the run, given what each session was told succeeded."""
+	from utils import battery_functions as bf
+
+	batteries = bf.read_batteries()
+	checks = bf.read_checks()
+	anomalies: list[dict] = []
+
+	for table, ids in (("batteries", batteries["id"]), ("battery_checks", checks["id"])):
+		repeated = ids[ids.duplicated()].unique()
+		if len(repeated):
+			anomalies.append({"kind": "duplicate_id", "table": table, "ids": [int(i) for i in repeated[:20]], "count": int(len(repeated))})
+
+	updates = acks[acks["kind"] == "update_voltage"] if len(acks) else pd.DataFrame(columns=["battery_id", "voltage", "session"])
+	final = batteries.set_index("id")
+	start = initial.set_index("id")
+	for battery_id, acked in updates.groupby("battery_id"):
+		row = final.loc[battery_id]
+		gained = int(row["total_checks"]) - int(start.loc[battery_id, "total_checks"])
+		journaled = int(((checks["battery_id"] == battery_id) & checks["checked_by"].astype("string").str.startswith("load-")).sum())
+		if gained != len(acked) or journaled != len(acked):
+			anomalies.append({"kind": "lost_update", "battery_id": int(battery_id), "acknowledged": int(len(acked)), "total_checks_gained": gained, "checks_journaled": journaled})
+		if round(float(row["current_voltage"]), 2) not in set(acked["voltage"].round(2)):
+			anomalies.append({"kind": "stray_voltage", "battery_id": int(battery_id), "current_voltage": float(row["current_voltage"])})
+
+	# Handovers and voltage updates rewrite different columns, so the last acknowledged status must stand
+	handovers = acks[acks["kind"] == "handover"] if len(acks) else pd.DataFrame(columns=["battery_id", "status"])
+	for battery_id, acked in handovers.groupby("battery_id"):
+		status = str(final.loc[battery_id, "status"])
+		if status not in set(acked["status"]):
+			anomalies.append({"kind": "lost_handover", "battery_id": int(battery_id), "status": status, "acknowledged": sorted(set(acked["status"]))})
+
+	adds = acks[acks["kind"] == "add_battery"] if len(acks) else pd.DataFrame(columns=["battery_id", "product_number"])
+	stored = batteries[batteries["product_number"].astype("string").str.startswith("LOAD-")]
+	stored_ids = stored.groupby("product_number")["id"].agg(list)
+	for added in adds.itertuples():
+		ids = stored_ids.get(added.product_number, [])
+		if list(ids) != [added.battery_id]:
+			anomalies.append({"kind": "lost_add", "product_number": added.product_number, "acknowledged_id": int(added.battery_id), "stored_ids": [int(i) for i in ids]})
+	if len(stored) != len(adds):
+		anomalies.append({"kind": "unacknowledged_add", "stored": int(len(stored)), "acknowledged": int(len(adds))})
+
+	if not bf.verify_dashboard_kpis():
+		anomalies.append({"kind": "kpi_drift"})
+	return anomalies
+
+
+def run_backend(args: argparse.Namespace) -> dict:
+	"""Seed the data directory from the environment, run the sessions and audit the result."""
+	# Imported here: VOLT_GUARD_DATA_DIR / VOLT_GUARD_STORAGE must be set first
+	from benchmarks import synthetic
+	from utils import battery_functions as bf
+	from utils.check_journal import open_journal
+	from utils.excel_handler import write_excel
+	from utils.stakeholder_functions import STAKEHOLDERS_XLSX
+
+	rng = np.random.default_rng(args.seed)
+	batteries = synthetic.batteries(args.batteries, args.seed)
+	checks = synthetic.checks(batteries, args.checks_per_battery, seed=args.seed)
+	bf.ensure_all_files()
+	bf.save_batteries(batteries)
+	write_excel(synthetic.stakeholders(), STAKEHOLDERS_XLSX)
+	open_journal(bf.CHECKS_JOURNAL_DIR, bf.CHECK_COLUMNS, seed=lambda: checks)
+	bf._data().publisher.publish_now()
+
+	initial = bf.read_batteries()[["id", "total_checks"]].copy()
+	products = [str(p) for p in batteries["product_number"].to_numpy()[rng.integers(0, len(batteries), 200)]]
+	hot_ids = [int(i) for i in rng.choice(batteries["id"].to_numpy(), min(args.hot, len(batteries)), replace=False)]
+	settings = {"seed": args.seed, "rounds": args.rounds, "timeout": args.timeout}
+
+	context = multiprocessing.get_context("spawn")
+	with context.Manager() as manager, ProcessPoolExecutor(args.sessions, mp_context=context) as pool:
+		barrier = manager.Barrier(args.sessions)
+		started = time.perf_counter()
+		futures = [pool.submit(run_session, i, settings, products, hot_ids, barrier) for i in range(args.sessions)]
+		sessions = [f.result() for f in futures]
+		seconds = time.perf_counter() - started
+
+	acks = pd.DataFrame([a for s in sessions for a in s["acks"]])
+	return {
+		"batteries": int(len(batteries)),
+		"checks": int(len(checks)),
+		"seconds": round(seconds, 2),
+		"samples": [r for s in sessions for r in s["samples"]],
+		"acknowledged": acks["kind"].value_counts().to_dict() if len(acks) else {},
+		"errors": [e for s in sessions for e in s["errors"]],
+		"anomalies": audit(initial, acks),
+	}
+
+
+def summarize(samples: pd.DataFrame) -> pd.DataFrame:
+	"""Latency percentiles and mean I/O per rerun, per flow and step."""
+	for column in ("io_calls", "bytes_read", "bytes_written", "script_ms"):
+		if column not in samples:
+			samples[column] = np.nan
+	grouped = samples.groupby(["flow", "step"], sort=False)
+	return pd.DataFrame({
+		"reruns": grouped.size(),
+		"p50_ms": grouped["ms"].quantile(0.50),
+		"p95_ms": grouped["ms"].quantile(0.95),
+		"p99_ms": grouped["ms"].quantile(0.99),
+		"max_ms": grouped["ms"].max(),
+		"script_p50_ms": grouped["script_ms"].median(),
+		"io_calls": grouped["io_calls"].mean(),
+		"kb_read": grouped["bytes_read"].mean() / 1024,
+		"kb_written": grouped["bytes_written"].mean() / 1024,
+	}).round(2).reset_index()
+
+
+def _spawn(backend: str, args: argparse.Namespace) -> dict:
+	with tempfile.TemporaryDirectory(prefix=f"vg-load-{backend}-") as data_dir:
+		env = {**os.environ, "VOLT_GUARD_DATA_DIR": data_dir, "VOLT_GUARD_STORAGE": backend}
+		cmd = [
+			sys.executable, "-m", "benchmarks.load", "--worker",
+			"--sessions", str(args.sessions),
+			"--rounds", str(args.rounds),
+			"--batteries", str(args.batteries),
+			"--checks-per-battery", str(args.checks_per_battery),
+			"--hot", str(args.hot),
+			"--timeout", str(args.timeout),
+			"--seed", str(args.seed),
+		]
+		proc = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True)
+		if proc.returncode != 0:
+			raise RuntimeError(f"{backend} failed:\n{proc.stderr}")
+		return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--sessions", type=int, default=8, help="concurrent sessions, one process each")
+	parser.add_argument("--rounds", type=int, default=25, help="flows per session")
+	parser.add_argument("--batteries", type=int, default=5_000)
+	parser.add_argument("--checks-per-battery", type=float, default=4.0)
+	parser.add_argument("--hot", type=int, default=25, help="batteries that updates and handovers pick from")
+	parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+	parser.add_argument("--timeout", type=float, default=120.0, help="seconds one rerun may take")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--out", type=Path, help="results file (default benchmarks/results/load-<time>-<rev>.json)")
+	parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+	args = parser.parse_args(argv)
+
+	if args.worker:
+		print(json.dumps(run_backend(args), default=str))
+		return 0
+
+	revision = _git_revision()
+	doc: dict[str, Any] = {
+		"meta": {
+			"revision": revision,
+			"started_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+			"python": platform.python_version(),
+			"pandas": pd.__version__,
+			"platform": platform.platform(),
+			"cpus": os.cpu_count(),
+			"seed": args.seed,
+			"sessions": args.sessions,
+			"rounds": args.rounds,
+			"hot": args.hot,
+		},
+		"results": [],
+		"anomalies": [],
+		"errors": [],
+	}
+	for backend in args.backends:
+		run = _spawn(backend, args)
+		samples = pd.DataFrame(run["samples"])
+		for record in summarize(samples).to_dict("records"):
+			doc["results"].append({"backend": backend, "batteries": run["batteries"], "checks": run["checks"], **record})
+		doc["anomalies"] += [{"backend": backend, **a} for a in run["anomalies"]]
+		doc["errors"] += [{"backend": backend, **e} for e in run["errors"]]
+		print(
+			f"{backend:>6} {run['batteries']:>8,} batteries {len(samples):>6,} reruns {run['seconds']:7.1f}s  "
+			f"acknowledged {run['acknowledged']}  {len(run['anomalies'])} anomalies  {len(run['errors'])} errors",
+			file=sys.stderr,
+		)
+
+	out = args.out or RESULTS_DIR / f"load-{time.strftime('%Y%m%d-%H%M%S')}-{revision}.json"
+	out.parent.mkdir(parents=True, exist_ok=True)
+	out.write_text(json.dumps(doc, indent=1))
+	print(pd.DataFrame(doc["results"]).drop(columns=["batteries", "checks"]).to_string(index=False), file=sys.stderr)
+	for a in doc["anomalies"]:
+		print(f"ANOMALY {json.dumps(a)}", file=sys.stderr)
+	for e in doc["errors"][:20]:
+		print(f"ERROR {e['backend']} session {e['session']} {e['flow']}/{e['step']}: {e['error']}", file=sys.stderr)
+	print(f"\nResults written to {out}", file=sys.stderr)
+	return 1 if doc["anomalies"] or doc["errors"] else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,255 @@
+"""Benchmark battery operations on synthetic data.
+
+Each (storage backend, battery count) pair runs in a fresh subprocess with
+its own data directory, so caches, writer threads and journals never leak
+between runs. Results are written as JSON; pass `--compare` with an earlier
+results file to flag operations whose median got slower.
+
+    python -m benchmarks.run --sizes 1000 10000 100000 --backends excel sqlite
+    python -m benchmarks.run --sizes 1000 --compare benchmarks/results/old.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+ROOT = Path(__file__).resolve().parents[1]
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+BACKENDS = ("excel", "sqlite")
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+
+def _timings(fn: Callable[[int], Any], repeat: int, setup: Optional[Callable[[int], Any]] = None) -> list[float]:
+	"""Seconds per call of `fn(i)`; `setup(i)` runs untimed before each call."""
+	out = []
+	for i in range(repeat):
+		if setup is not None:
+			setup(i)
+		start = time.perf_counter()
+		fn(i)
+		out.append(time.perf_counter() - start)
+	return out
+
+
+def _summary(samples: list[float]) -> dict[str, float]:
+	ms = np.array(samples) * 1000
+	return {
+		"repeat": len(ms),
+		"min_ms": round(float(ms.min()), 4),
+		"median_ms": round(float(np.median(ms)), 4),
+		"p95_ms": round(float(np.percentile(ms, 95)), 4),
+		"mean_ms": round(float(ms.mean()), 4),
+	}
+
+
+def run_worker(size: int, per_battery: float, max_checks: int, repeat: int, mutations: int, seed: int) -> dict:
+	"""Seed the data directory from the environment and time every operation."""
+	# Imported here: VOLT_GUARD_DATA_DIR / VOLT_GUARD_STORAGE must be set first
+	from benchmarks import synthetic
+	from utils import battery_functions as bf
+	from utils.check_journal import open_journal
+	from utils.excel_handler import clear_cache, read_excel, write_excel
+	from utils.exports import export_bytes
+	from utils.reports import ReportBuilder
+	from utils.subscriptions import subscription_rules
+	from utils.thresholds import parse_profiles
+	from utils.stakeholder_functions import STAKEHOLDERS_XLSX
+
+	rng = np.random.default_rng(seed)
+	batteries = synthetic.batteries(size, seed)
+	checks = synthetic.checks(batteries, per_battery, max_checks, seed)
+	bf.ensure_all_files()
+	write_excel(synthetic.stakeholders(), STAKEHOLDERS_XLSX)
+	open_journal(bf.CHECKS_JOURNAL_DIR, bf.CHECK_COLUMNS, seed=lambda: checks)
+
+	results: dict[str, list[float]] = {}
+	results["save_batteries"] = _timings(lambda i: bf.save_batteries(batteries), 1)
+	# Parsing the primary table, then mapping the Arrow replica published from it
+	results["load_batteries"] = _timings(lambda i: read_excel(bf.BATTERIES_XLSX), min(repeat, 5), setup=lambda i: clear_cache())
+	bf._data().publisher.publish_now()
+	results["load_batteries_replica"] = _timings(lambda i: bf.read_batteries(), min(repeat, 5), setup=lambda i: bf._data().replica.close())
+	bf.read_batteries()
+
+	products = batteries["product_number"].to_numpy()[rng.integers(0, size, repeat)]
+	ids = rng.integers(1, size + 1, max(repeat, mutations))
+	bf.scan_battery(products[0])
+	results["scan_battery"] = _timings(lambda i: bf.scan_battery(products[i]), repeat)
+	results["scan_battery_id"] = _timings(lambda i: bf.scan_battery(str(ids[i])), repeat)
+	results["scan_battery_miss"] = _timings(lambda i: bf.scan_battery(f"NOPE-{i}"), repeat)
+
+	queries = [
+		{},
+		{"product_query": "LFP"},
+		{"status": "active", "voltage_max": 11.0},
+		{"product_query": "-00012", "voltage_min": 10.5, "voltage_max": 12.0},
+	]
+	reps = max(1, repeat // 20)
+	for k, query in enumerate(queries):
+		results[f"filter_inventory_q{k}"] = _timings(lambda i: bf.filter_inventory(**query), reps)
+	prefixes = [p[: 3 + i % 6] for i, p in enumerate(products)]
+	results["complete_product_number"] = _timings(lambda i: bf.complete_product_number(prefixes[i], 10), repeat)
+	inventory = bf.filter_inventory()
+	results["inventory_page"] = _timings(lambda i: bf.inventory_page(inventory, i + 1, 50, "current_voltage", False), reps)
+	# compute_dashboard in app.py is a thin wrapper over dashboard_kpis
+	results["compute_dashboard"] = _timings(lambda i: bf.dashboard_kpis(), repeat)
+	# Colour buckets under per-product threshold profiles; the first call resolves and caches every product
+	profiles = parse_profiles(synthetic.PROFILES)
+	results["classify_resolve"] = _timings(lambda i: profiles.resolve(batteries["product_number"]), 1)
+	results["classify_cached"] = _timings(lambda i: profiles.classify(batteries["current_voltage"], batteries["product_number"]), repeat)
+
+	statuses = ["SPD", "production", "active"]
+	results["add_battery"] = _timings(lambda i: bf.add_battery(f"BENCH-{i:06d}", "2025-01", 12.4), mutations)
+	results["update_voltage"] = _timings(lambda i: bf.update_voltage(int(ids[i]), 11.8, "bench"), mutations)
+	results["handover_status"] = _timings(lambda i: bf.handover_status(int(ids[i]), statuses[i % 3]), mutations)
+	results["compute_dashboard_after_write"] = _timings(
+		lambda i: bf.dashboard_kpis(),
+		mutations,
+		setup=lambda i: bf.update_voltage(int(ids[i]), 10.2, "bench"),
+	)
+	readings = pd.DataFrame({"battery_id": ids[: min(1000, len(ids))], "voltage_reading": 12.0})
+	results["bulk_update_voltages"] = _timings(lambda i: bf.bulk_update_voltages(readings, "bench"), max(1, mutations // 5))
+	# Half new product numbers, half already stocked, so both sides of the dedupe join are exercised
+	manifests = [
+		pd.DataFrame({"product_number": [f"IMPORT-{i:03d}-{j:05d}" for j in range(500)] + list(batteries["product_number"].iloc[:500])})
+		for i in range(max(1, mutations // 5))
+	]
+	results["import_batteries_1k"] = _timings(lambda i: bf.import_batteries(manifests[i], "2025-06"), len(manifests))
+
+	bf.check_journal().compact()
+	results["read_checks"] = _timings(lambda i: bf._load_checks(), min(repeat, 3))
+	bf._data().publisher.publish_now()
+	results["read_checks_replica"] = _timings(lambda i: bf.read_checks(), min(repeat, 3), setup=lambda i: bf._data().replica.close())
+	results["recent_checks_7d"] = _timings(lambda i: bf.recent_checks(7), min(repeat, 20))
+	results["battery_history"] = _timings(lambda i: bf.battery_history(int(ids[i])), min(repeat, 20))
+	results["voltage_forecast_rebuild"] = _timings(lambda i: bf._data().trends.rebuild(bf.check_journal()), 1)
+	results["voltage_forecast"] = _timings(lambda i: bf.voltage_forecast(30), min(repeat, 5))
+	results["export_checks_parquet"] = _timings(lambda i: export_bytes("checks", "parquet"), 1)
+	# One full report against per-subscription reports for 500 stakeholders
+	builder = ReportBuilder()
+	rules = subscription_rules(synthetic.stakeholders(500, seed))
+	results["render_report"] = _timings(lambda i: ReportBuilder().render(), min(repeat, 5))
+	results["render_subscriptions_500"] = _timings(lambda i: builder.render_subscriptions(rules), min(repeat, 5))
+
+	return {
+		"batteries": size,
+		"checks": int(len(checks)),
+		"operations": {name: _summary(samples) for name, samples in results.items()},
+	}
+
+
+def _git_revision() -> str:
+	try:
+		out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+		return out.stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return "unknown"
+
+
+def _spawn(backend: str, size: int, args: argparse.Namespace) -> dict:
+	with tempfile.TemporaryDirectory(prefix=f"vg-bench-{backend}-{size}-") as data_dir:
+		env = {**os.environ, "VOLT_GUARD_DATA_DIR": data_dir, "VOLT_GUARD_STORAGE": backend}
+		cmd = [
+			sys.executable, "-m", "benchmarks.run", "--worker",
+			"--sizes", str(size),
+			"--checks-per-battery", str(args.checks_per_battery),
+			"--max-checks", str(args.max_checks),
+			"--repeat", str(args.repeat),
+			"--mutations", str(args.mutations),
+			"--seed", str(args.seed),
+		]
+		proc = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True)
+		if proc.returncode != 0:
+			raise RuntimeError(f"{backend}/{size} failed:\n{proc.stderr}")
+		return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[dict]:
+	"""Operations whose median is more than `threshold` times the baseline's."""
+	def medians(doc: dict) -> dict[tuple, float]:
+		return {
+			(r["backend"], r["batteries"], r["operation"]): r["median_ms"]
+			for r in doc["results"]
+		}
+
+	old = medians(baseline)
+	slower = []
+	for key, now in medians(current).items():
+		before = old.get(key)
+		if before and now > before * threshold:
+			slower.append({"backend": key[0], "batteries": key[1], "operation": key[2], "baseline_ms": before, "median_ms": now, "ratio": round(now / before, 2)})
+	return slower
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="battery counts (1k to 500k)")
+	parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+	parser.add_argument("--checks-per-battery", type=float, default=4.0)
+	parser.add_argument("--max-checks", type=int, default=2_000_000)
+	parser.add_argument("--repeat", type=int, default=200, help="samples per read operation")
+	parser.add_argument("--mutations", type=int, default=10, help="samples per write operation")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--out", type=Path, help="results file (default benchmarks/results/<time>-<rev>.json)")
+	parser.add_argument("--compare", type=Path, help="earlier results file to check for regressions")
+	parser.add_argument("--threshold", type=float, default=1.25, help="median ratio counted as a regression")
+	parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+	args = parser.parse_args(argv)
+
+	if args.worker:
+		result = run_worker(args.sizes[0], args.checks_per_battery, args.max_checks, args.repeat, args.mutations, args.seed)
+		print(json.dumps(result))
+		return 0
+
+	revision = _git_revision()
+	doc: dict[str, Any] = {
+		"meta": {
+			"revision": revision,
+			"started_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+			"python": platform.python_version(),
+			"pandas": pd.__version__,
+			"numpy": np.__version__,
+			"platform": platform.platform(),
+			"seed": args.seed,
+			"checks_per_battery": args.checks_per_battery,
+			"repeat": args.repeat,
+			"mutations": args.mutations,
+		},
+		"results": [],
+	}
+	for backend in args.backends:
+		for size in args.sizes:
+			started = time.perf_counter()
+			run = _spawn(backend, size, args)
+			for name, summary in run["operations"].items():
+				doc["results"].append({"backend": backend, "batteries": run["batteries"], "checks": run["checks"], "operation": name, **summary})
+			print(f"{backend:>6} {size:>8,} batteries {run['checks']:>10,} checks  {time.perf_counter() - started:7.1f}s", file=sys.stderr)
+
+	out = args.out or RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{revision}.json"
+	out.parent.mkdir(parents=True, exist_ok=True)
+	out.write_text(json.dumps(doc, indent=1))
+	table = pd.DataFrame(doc["results"]).pivot_table(index="operation", columns=["backend", "batteries"], values="median_ms", sort=False)
+	print(table.round(3).to_string(), file=sys.stderr)
+	print(f"\nResults written to {out}", file=sys.stderr)
+
+	if args.compare:
+		slower = compare(doc, json.loads(args.compare.read_text()), args.threshold)
+		for r in slower:
+			print(f"REGRESSION {r['backend']}/{r['batteries']} {r['operation']}: {r['baseline_ms']} -> {r['median_ms']} ms (x{r['ratio']})", file=sys.stderr)
+		return 1 if slower else 0
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+PRODUCT_PREFIXES = ["PN", "AGM", "LFP", "GEL", "VRLA", "NMC"]
+STATUS_WEIGHTS = {"active": 0.80, "SPD": 0.12, "production": 0.08}
+CHECKERS = ["Tech A", "Tech B", "Tech C", "QA", "Night Shift"]
+# Threshold profiles for part of the synthetic families (see utils/thresholds.py)
+PROFILES = {
+	"profiles": [
+		{"name": "6V packs", "pattern": ["PN1*", "PN2*"], "critical": 5.25, "low": 5.5},
+		{"name": "24V packs", "family": "VRLA", "critical": 21.0, "low": 22.0},
+		{"name": "AGM", "family": "AGM", "critical": 11.8, "low": 12.2},
+	],
+}
+
+
+def product_numbers(n: int, rng: np.random.Generator) -> np.ndarray:
+	"""Product numbers like `LFP4821-000123`: a family prefix and model, then a serial."""
+	prefix = rng.choice(PRODUCT_PREFIXES, n)
+	model = rng.integers(1000, 10_000, n).astype(str)
+	serial = np.char.zfill(np.arange(1, n + 1).astype(str), 6)
+	return np.char.add(np.char.add(np.char.add(prefix, model), "-"), serial)
+
+
+def batteries(n: int, seed: int = 0, now: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+	"""`n` batteries with a realistic voltage spread and status mix.
+
+	Voltages are mostly healthy (~12.3V) with a tail under 11V and about 1%
+	never measured; last checks fall within the past six months.
+	"""
+	rng = np.random.default_rng(seed)
+	now = (pd.Timestamp.now() if now is None else now).floor("s")
+	voltage = np.clip(rng.normal(12.3, 0.6, n), 9.5, 13.2).round(2)
+	voltage[rng.random(n) < 0.01] = np.nan
+	packed = now - pd.to_timedelta(rng.integers(30, 3 * 365, n), unit="D")
+	return pd.DataFrame({
+		"id": np.arange(1, n + 1),
+		"product_number": product_numbers(n, rng),
+		"current_voltage": voltage,
+		"last_checked_date": now - pd.to_timedelta(rng.uniform(0, 180, n), unit="D").round("s"),
+		"packing_month": packed.strftime("%Y-%m"),
+		"status": rng.choice(list(STATUS_WEIGHTS), n, p=list(STATUS_WEIGHTS.values())),
+		"total_checks": np.zeros(n, dtype="int64"),
+	})
+
+
+def checks(
+	battery_df: pd.DataFrame,
+	per_battery: float = 4.0,
+	max_rows: Optional[int] = None,
+	seed: int = 0,
+) -> pd.DataFrame:
+	"""Check history for `battery_df`: on average `per_battery` checks each.
+
+	Each battery discharges at its own rate, so the readings slope down over
+	time and end at the battery's current voltage. `total_checks` in
+	`battery_df` is updated in place to match.
+	"""
+	rng = np.random.default_rng(seed + 1)
+	n = len(battery_df)
+	counts = rng.poisson(per_battery, n)
+	if max_rows is not None and counts.sum() > max_rows:
+		counts = np.floor(counts * (max_rows / counts.sum())).astype("int64")
+	battery_df["total_checks"] = counts
+	total = int(counts.sum())
+	owner = np.repeat(np.arange(n), counts)
+	# Position of each check within its battery's history, newest last
+	position = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+	steps_back = np.repeat(counts, counts) - 1 - position
+
+	last_checked = battery_df["last_checked_date"].to_numpy()[owner]
+	interval_days = rng.uniform(5, 30, n)[owner]
+	checked_at = last_checked - pd.to_timedelta(steps_back * interval_days, unit="D").to_numpy()
+
+	rate = rng.uniform(0.002, 0.02, n)[owner]
+	end_voltage = battery_df["current_voltage"].fillna(12.3).to_numpy()[owner]
+	reading = (end_voltage + rate * steps_back * interval_days + rng.normal(0, 0.03, total)).round(2)
+	return pd.DataFrame({
+		"id": np.arange(1, total + 1),
+		"battery_id": battery_df["id"].to_numpy()[owner],
+		"voltage_reading": reading,
+		"voltage_during_check": (reading - rng.uniform(0.05, 0.4, total)).round(2),
+		"checked_by": rng.choice(CHECKERS, total),
+		"notes": np.where(rng.random(total) < 0.05, "Terminal corrosion", None),
+		"checked_at": pd.Series(checked_at).dt.round("s"),
+	}).sort_values("checked_at", kind="stable").assign(id=lambda df: np.arange(1, len(df) + 1))
+
+
+def stakeholders(n: int = 20, seed: int = 0) -> pd.DataFrame:
+	"""Stakeholders with mixed subscriptions: a fifth get everything, the rest one or two product families."""
+	rng = np.random.default_rng(seed)
+	families = [", ".join(rng.choice(PRODUCT_PREFIXES, rng.integers(1, 3), replace=False)) for _ in range(n)]
+	everything = rng.random(n) < 0.2
+	return pd.DataFrame({
+		"id": np.arange(1, n + 1),
+		"name": [f"Stakeholder {i}" for i in range(1, n + 1)],
+		"email": [f"stakeholder{i}@example.com" for i in range(1, n + 1)],
+		"product_prefixes": np.where(everything, "", families),
+		"statuses": np.where(everything | (rng.random(n) < 0.5), "", "active"),
+		"voltage_bands": rng.choice(["", "red", "red, yellow"], n),
+		"frequency": rng.choice(["daily", "weekly", "monthly"], n, p=[0.5, 0.35, 0.15]),
+	})
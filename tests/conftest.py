@@ -0,0 +1,43 @@
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+# utils reads the data directory (and the profiles path under it) at import,
+# so the whole session runs against a scratch directory set up before that
+os.environ["VOLT_GUARD_DATA_DIR"] = tempfile.mkdtemp(prefix="volt_guard_tests_")
+for name in ("VOLT_GUARD_PROFILES", "VOLT_GUARD_SITES", "VOLT_GUARD_STORAGE"):
+	os.environ.pop(name, None)
+
+from utils import excel_handler  # noqa: E402
+from utils.thresholds import PROFILES_JSON  # noqa: E402
+
+
+@pytest.fixture(params=["excel", "sqlite"])
+def backend(request):
+	"""Run the test against each storage engine."""
+	from utils.battery_functions import ensure_all_files
+
+	previous = excel_handler.get_backend()
+	backend = excel_handler.set_backend(request.param)
+	# Create the tables now rather than racing a replica publish still due from the last test
+	ensure_all_files()
+	yield backend
+	excel_handler.set_backend(previous)
+
+
+@pytest.fixture
+def profiles_file():
+	"""Write the voltage profiles file for the test, removing it afterwards."""
+	def write(doc: dict) -> Path:
+		PROFILES_JSON.write_text(json.dumps(doc))
+		return PROFILES_JSON
+
+	yield write
+	PROFILES_JSON.unlink(missing_ok=True)
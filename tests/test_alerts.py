@@ -0,0 +1,75 @@
+import json
+from datetime import datetime
+
+import pandas as pd
+
+from utils.alerts import OVERDUE, REMIND_AFTER_DAYS, AlertScheduler
+
+_DAY_NS = 86_400 * 10**9
+
+
+def _inventory() -> pd.DataFrame:
+	return pd.DataFrame({
+		"id": [1, 2],
+		"product_number": ["LFP4821-000001", "LFP4821-000002"],
+		"current_voltage": [12.6, 10.0],
+		"last_checked_date": [datetime(2026, 1, 1), datetime(2026, 1, 2)],
+		"status": ["active", "active"],
+	})
+
+
+def _logged(path) -> list[dict]:
+	return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_processes_sharing_a_log_write_each_alert_once(tmp_path):
+	log = tmp_path / "alerts.jsonl"
+	first, second = AlertScheduler(log), AlertScheduler(log)
+	raised = {first: [], second: []}
+	for scheduler in raised:
+		scheduler.subscribe(raised[scheduler].extend)
+		scheduler.build(_inventory())
+
+	now = pd.Timestamp(2026, 6, 1).value
+	for scheduler in raised:
+		scheduler._emit(scheduler.pop_due(now))
+
+	records = _logged(log)
+	assert len(records) == len({(r["kind"], r["battery_id"], r["due_at"]) for r in records})
+	assert {(r["kind"], r["battery_id"]) for r in records} == {(OVERDUE, 1), (OVERDUE, 2)}
+	assert len(raised[first]) == len(records) and raised[second] == []
+
+	# Reminders fall on the same schedule in both, so they are logged once too
+	later = now + int(REMIND_AFTER_DAYS * _DAY_NS) + 1
+	for scheduler in raised:
+		scheduler._emit(scheduler.pop_due(later))
+	reminders = _logged(log)[len(records):]
+	assert sorted(r["battery_id"] for r in reminders) == [1, 2]
+	assert raised[second] == []
+
+
+def test_never_checked_battery_is_logged_once(tmp_path):
+	log = tmp_path / "alerts.jsonl"
+	inventory = pd.concat([_inventory(), pd.DataFrame({
+		"id": [3],
+		"product_number": ["LFP4821-000003"],
+		"current_voltage": [None],
+		"last_checked_date": [pd.NaT],
+		"status": ["active"],
+	})], ignore_index=True)
+	scheduler = AlertScheduler(log)
+	# Never-checked batteries fall due at build time
+	now = pd.Timestamp.now().value
+	for day in range(3):
+		# Each rebuild makes the unchecked battery due again, as a restart would
+		scheduler.build(inventory)
+		scheduler._emit(scheduler.pop_due(now + day * _DAY_NS + 1))
+	restarted = AlertScheduler(log)
+	restarted.build(inventory)
+	restarted._emit(restarted.pop_due(now + 5 * _DAY_NS))
+
+	unchecked = [r for r in _logged(log) if r["battery_id"] == 3]
+	assert len(unchecked) == 1
+	assert unchecked[0]["kind"] == OVERDUE and unchecked[0]["last_checked_date"] is None
+	# Checked batteries still get their daily reminders
+	assert len([r for r in _logged(log) if r["battery_id"] == 1]) > 1
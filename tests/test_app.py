@@ -0,0 +1,44 @@
+import pytest
+
+from conftest import ROOT
+
+AppTest = pytest.importorskip("streamlit.testing.v1").AppTest
+
+# The title each tab puts on the page, and nothing else does
+TITLES = {
+	"Scanner": "Scanner",
+	"Inventory": "Battery Inventory",
+	"Stakeholders": "Email Stakeholders",
+	"Reports": "Reports",
+}
+
+
+def titles(at: "AppTest") -> set[str]:
+	shown = [h.value for h in at.header] + [m.value for m in at.markdown]
+	return {tab for tab, title in TITLES.items() if any(title in s for s in shown)}
+
+
+def open_app(tab: str) -> "AppTest":
+	at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=60)
+	at.session_state["vg_tab"] = tab
+	return at.run()
+
+
+@pytest.mark.parametrize("tab", list(TITLES))
+def test_only_the_open_tab_renders(backend, tab):
+	at = open_app(tab)
+
+	assert not at.exception
+	assert titles(at) == {tab}
+
+
+def test_scan_runs_only_the_scanner(backend):
+	from utils import battery_functions as bf
+
+	bf.add_battery("APP-scan", None, 12.5)
+	at = open_app("Scanner")
+	at.text_input(key="scanner_input").set_value("APP-scan").run()
+
+	assert not at.exception
+	assert any("Product APP-scan" in s.value for s in at.success)
+	assert titles(at) == {"Scanner"}
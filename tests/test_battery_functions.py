@@ -0,0 +1,97 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils import battery_functions as bf
+
+
+def _battery(voltage: float = 12.0) -> int:
+	return int(bf.add_battery(f"BF-{uuid.uuid4().hex[:8]}", None, voltage)["id"])
+
+
+def test_bulk_update_reports_bad_rows_and_applies_the_rest(backend):
+	battery_id = _battery()
+	result = bf.bulk_update_voltages([
+		{"battery_id": 10**9, "voltage_reading": 11.0},
+		{"battery_id": "abc", "voltage_reading": 11.0},
+		{"battery_id": battery_id, "voltage_reading": "high"},
+		{"battery_id": battery_id, "voltage_reading": 11.5},
+	], "qa")
+
+	assert result["status"].tolist() == ["failed", "failed", "failed", "updated"]
+	assert result["error"].tolist() == ["Battery not found", "Invalid battery id", "Invalid voltage", ""]
+	row = bf.scan_battery(str(battery_id))
+	assert row["current_voltage"] == 11.5
+	assert row["total_checks"] == 1
+
+
+def test_bulk_update_duplicate_ids_keep_the_latest_reading(backend):
+	battery_id = _battery()
+	next_check = bf.check_journal().next_id()
+	now = datetime.now()
+	result = bf.bulk_update_voltages([
+		{"battery_id": battery_id, "voltage_reading": 11.8, "checked_at": now},
+		{"battery_id": battery_id, "voltage_reading": 11.1, "checked_at": now - timedelta(hours=1)},
+	], "qa")
+
+	assert result["status"].tolist() == ["updated", "updated"]
+	row = bf.scan_battery(str(battery_id))
+	assert row["current_voltage"] == 11.8
+	assert row["total_checks"] == 2
+	history = bf.battery_history(battery_id)
+	assert len(history[history["id"] >= next_check]) == 2
+	assert bf.verify_dashboard_kpis()
+
+
+def test_bulk_update_older_reading_goes_to_history_only(backend):
+	battery_id = _battery()
+	bf.update_voltage(battery_id, 12.4, "qa")
+	checked = bf.scan_battery(str(battery_id))["last_checked_date"]
+	next_check = bf.check_journal().next_id()
+
+	result = bf.bulk_update_voltages(
+		[{"battery_id": battery_id, "voltage_reading": 10.5, "checked_at": checked - timedelta(days=3)}], "qa"
+	)
+
+	assert result["status"].tolist() == ["stale"]
+	row = bf.scan_battery(str(battery_id))
+	assert row["current_voltage"] == 12.4
+	assert row["last_checked_date"] == checked
+	assert row["total_checks"] == 2
+	history = bf.battery_history(battery_id)
+	assert history[history["id"] >= next_check]["voltage_reading"].tolist() == [10.5]
+	assert bf.verify_dashboard_kpis()
+
+
+def test_bulk_update_requires_the_reading_columns(backend):
+	with pytest.raises(ValueError, match="voltage_reading"):
+		bf.bulk_update_voltages([{"battery_id": 1}], "qa")
+
+
+def test_import_batteries_skips_stocked_repeated_and_invalid_rows(backend):
+	stocked = bf.scan_battery(str(_battery()))["product_number"]
+	tag = uuid.uuid4().hex[:8]
+	result = bf.import_batteries([
+		{"product": f" IMP-{tag}-1 ", "voltage": 12.6},
+		{"product": f"IMP-{tag}-2", "packing_month": "2025-12"},
+		{"product": f"IMP-{tag}-1", "voltage": 12.1},
+		{"product": stocked, "voltage": 12.0},
+		{"product": "", "voltage": 12.0},
+		{"product": f"IMP-{tag}-3", "voltage": "n/a"},
+	], packing_month="2026-01")
+
+	assert result["status"].tolist() == ["inserted", "inserted", "duplicate", "duplicate", "invalid", "invalid"]
+	assert result["error"].tolist() == [
+		"", "", "Repeated in manifest", "Already in inventory", "Product number required", "Invalid voltage",
+	]
+	first, second = result["id"].iloc[:2].tolist()
+	assert second == first + 1
+	assert result["id"].iloc[2:].isna().all()
+
+	# Stripped numbers are found by the scanner, and the derived views saw the new rows
+	row = bf.scan_battery(f"IMP-{tag}-1")
+	assert row["id"] == first and row["current_voltage"] == 12.6 and row["packing_month"] == "2026-01"
+	assert bf.scan_battery(str(second))["packing_month"] == "2025-12"
+	assert first in bf.filter_inventory(product_query=tag)["id"].tolist()
+	assert bf.verify_dashboard_kpis()
@@ -0,0 +1,51 @@
+import uuid
+
+import pandas as pd
+import pytest
+
+from utils import battery_functions as bf
+from utils.battery_index import BatteryIndex
+from utils.write_queue import get_writer
+
+
+def test_lookup_by_id_then_stripped_product_number():
+	index = BatteryIndex()
+	index.build(pd.DataFrame({"id": [1, 2, 3], "product_number": ["A-1", " B-2 ", "A-1"]}))
+
+	assert index.lookup("2")["product_number"] == " B-2 "
+	assert index.lookup(" B-2")["id"] == 2
+	# Shared product numbers resolve to the first row
+	assert index.lookup("A-1")["id"] == 1
+	assert index.lookup("missing") is None
+
+	index.apply(index.get_id(1), None)
+	assert index.lookup("A-1")["id"] == 3
+	index.apply(None, {"id": 4, "product_number": "C-4"})
+	assert index.lookup("C-4")["id"] == 4
+
+
+def test_scan_index_follows_updates_and_rollbacks(backend, monkeypatch):
+	product = f"IDX-{uuid.uuid4().hex[:8]}"
+	battery_id = int(bf.add_battery(product, None, 12.0)["id"])
+	index = bf._data().scan_index
+	bf.scan_battery(product)
+	builds = []
+	build = index.build
+	monkeypatch.setattr(index, "build", lambda df: builds.append(len(df)) or build(df))
+
+	bf.update_voltage(battery_id, 11.0, "qa")
+	assert bf.scan_battery(product)["current_voltage"] == 11.0
+	assert builds == []
+
+	def failing():
+		bf.update_voltage(battery_id, 9.0, "qa")
+		raise RuntimeError("boom")
+
+	with pytest.raises(RuntimeError):
+		get_writer().run(failing)
+	# The rolled-back row is not served; the index is rebuilt from the table
+	assert bf.scan_battery(str(battery_id))["current_voltage"] == 11.0
+	assert len(builds) == 1
+
+	bf.delete_battery(battery_id)
+	assert bf.scan_battery(product) is None
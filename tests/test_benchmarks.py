@@ -0,0 +1,34 @@
+import json
+
+import pandas as pd
+
+from benchmarks import run, synthetic
+
+
+def test_synthetic_data_is_reproducible_and_consistent():
+	now = pd.Timestamp("2026-06-01")
+	batteries = synthetic.batteries(300, seed=3, now=now)
+	pd.testing.assert_frame_equal(batteries, synthetic.batteries(300, seed=3, now=now))
+	assert batteries["product_number"].is_unique
+	checks = synthetic.checks(batteries, per_battery=2.0, seed=3)
+	assert checks["battery_id"].isin(batteries["id"]).all()
+	assert checks["id"].is_unique
+
+
+def test_compare_flags_only_slower_operations():
+	def doc(**medians):
+		return {"results": [{"backend": "excel", "batteries": 10, "operation": k, "median_ms": v} for k, v in medians.items()]}
+
+	slower = run.compare(doc(scan=2.0, read=1.1, new=5.0), doc(scan=1.0, read=1.0), threshold=1.25)
+	assert [(r["operation"], r["ratio"]) for r in slower] == [("scan", 2.0)]
+
+
+def test_suite_runs_end_to_end(tmp_path):
+	out = tmp_path / "results.json"
+	assert run.main(["--sizes", "200", "--backends", "sqlite", "--repeat", "2", "--mutations", "1", "--out", str(out)]) == 0
+
+	results = pd.DataFrame(json.loads(out.read_text())["results"])
+	assert {"scan_battery", "update_voltage", "bulk_update_voltages"} <= set(results["operation"])
+	assert (results["batteries"] == 200).all() and (results["median_ms"] >= 0).all()
+	# A run compared with itself has no regressions
+	assert run.main(["--sizes", "200", "--backends", "sqlite", "--repeat", "2", "--mutations", "1", "--out", str(tmp_path / "again.json"), "--compare", str(out), "--threshold", "1000"]) == 0
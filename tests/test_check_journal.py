@@ -0,0 +1,104 @@
+from datetime import datetime
+
+import pandas as pd
+
+from utils.check_journal import CheckJournal
+
+COLUMNS = ["id", "battery_id", "voltage_reading", "checked_at"]
+
+
+def _journal(tmp_path, **options) -> CheckJournal:
+	return CheckJournal(tmp_path / "checks", COLUMNS, **options)
+
+
+def _check(battery_id: int, month: int, voltage: float = 12.0) -> dict:
+	return {"battery_id": battery_id, "voltage_reading": voltage, "checked_at": datetime(2026, month, 1, 9)}
+
+
+def test_append_assigns_ids_in_order(tmp_path):
+	journal = _journal(tmp_path)
+	first = journal.append(_check(1, 1))
+	rest = journal.append_many([_check(2, 1), _check(1, 2)])
+	assert [first["id"]] + [r["id"] for r in rest] == [1, 2, 3]
+	assert journal.next_id() == 4
+	df = journal.read()
+	assert df["id"].tolist() == [1, 2, 3]
+	assert df["checked_at"].iloc[0] == pd.Timestamp(2026, 1, 1, 9)
+	journal.close()
+
+
+def test_compaction_keeps_every_check(tmp_path):
+	journal = _journal(tmp_path, segment_max_rows=2)
+	journal.append_many([_check(i % 3, 1 + i % 4, 11.0 + i / 10) for i in range(7)])
+	before = journal.read().sort_values("id", ignore_index=True)
+
+	assert journal.compact()
+	assert journal.compacted_id() == 7
+	assert set(journal.partitions()["month"]) == {"2026-01", "2026-02", "2026-03", "2026-04"}
+	journal.append(_check(5, 4))
+
+	after = journal.read().sort_values("id", ignore_index=True)
+	pd.testing.assert_frame_equal(after.iloc[:7], before, check_dtype=False)
+	assert after["id"].tolist() == list(range(1, 9))
+	covered, compacted = journal.read_compacted()
+	assert covered == 7 and sorted(compacted["id"]) == list(range(1, 8))
+	journal.close()
+
+
+def test_read_since_spans_partitions_and_segments(tmp_path):
+	journal = _journal(tmp_path)
+	journal.append_many([_check(1, month) for month in (1, 2, 3)])
+	journal.compact()
+	journal.append_many([_check(2, 3), _check(3, 4)])
+
+	assert journal.read_since(0)["id"].tolist() == [1, 2, 3, 4, 5]
+	assert journal.read_since(2)["id"].tolist() == [3, 4, 5]
+	assert journal.read_since(4)["battery_id"].tolist() == [3]
+	assert journal.read_since(5).empty
+	journal.close()
+
+
+def test_second_journal_on_the_same_directory_continues_the_ids(tmp_path):
+	first, second = _journal(tmp_path), _journal(tmp_path)
+	first.append(_check(1, 1))
+	assert second.append(_check(2, 1))["id"] == 2
+	assert first.read()["id"].tolist() == [1, 2]
+	first.close()
+	second.close()
+
+
+def test_read_range_opens_only_the_months_it_needs(tmp_path, monkeypatch):
+	journal = _journal(tmp_path)
+	journal.append_many([_check(b, month, 11.0 + month / 10) for month in (1, 2, 3, 4) for b in (1, 2)])
+	journal.compact()
+	journal.append(_check(1, 3))
+	opened = []
+	read_partition = journal._read_partition
+	monkeypatch.setattr(journal, "_read_partition", lambda entry, filters: opened.append(entry["month"]) or read_partition(entry, filters))
+
+	df = journal.read_range(datetime(2026, 2, 1), datetime(2026, 4, 1), battery_ids=[1])
+
+	assert sorted(opened) == ["2026-02", "2026-03"]
+	assert df["battery_id"].tolist() == [1, 1, 1]
+	assert df["checked_at"].dt.month.tolist() == [2, 3, 3]
+	assert df["id"].is_monotonic_increasing
+	assert journal.read_range(battery_ids=[]).empty
+	journal.close()
+
+
+def test_old_months_move_to_the_archive(tmp_path):
+	journal = _journal(tmp_path)
+	now = datetime.now()
+	journal.append_many([
+		{"battery_id": 1, "voltage_reading": 12.0, "checked_at": datetime(2020, 5, 1)},
+		{"battery_id": 1, "voltage_reading": 12.0, "checked_at": now},
+		{"battery_id": 1, "voltage_reading": 12.0, "checked_at": None},
+	])
+	journal.compact()
+
+	partitions = journal.partitions().set_index("month")
+	assert partitions.loc["2020-05", "archived"] and partitions.loc["2020-05", "path"].startswith("archive/")
+	assert not partitions.loc[f"{now:%Y-%m}", "archived"]
+	assert not partitions.loc["undated", "archived"]
+	assert len(journal.read()) == 3
+	journal.close()
@@ -0,0 +1,56 @@
+import io
+
+import pandas as pd
+import pytest
+
+from utils import battery_functions as bf
+from utils.excel_handler import use_data_root
+from utils.exports import FORMATS, export_file, export_name, write_export
+
+READERS = {
+	"csv": pd.read_csv,
+	"xlsx": lambda fh: pd.concat(pd.read_excel(fh, sheet_name=None).values(), ignore_index=True),
+	"parquet": pd.read_parquet,
+}
+
+
+@pytest.fixture
+def inventory(backend, tmp_path):
+	"""Five batteries, two of them checked, in a data directory of their own."""
+	with use_data_root(tmp_path):
+		bf.ensure_all_files()
+		ids = [int(bf.add_battery(f"EXP-{i}", "2026-01", 12.0 + i / 10)["id"]) for i in range(5)]
+		bf.update_voltage(ids[0], 11.5, "qa", notes="first")
+		bf.update_voltage(ids[1], 10.25, "qa")
+	return tmp_path
+
+
+@pytest.mark.parametrize("fmt", list(FORMATS))
+def test_exports_round_trip(inventory, fmt):
+	with use_data_root(inventory):
+		expected = {
+			"batteries": bf.read_batteries(),
+			"filtered": bf.filter_inventory(voltage_min=12.0),
+			"checks": bf.read_checks(),
+		}
+		for dataset, filters in (("batteries", None), ("filtered", {"voltage_min": 12.0}), ("checks", None)):
+			# Two-row chunks, so every dataset is written in several pieces
+			with export_file(dataset, fmt, filters, chunk_rows=2) as fh:
+				back = READERS[fmt](io.BytesIO(fh.read()))
+			want = expected[dataset]
+			assert len(back) == len(want), dataset
+			assert back["id"].tolist() == want["id"].tolist()
+			column = "voltage_reading" if dataset == "checks" else "current_voltage"
+			assert back[column].tolist() == pytest.approx(want[column].tolist())
+	assert export_name("checks", fmt) == f"battery_checks.{fmt}"
+
+
+def test_empty_export_keeps_the_header():
+	out = io.BytesIO()
+	write_export(iter([pd.DataFrame(columns=["id", "voltage"])]), "xlsx", out)
+	assert list(pd.read_excel(io.BytesIO(out.getvalue())).columns) == ["id", "voltage"]
+
+
+def test_unknown_format_is_rejected():
+	with pytest.raises(ValueError, match="Unknown export format"):
+		write_export(iter([]), "ods", io.BytesIO())
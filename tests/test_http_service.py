@@ -0,0 +1,109 @@
+import asyncio
+import json
+import uuid
+
+from utils import http_service
+
+
+async def _exchange(*requests: bytes, server_limit: int = http_service.MAX_HEADER_BYTES) -> list[tuple[int, dict]]:
+	"""Send `requests` on one connection; the responses read before the server closes it."""
+	server = await asyncio.start_server(http_service.handle, "127.0.0.1", 0, limit=server_limit)
+	port = server.sockets[0].getsockname()[1]
+	try:
+		reader, writer = await asyncio.open_connection("127.0.0.1", port)
+		writer.write(b"".join(requests))
+		await writer.drain()
+		responses = []
+		while True:
+			head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10) if not reader.at_eof() else b""
+			if not head:
+				break
+			lines = head.decode("latin-1").split("\r\n")
+			headers = {k.lower(): v.strip() for k, _, v in (line.partition(":") for line in lines[1:] if line)}
+			body = await reader.readexactly(int(headers["content-length"]))
+			responses.append((int(lines[0].split()[1]), json.loads(body)))
+			if headers.get("connection") == "close":
+				break
+		writer.close()
+		return responses
+	except asyncio.IncompleteReadError:
+		return responses
+	finally:
+		server.close()
+		await server.wait_closed()
+
+
+def _get(path: str, close: bool = False) -> bytes:
+	connection = "Connection: close\r\n" if close else ""
+	return f"GET {path} HTTP/1.1\r\nHost: test\r\n{connection}\r\n".encode()
+
+
+def _post(path: str, payload, close: bool = False) -> bytes:
+	body = json.dumps(payload).encode()
+	connection = "Connection: close\r\n" if close else ""
+	return f"POST {path} HTTP/1.1\r\nHost: test\r\nContent-Type: application/json\r\n{connection}Content-Length: {len(body)}\r\n\r\n".encode() + body
+
+
+def test_requests_share_a_kept_alive_connection():
+	product = f"HTTP-{uuid.uuid4().hex[:8]}"
+	responses = asyncio.run(_exchange(
+		_get("/health"),
+		_post("/v1/batteries", {"product_number": product, "initial_voltage": 10.2}),
+		_get(f"/v1/scan?q={product}", close=True),
+	))
+	assert [status for status, _ in responses] == [200, 200, 200]
+	assert responses[0][1]["status"] == "ok"
+	battery = responses[1][1]["battery"]
+	assert battery["product_number"] == product and battery["current_voltage"] == 10.2
+	assert responses[2][1]["battery"]["id"] == battery["id"]
+
+
+def test_routing_errors():
+	responses = asyncio.run(_exchange(
+		_get("/nowhere"),
+		_get("/v1/batteries"),
+		_post("/v1/voltage", {"battery_id": 1.5, "voltage_reading": 12, "checked_by": "qa"}),
+		_post("/v1/scan", {"identifier": ["x"]}, close=True),
+	))
+	assert [status for status, _ in responses] == [404, 405, 400, 400]
+	assert responses[2][1]["error"] == "battery_id must be an integer"
+
+
+def test_content_length_over_the_limit_is_rejected(monkeypatch):
+	monkeypatch.setattr(http_service, "MAX_BODY_BYTES", 16)
+	responses = asyncio.run(_exchange(_post("/v1/scan", {"identifier": "x" * 32})))
+	assert responses == [(413, {"error": "Request body too large"})]
+
+
+def test_chunk_over_the_limit_is_rejected_before_it_is_read(monkeypatch):
+	monkeypatch.setattr(http_service, "MAX_BODY_BYTES", 1024)
+	# Declares 4 GiB but sends nothing: the answer must not wait for the body
+	request = b"POST /v1/scan HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\nFFFFFFFF\r\n"
+	responses = asyncio.run(_exchange(request))
+	assert responses == [(413, {"error": "Request body too large"})]
+
+
+def test_chunked_body_is_reassembled():
+	body = json.dumps({"identifier": "no-such-battery"}).encode()
+	chunks = b"".join(f"{len(part):x}\r\n".encode() + part + b"\r\n" for part in (body[:5], body[5:])) + b"0\r\n\r\n"
+	request = b"POST /v1/scan HTTP/1.1\r\nTransfer-Encoding: chunked\r\nConnection: close\r\n\r\n" + chunks
+	assert asyncio.run(_exchange(request)) == [(404, {"ok": False, "identifier": "no-such-battery", "error": "Battery not found"})]
+
+
+def test_bad_framing_gets_a_400():
+	cases = [
+		b"POST /v1/scan HTTP/1.1\r\nContent-Length: ten\r\n\r\n",
+		b"POST /v1/scan HTTP/1.1\r\nContent-Length: -1\r\n\r\n",
+		b"POST /v1/scan HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\nzz\r\n",
+		b"POST /v1/scan HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n2\r\n{}XX",
+		b"GARBAGE\r\n\r\n",
+	]
+	for request in cases:
+		responses = asyncio.run(_exchange(request))
+		assert len(responses) == 1 and responses[0][0] == 400, request
+
+
+def test_overlong_chunk_line_gets_a_400():
+	request = b"POST /v1/scan HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n" + b"1" * 300 + b"\r\n"
+	responses = asyncio.run(_exchange(request, server_limit=128))
+	assert responses == [(400, {"error": "Malformed request"})]
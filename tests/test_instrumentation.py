@@ -0,0 +1,54 @@
+import json
+import uuid
+
+import pytest
+
+from utils import battery_functions as bf
+from utils.instrumentation import annotate, begin_trace, end_trace, record_io, span
+
+
+@pytest.fixture
+def trace():
+	trace = begin_trace("test")
+	yield trace
+	end_trace()
+
+
+def test_spans_nest_and_pass_bytes_outwards(trace):
+	with span("outer") as outer:
+		record_io(bytes_read=10)
+		with span("inner", "io") as inner:
+			record_io(bytes_read=5, bytes_written=3)
+			annotate(cache="hit")
+
+	assert (outer.depth, inner.depth) == (0, 1)
+	assert (outer.bytes_read, outer.bytes_written) == (15, 3)
+	assert (inner.bytes_read, inner.bytes_written) == (5, 3)
+	assert outer.duration >= inner.duration
+	summary = trace.summary().set_index("name")
+	assert summary.loc["inner", "calls"] == 1 and summary.loc["outer", "bytes_read"] == 15
+
+	events = json.loads(json.dumps(trace.to_chrome()))["traceEvents"]
+	inner_event = next(e for e in events if e["name"] == "inner")
+	assert inner_event["cat"] == "io" and inner_event["args"]["cache"] == "hit"
+
+
+def test_nothing_is_recorded_without_a_trace():
+	end_trace()
+	with span("idle") as current:
+		record_io(bytes_read=1)
+	assert current is None
+
+
+def test_utils_calls_and_the_shared_commit_are_traced(backend, trace):
+	battery_id = int(bf.add_battery(f"TR-{uuid.uuid4().hex[:8]}", None, 12.0)["id"])
+	bf.update_voltage(battery_id, 11.0, "qa")
+	bf.read_batteries()
+
+	summary = trace.summary().set_index("name")
+	assert summary.loc["battery_functions.update_voltage", "calls"] == 1
+	assert summary.loc["battery_functions.read_batteries", "rows"] >= 1
+	# The writer thread ran the mutation in this trace, and its commit was handed back to it
+	assert summary.loc["write_queue.commit", "category"] == "io"
+	assert summary.loc["write_queue.commit", "calls"] == 2
+	assert any(s.thread.startswith("writer:") for s in trace.spans)
@@ -0,0 +1,50 @@
+import uuid
+
+import pytest
+
+from utils import battery_functions as bf
+from utils.kpis import voltage_bucket
+from utils.write_queue import get_writer
+
+
+def _counting_builds(monkeypatch, view) -> list:
+	builds = []
+	build = view.build
+	monkeypatch.setattr(view, "build", lambda df: builds.append(len(df)) or build(df))
+	return builds
+
+
+def test_kpis_follow_writes_without_a_recount(backend, monkeypatch):
+	battery_id = int(bf.add_battery(f"KPI-{uuid.uuid4().hex[:8]}", None, 12.6)["id"])
+	before = bf.dashboard_kpis()
+	builds = _counting_builds(monkeypatch, bf._data().kpis)
+
+	bf.update_voltage(battery_id, 10.0, "qa")
+	after = bf.dashboard_kpis()
+	moved = {voltage_bucket(12.6): -1}
+	moved[voltage_bucket(10.0)] = moved.get(voltage_bucket(10.0), 0) + 1
+	assert {b: after[b] - before[b] for b in moved} == moved
+	assert after["total"] == before["total"]
+
+	bf.handover_status(battery_id, "SPD")
+	assert bf.dashboard_kpis()["active"] == after["active"] - 1
+	bf.delete_battery(battery_id)
+	assert bf.dashboard_kpis()["total"] == before["total"] - 1
+	assert builds == []
+	assert bf.verify_dashboard_kpis()
+
+
+def test_kpis_recover_from_a_rollback(backend):
+	battery_id = int(bf.add_battery(f"KPI-{uuid.uuid4().hex[:8]}", None, 12.6)["id"])
+	before = bf.dashboard_kpis()
+
+	def failing():
+		bf.update_voltage(battery_id, 10.0, "qa")
+		bf.add_battery(f"KPI-{uuid.uuid4().hex[:8]}", None, 11.0)
+		raise RuntimeError("boom")
+
+	with pytest.raises(RuntimeError):
+		get_writer().run(failing)
+
+	assert bf.dashboard_kpis() == before
+	assert bf.verify_dashboard_kpis()
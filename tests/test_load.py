@@ -0,0 +1,38 @@
+import json
+
+import pandas as pd
+
+from benchmarks import load
+
+
+def test_concurrent_sessions_leave_no_anomalies(tmp_path):
+	out = tmp_path / "load.json"
+	code = load.main([
+		"--sessions", "2", "--rounds", "2", "--batteries", "100", "--checks-per-battery", "2",
+		"--backends", "sqlite", "--out", str(out),
+	])
+
+	doc = json.loads(out.read_text())
+	assert doc["anomalies"] == [] and doc["errors"] == []
+	assert code == 0
+	results = pd.DataFrame(doc["results"])
+	assert {"scan", "add_battery"} <= set(results["flow"])
+	assert (results["reruns"] > 0).all()
+
+
+def test_audit_reports_lost_and_duplicated_writes(backend):
+	from utils import battery_functions as bf
+
+	battery_id = int(bf.add_battery("LOAD-audit", None, 12.0)["id"])
+	initial = bf.read_batteries()[["id", "total_checks"]].copy()
+	bf.update_voltage(battery_id, 11.0, "load-0")
+	acks = pd.DataFrame([
+		{"kind": "update_voltage", "battery_id": battery_id, "voltage": 11.0, "session": 0},
+		# Acknowledged but never applied
+		{"kind": "update_voltage", "battery_id": battery_id, "voltage": 10.0, "session": 1},
+		{"kind": "add_battery", "battery_id": battery_id, "product_number": "LOAD-audit", "session": 0},
+	])
+
+	kinds = [a["kind"] for a in load.audit(initial, acks)]
+	assert "lost_update" in kinds
+	assert "kpi_drift" not in kinds
@@ -0,0 +1,115 @@
+import smtplib
+
+import pandas as pd
+
+from utils.mailer import Mailer, SmtpSettings
+from utils.reports import Report
+
+
+class FakeSMTP:
+	"""Stands in for smtplib.SMTP; `script` holds what each sendmail call raises or refuses."""
+
+	def __init__(self, script: list):
+		self.script = script
+		self.sent: list[list[str]] = []
+		self.closed = False
+
+	def sendmail(self, sender, recipients, payload):
+		outcome = self.script.pop(0) if self.script else {}
+		if isinstance(outcome, Exception):
+			raise outcome
+		self.sent.append(list(recipients))
+		return outcome
+
+	def rset(self):
+		if self.closed:
+			raise smtplib.SMTPServerDisconnected("closed")
+
+	def quit(self):
+		self.closed = True
+
+	def close(self):
+		self.closed = True
+
+
+def _mailer(tmp_path, script: list, **options) -> tuple[Mailer, list[FakeSMTP]]:
+	opened: list[FakeSMTP] = []
+
+	def connect(settings):
+		opened.append(FakeSMTP(script))
+		return opened[-1]
+
+	options = {"backoff": 0.0, "log_path": tmp_path / "deliveries.jsonl", **options}
+	return Mailer(SmtpSettings(host="smtp.test"), connect=connect, **options), opened
+
+
+def _report() -> Report:
+	return Report("Battery report", "text", "<p>html</p>", pd.Timestamp.now())
+
+
+def _deliver(mailer: Mailer, recipients: list[str]) -> dict:
+	delivery_id = mailer.submit(_report(), recipients)
+	assert mailer.wait(timeout=5)
+	return mailer.status(delivery_id)
+
+
+def test_batches_share_one_pooled_connection(tmp_path):
+	mailer, opened = _mailer(tmp_path, [], batch_size=2)
+	try:
+		first = _deliver(mailer, ["a@x.test", "b@x.test", "c@x.test", " A@x.test ", ""])
+		second = _deliver(mailer, ["d@x.test"])
+	finally:
+		mailer.stop()
+	assert first["status"] == "sent" and first["delivered"] == 3
+	assert second["status"] == "sent"
+	assert len(opened) == 1 and mailer.connections == 1
+	assert opened[0].sent == [["a@x.test", "b@x.test"], ["c@x.test"], ["d@x.test"]]
+	assert opened[0].closed
+
+
+def test_transient_failure_is_retried(tmp_path):
+	busy = smtplib.SMTPResponseException(451, b"try later")
+	mailer, opened = _mailer(tmp_path, [busy, busy])
+	try:
+		record = _deliver(mailer, ["a@x.test"])
+	finally:
+		mailer.stop()
+	assert record["status"] == "sent" and record["attempts"] == 3
+	# The connection answered RSET, so it was kept
+	assert len(opened) == 1
+
+
+def test_disconnect_reconnects(tmp_path):
+	mailer, opened = _mailer(tmp_path, [smtplib.SMTPServerDisconnected("gone")])
+	try:
+		record = _deliver(mailer, ["a@x.test"])
+	finally:
+		mailer.stop()
+	assert record["status"] == "sent" and record["attempts"] == 2
+	assert len(opened) == 2 and opened[0].closed
+
+
+def test_permanent_failure_and_refused_recipients(tmp_path):
+	script = [
+		{"b@x.test": (550, b"no such user")},
+		smtplib.SMTPResponseException(554, b"rejected"),
+	]
+	mailer, _ = _mailer(tmp_path, script, batch_size=2)
+	try:
+		record = _deliver(mailer, ["a@x.test", "b@x.test", "c@x.test"])
+	finally:
+		mailer.stop()
+	assert record["status"] == "partial" and record["delivered"] == 1
+	assert record["attempts"] == 2
+	assert record["failed"]["b@x.test"] == "550 no such user"
+	assert record["failed"]["c@x.test"].startswith("SMTPResponseException")
+
+
+def test_retries_give_up_after_max_attempts(tmp_path):
+	mailer, _ = _mailer(tmp_path, [smtplib.SMTPResponseException(421, b"busy")] * 5, max_attempts=3)
+	try:
+		record = _deliver(mailer, ["a@x.test"])
+	finally:
+		mailer.stop()
+	assert record["status"] == "failed" and record["attempts"] == 3
+	assert (tmp_path / "deliveries.jsonl").read_text().count("\n") == 1
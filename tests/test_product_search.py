@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.product_search import ProductSearch
+
+PRODUCTS = [
+	"LFP4821-000123", "lfp4821-000124", " PN6-12V ", "PN60-6V", "AGM12-100", "agm12-100",
+	"Ünicode-Ä1", "AB", "A", None, "X-ABCABC", "ABC",
+]
+
+
+def _inventory() -> pd.DataFrame:
+	return pd.DataFrame({"id": range(1, len(PRODUCTS) + 1), "product_number": pd.Series(PRODUCTS, dtype=object)})
+
+
+def _expected(df: pd.DataFrame, text: str, prefix: bool = False) -> list[int]:
+	products = df["product_number"].astype("string").str.strip().str.lower()
+	q = text.strip().lower()
+	hit = products.str.startswith(q) if prefix else products.str.contains(q, regex=False)
+	return sorted(df.loc[hit.fillna(False).to_numpy(bool), "id"].tolist())
+
+
+QUERIES = ["", "a", "ab", "abc", "bca", "lfp", "4821-0001", "000124", "PN6", "6v", "-", "ä1", "ünic", "zzz", "cab", "abcabc"]
+
+
+@pytest.mark.parametrize("text", QUERIES)
+def test_contains_matches_str_contains(text):
+	df = _inventory()
+	index = ProductSearch()
+	index.build(df)
+	expected = _expected(df, text) if text else sorted(df.loc[df["product_number"].notna(), "id"].tolist())
+	assert index.contains(text).tolist() == expected
+	if text:
+		assert index.startswith(text).tolist() == _expected(df, text, prefix=True)
+
+
+def test_writes_after_the_build_match_str_contains():
+	df = _inventory()
+	index = ProductSearch()
+	index.build(df)
+	records = {r["id"]: r for r in df.to_dict("records")}
+	changes = [
+		(records[1], {**records[1], "product_number": "NEW-LFP"}),
+		(records[5], None),
+		(None, {"id": 100, "product_number": "abcd-9"}),
+	]
+	for old, new in changes:
+		index.apply(old, new)
+	live = pd.DataFrame([r for r in records.values() if r["id"] != 5] + [{"id": 100, "product_number": "abcd-9"}])
+	live.loc[live["id"] == 1, "product_number"] = "NEW-LFP"
+	for text in QUERIES[1:]:
+		assert np.array_equal(index.contains(text), _expected(live, text)), text
+	assert index.complete("ab") == ["AB", "ABC", "abcd-9"]
+	# Battery 5 (AGM12-100) was deleted; only its lower-case twin completes
+	assert index.complete("agm") == ["agm12-100"]
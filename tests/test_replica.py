@@ -0,0 +1,55 @@
+import uuid
+
+from pandas.testing import assert_frame_equal
+
+from utils import battery_functions as bf
+from utils.excel_handler import table_version
+
+
+def _same_checks():
+	replica = bf.read_checks().sort_values("id", ignore_index=True)
+	primary = bf._load_checks().sort_values("id", ignore_index=True)
+	assert_frame_equal(replica, primary, check_dtype=False)
+
+
+def test_check_snapshot_moves_only_with_compaction(backend):
+	battery_id = int(bf.add_battery(f"RP-{uuid.uuid4().hex[:8]}", None, 12.0)["id"])
+	bf.update_voltage(battery_id, 11.0, "qa")
+	journal = bf.check_journal()
+	journal.compact()
+	data = bf._data()
+	data.publisher.publish_now()
+	covered = data.replica.latest("battery_checks")[0]
+	assert covered == journal.compacted_id()
+
+	# New checks are read from the journal tail; the snapshot is not republished for them
+	bf.update_voltage(battery_id, 10.0, "qa")
+	data.publisher.publish_now()
+	assert data.replica.latest("battery_checks")[0] == covered
+	_same_checks()
+
+	journal.compact()
+	_same_checks()
+	data.publisher.publish_now()
+	assert data.replica.latest("battery_checks")[0] == journal.compacted_id() > covered
+	_same_checks()
+
+
+def test_battery_reads_fall_back_to_the_table_while_the_replica_is_stale(backend, monkeypatch):
+	battery_id = int(bf.add_battery(f"RP-{uuid.uuid4().hex[:8]}", None, 12.0)["id"])
+	data = bf._data()
+	data.publisher.publish_now()
+	version = table_version(data.batteries)
+	assert data.replica.read("batteries", version) is not None
+
+	# Keep the publisher from catching up, so only the fallback can see the write
+	monkeypatch.setattr(data.publisher, "wake", lambda: None)
+	bf.update_voltage(battery_id, 10.5, "qa")
+	assert data.replica.read("batteries", table_version(data.batteries)) is None
+	row = bf.read_batteries().set_index("id").loc[battery_id]
+	assert row["current_voltage"] == 10.5
+
+	data.publisher.publish_now()
+	replica = data.replica.read("batteries", table_version(data.batteries))
+	assert replica is not None
+	assert replica.set_index("id").loc[battery_id, "current_voltage"] == 10.5
@@ -0,0 +1,64 @@
+import pandas as pd
+
+from utils.reports import ReportBuilder
+from utils.subscriptions import subscription_rules
+
+NOW = pd.Timestamp(2026, 6, 1, 9, 30)
+
+
+def _batteries() -> pd.DataFrame:
+	return pd.DataFrame({
+		"id": [1, 2, 3, 4, 5],
+		"product_number": ["LFP-1", "LFP-2", "AGM-<3>", "AGM-4", "LFP-5"],
+		"current_voltage": [10.0, 10.8, 9.9, 12.6, 12.5],
+		"last_checked_date": pd.to_datetime(["2026-05-30", "2026-05-31", None, "2026-05-01", "2026-05-31"]),
+		"status": ["active", "active", "active", "active", "SPD"],
+	})
+
+
+def _builder() -> ReportBuilder:
+	forecast = pd.DataFrame({
+		"id": [4],
+		"product_number": ["AGM-4"],
+		"current_voltage": [12.6],
+		"critical_on": pd.to_datetime(["2026-06-20"]),
+		"days_to_critical": [19.2],
+	})
+	recent = pd.DataFrame({"battery_id": [1, 1, 2, 5]})
+	return ReportBuilder(_batteries(), forecast, now=NOW, recent=recent)
+
+
+def test_full_report_lists_every_section():
+	report = _builder().render()
+
+	assert report.counts == {"critical": 2, "low": 1, "forecast": 1, "checks": 4, "checked_batteries": 3}
+	assert report.subject == "Volt Guard report 2026-06-01: 2 critical, 1 low"
+	assert report.text.startswith("Volt Guard battery report, generated 2026-06-01 09:30")
+	assert "Going critical within 30 days: 1" in report.text
+	# Cells are escaped in the HTML body
+	assert "AGM-&lt;3&gt;" in report.html and "AGM-<3>" not in report.html
+
+
+def test_subscription_reports_match_reports_built_from_their_batteries():
+	stakeholders = pd.DataFrame({
+		"id": [1, 2, 3],
+		"email": ["lfp@x", "agm@x", "all@x"],
+		"product_prefixes": ["LFP", "agm", ""],
+		"statuses": ["active", "", ""],
+		"voltage_bands": ["", "red", ""],
+		"frequency": ["daily", "weekly", "daily"],
+	})
+	rules = subscription_rules(stakeholders)
+	builder = _builder()
+	reports = builder.render_subscriptions(rules)
+
+	assert [r.counts for r in reports] == [
+		{"critical": 1, "low": 1, "forecast": 0, "checks": 3, "checked_batteries": 2},
+		{"critical": 1, "low": 0, "forecast": 0, "checks": 0, "checked_batteries": 0},
+		builder.render().counts,
+	]
+	assert reports[0].subject.startswith("Volt Guard daily digest")
+	assert "Covering LFP*, active" in reports[0].text
+	assert "LFP-1" in reports[0].text and "AGM" not in reports[0].text
+	assert "Covering" not in reports[2].text
+	assert builder.render_subscriptions(rules.iloc[:0]) == []
@@ -0,0 +1,36 @@
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from utils import battery_functions as bf
+from utils.schema import BATTERY_SCHEMA, apply_schema, widen
+
+
+def test_widen_rounds_to_the_stored_precision():
+	df = apply_schema(pd.DataFrame({"id": [1, 2], "current_voltage": [10.2, None]}), BATTERY_SCHEMA)
+	assert df["current_voltage"].dtype == "float32"
+	out = widen(df, BATTERY_SCHEMA)
+	assert out["current_voltage"].dtype == "float64"
+	assert out["current_voltage"].iloc[0] == 10.2 and np.isnan(out["current_voltage"].iloc[1])
+	row = widen(pd.Series({"id": 1, "current_voltage": np.float32(12.7)}, dtype=object), BATTERY_SCHEMA)
+	assert row["current_voltage"] == 12.7
+
+
+def test_voltage_reads_back_as_written(backend):
+	product = f"SC-{uuid.uuid4().hex[:8]}"
+	added = bf.add_battery(product, None, 10.2)
+	battery_id = int(added["id"])
+	assert added["current_voltage"] == 10.2
+	next_check = bf.check_journal().next_id()
+
+	assert bf.update_voltage(battery_id, 11.3, "qa", voltage_during_check=11.1)["current_voltage"] == 11.3
+	assert bf.scan_battery(product)["current_voltage"] == 11.3
+	batteries = bf.read_batteries()
+	assert batteries.loc[batteries["id"] == battery_id, "current_voltage"].tolist() == [11.3]
+	assert bf.filter_inventory(product_query=product, voltage_min=11.3, voltage_max=11.3)["id"].tolist() == [battery_id]
+
+	history = bf.battery_history(battery_id)
+	history = history[history["id"] >= next_check]
+	assert history[["voltage_reading", "voltage_during_check"]].values.tolist() == [[11.3, 11.1]]
+	assert bf.handover_status(battery_id, "SPD")["current_voltage"] == 11.3
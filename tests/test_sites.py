@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+
+from utils.sites import SiteRegistry, parse_sites
+
+
+@pytest.fixture
+def registry(tmp_path):
+	registry = SiteRegistry(parse_sites(f"north={tmp_path / 'north'},south={tmp_path / 'south'}"))
+	yield registry
+	registry.close()
+
+
+def test_sites_keep_their_own_data(registry, tmp_path):
+	north, south, everywhere = registry.client("north"), registry.client("south"), registry.all()
+	assert north.add_battery("N-1", None, 12.5)["id"] == 1
+	assert south.add_battery("S-1", None, 10.0)["id"] == 1
+	north.update_voltage(1, 12.1, "qa")
+
+	batteries = everywhere.read_batteries()
+	assert batteries[["site", "product_number"]].astype(str).values.tolist() == [["north", "N-1"], ["south", "S-1"]]
+	assert everywhere.dashboard_kpis()["total"] == 2
+	assert everywhere.scan_battery("S-1")["site"] == "south"
+	assert south.battery_history(1).empty
+	assert (tmp_path / "north" / "batteries.xlsx").exists()
+
+
+def test_bulk_readings_are_routed_by_site(registry):
+	for site in ("north", "south"):
+		registry.client(site).add_battery(f"{site}-1", None, 12.0)
+	readings = pd.DataFrame({"site": ["north", "south"], "battery_id": [1, 1], "voltage_reading": [11.0, 10.5]})
+	result = registry.all().bulk_update_voltages(readings, "qa")
+	assert result["status"].tolist() == ["updated", "updated"]
+	assert registry.client("south").scan_battery("1")["current_voltage"] == 10.5
+	with pytest.raises(ValueError, match="Choose a site"):
+		registry.all().update_voltage(1, 11.0, "qa")
+
+
+def test_concurrent_calls_stay_on_their_site(registry, tmp_path):
+	from concurrent.futures import ThreadPoolExecutor
+
+	def add(i: int) -> str:
+		site = ("north", "south")[i % 2]
+		registry.client(site).add_battery(f"{site}-{i}", None, 12.0)
+		return site
+
+	with ThreadPoolExecutor(max_workers=8) as pool:
+		list(pool.map(add, range(40)))
+	for site in ("north", "south"):
+		products = registry.client(site).read_batteries()["product_number"].astype(str)
+		assert len(products) == 20 and products.str.startswith(f"{site}-").all()
+	assert not (tmp_path / "north" / "south").exists()
+
+
+def test_each_site_uses_its_own_profiles(registry, tmp_path):
+	(tmp_path / "south").mkdir()
+	(tmp_path / "south" / "voltage_profiles.json").write_text(
+		'{"default": {"critical": 5.0, "low": 6.0}, "profiles": []}'
+	)
+	for site in ("north", "south"):
+		registry.client(site).add_battery("X-1", None, 8.0)
+	assert registry.client("north").dashboard_kpis()["red"] == 1
+	assert registry.client("south").dashboard_kpis()["green"] == 1
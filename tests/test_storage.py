@@ -0,0 +1,88 @@
+import os
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from utils.storage import CHECKS_XLSX_NAME, ExcelBackend, SqliteBackend, export_checks
+
+
+def test_sqlite_version_tracks_each_table(tmp_path):
+	backend = SqliteBackend()
+	batteries, stakeholders = tmp_path / "batteries.xlsx", tmp_path / "stakeholders.xlsx"
+	backend.ensure(batteries, ["id", "current_voltage"])
+	backend.ensure(stakeholders, ["id", "name"])
+	before = backend.version(batteries)
+
+	# Writes to another table in the same database leave this one's version alone
+	backend.append(stakeholders, [{"id": 1, "name": "Ada"}])
+	backend.update(stakeholders, 1, {"name": "Grace"})
+	assert backend.version(batteries) == before
+
+	backend.append(batteries, [{"id": 1, "current_voltage": 12.0}])
+	appended = backend.version(batteries)
+	assert appended != before
+
+	# A rolled-back write rolls its counter back with it
+	with pytest.raises(RuntimeError):
+		with backend.transaction(tmp_path):
+			backend.update(batteries, 1, {"current_voltage": 11.0})
+			raise RuntimeError
+	assert backend.version(batteries) == appended
+	assert backend.update(batteries, 99, {"current_voltage": 11.0}) is None
+	assert backend.version(batteries) == appended
+
+def test_excel_version_sees_a_replaced_file(tmp_path):
+	backend = ExcelBackend()
+	path, copy = tmp_path / "batteries.xlsx", tmp_path / "copy.xlsx"
+	backend.write(pd.DataFrame({"id": [1]}), path)
+	copy.write_bytes(path.read_bytes())
+	before = backend.version(path)
+	mtime = path.stat().st_mtime_ns
+
+	# Same bytes, size and mtime, but a different file
+	os.replace(copy, path)
+	os.utime(path, ns=(mtime, mtime))
+	assert backend.version(path) != before
+
+
+def test_export_checks_reads_the_journal(backend, tmp_path):
+	from utils import battery_functions as bf
+	from utils.excel_handler import use_data_root
+
+	with use_data_root(tmp_path):
+		bf.ensure_all_files()
+		battery_id = int(bf.add_battery("EXP-1", None, 12.0)["id"])
+		bf.update_voltage(battery_id, 11.5, "qa")
+		bf.update_voltage(battery_id, 11.25, "qa")
+	path = tmp_path / CHECKS_XLSX_NAME
+
+	assert export_checks(path) == 2
+	exported = pd.read_excel(path)
+	assert exported["voltage_reading"].tolist() == [11.5, 11.25]
+	assert (exported["battery_id"] == battery_id).all()
+
+
+def test_tables_are_ensured_once_per_backend(backend, monkeypatch):
+	from utils import battery_functions as bf
+	from utils import excel_handler
+
+	calls = []
+	ensure = backend.ensure
+	root = excel_handler.data_root()
+
+	def counted(path, columns):
+		# Background workers of other tests' directories may still be ensuring theirs
+		if Path(path).resolve().parent == root:
+			calls.append(path)
+		ensure(path, columns)
+
+	monkeypatch.setattr(backend, "ensure", counted)
+	bf.read_batteries()
+	bf.check_journal()
+	assert calls == []
+
+	# A new engine is checked again
+	excel_handler.set_backend(backend)
+	bf.ensure_all_files()
+	assert len(calls) == 3
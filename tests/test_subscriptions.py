@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.kpis import voltage_buckets
+from utils.schema import STATUSES
+from utils.subscriptions import describe_rule, match_subscriptions, normalize_subscription, subscription_rules
+
+
+def _stakeholders() -> pd.DataFrame:
+	return pd.DataFrame({
+		"id": [1, 2, 3, 4],
+		"email": ["a@x", "b@x", "c@x", "d@x"],
+		"product_prefixes": ["lfp, LFP-12", "LFP", "AGM", None],
+		"statuses": ["active", "Active", "", None],
+		"voltage_bands": ["red,yellow", "yellow, red", "purple", None],
+		"frequency": ["daily", None, "weekly", "monthly"],
+	})
+
+
+def test_normalize_subscription_canonicalizes_and_rejects_unknown_values():
+	assert normalize_subscription("lfp; agm", ["ACTIVE"], "Red, green", "Weekly") == {
+		"product_prefixes": "LFP, AGM",
+		"statuses": "active",
+		"voltage_bands": "red, green",
+		"frequency": "weekly",
+	}
+	assert normalize_subscription()["frequency"] == "daily"
+	with pytest.raises(ValueError, match="Unknown voltage band"):
+		normalize_subscription(voltage_bands="purple")
+	with pytest.raises(ValueError, match="one digest frequency"):
+		normalize_subscription(frequency="daily, weekly")
+
+
+def test_subscription_rules_share_equal_subscriptions():
+	rules = subscription_rules(_stakeholders())
+
+	# "LFP" covers "LFP-12"; statuses and bands are order- and case-insensitive
+	first = rules.iloc[0]
+	assert first["prefixes"] == ("LFP",) and first["statuses"] == ("active",) and first["bands"] == ("red", "yellow")
+	assert first["emails"] == ["a@x", "b@x"]
+	# Unknown bands read from a hand-edited file are dropped
+	assert rules.iloc[1]["bands"] == ()
+	assert len(rules) == 3
+	assert subscription_rules(_stakeholders(), "monthly")["stakeholder_ids"].tolist() == [[4]]
+	assert describe_rule(first) == "LFP*, active, red/yellow"
+	assert describe_rule(rules.iloc[2]) == "all batteries"
+
+
+def test_match_subscriptions_agrees_with_a_row_by_row_check():
+	rng = np.random.default_rng(7)
+	n = 500
+	batteries = pd.DataFrame({
+		"product_number": rng.choice(["LFP-12-", "LFP-24-", "AGM-", "agm-", ""], n) + rng.integers(0, 99, n).astype(str),
+		"status": rng.choice(STATUSES + ["retired"], n),
+		"current_voltage": rng.choice([np.nan, 9.8, 10.7, 11.5, 12.6], n),
+	})
+	rules = pd.DataFrame({
+		"prefixes": [("LFP",), ("LFP-12", "AGM"), (), ("LFP-24",), ("ZZZ",)],
+		"statuses": [("active",), (), ("SPD", "production"), (), ()],
+		"bands": [("red", "yellow"), ("green",), (), ("gray",), ()],
+		"frequency": ["daily"] * 5,
+	})
+
+	pairs = match_subscriptions(batteries, rules)
+
+	bands = voltage_buckets(batteries["current_voltage"], batteries["product_number"])
+	products = batteries["product_number"].str.upper()
+	expected = {
+		(r, i)
+		for r, rule in rules.iterrows()
+		for i in range(n)
+		if (not rule["prefixes"] or any(products[i].startswith(p) for p in rule["prefixes"]))
+		and (not rule["statuses"] or batteries["status"][i] in rule["statuses"])
+		and (not rule["bands"] or bands[i] in rule["bands"])
+	}
+	assert set(zip(pairs["rule"], pairs["row"])) == expected
+	assert len(pairs) == len(expected)
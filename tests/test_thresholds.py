@@ -0,0 +1,37 @@
+import uuid
+
+import numpy as np
+
+from utils import battery_functions as bf
+from utils.kpis import bucket_counts
+from utils.thresholds import parse_profiles
+
+PB_12V = {"name": "12v", "family": "PB", "critical": 11.8, "low": 12.4}
+
+
+def test_classify_at_the_bounds():
+	profiles = parse_profiles({"profiles": [PB_12V]})
+	products = ["PB-1", "PB-1", "PB-1", "PB-1", "X-1", "X-1", "PB-1"]
+	typed = [11.8, 12.4, 11.79, 12.39, 10.5, 11.0, None]
+	expected = ["yellow", "green", "red", "yellow", "yellow", "green", "gray"]
+
+	assert list(profiles.buckets(typed, products)) == expected
+	# Read back from a float32 column, a reading lands in the bucket it was typed into
+	stored = np.array(typed, dtype="float64").astype("float32")
+	assert list(profiles.buckets(stored, products)) == expected
+	assert profiles.bucket(12.4, "PB-1") == "green"
+	assert profiles.bucket(np.float32(12.4), "PB-1") == "green"
+	assert profiles.bucket(float(np.float32(12.4)), "PB-1") == "green"
+	assert profiles.bucket(11.8, "pb-1") == "yellow"
+
+
+def test_boundary_reading_agrees_everywhere(backend, profiles_file):
+	profiles_file({"profiles": [PB_12V]})
+	product = f"PB-{uuid.uuid4().hex[:8]}"
+	added = bf.add_battery(product, None, 12.4)
+
+	assert bf.status_color(12.4, product) == "green"
+	assert bf.status_color(added["current_voltage"], product) == "green"
+	assert bf.verify_dashboard_kpis()
+	kpis = bf.dashboard_kpis()
+	assert bucket_counts(bf.read_batteries()) == {k: kpis[k] for k in ("red", "yellow", "green", "gray")}
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.check_journal import CheckJournal
+from utils.trends import EPOCH, VoltageTrends, check_stats, fit, merge_stats
+
+NOW = pd.Timestamp("2026-03-01")
+
+
+def _checks(rows: list[tuple[int, str, float]]) -> pd.DataFrame:
+	return pd.DataFrame(rows, columns=["battery_id", "checked_at", "voltage_reading"]).assign(
+		checked_at=lambda df: pd.to_datetime(df["checked_at"])
+	)
+
+
+def test_fit_matches_a_least_squares_line():
+	checks = _checks([
+		(1, "2026-02-01", 12.6), (1, "2026-02-11", 12.1), (1, "2026-02-21", 11.7),
+		(2, "2026-02-01", 12.0), (2, "2026-02-21", 12.4),  # charging: no date
+		(3, "2026-02-20", 12.0),  # one check: no slope
+	])
+	forecast = fit(check_stats(checks), critical=10.5, now=NOW)
+
+	days = ((checks["checked_at"] - EPOCH) / pd.Timedelta(days=1))[:3]
+	slope = np.polyfit(days, checks["voltage_reading"][:3], 1)[0]
+	assert forecast.loc[1, "discharge_per_day"] == pytest.approx(-slope)
+	expected = pd.Timestamp("2026-02-21") + pd.Timedelta(days=(11.7 - 10.5) / -slope)
+	assert abs(forecast.loc[1, "critical_on"] - expected) < pd.Timedelta(seconds=1)
+	assert forecast.loc[1, "days_to_critical"] == pytest.approx((expected - NOW) / pd.Timedelta(days=1))
+	assert forecast.loc[[2, 3], "critical_on"].isna().all()
+
+
+def test_merged_batches_equal_one_batch():
+	checks = _checks([
+		(1, "2026-02-01", 12.6), (2, "2026-02-03", 12.2), (1, "2026-02-11", 12.1),
+		(2, "2026-02-13", 11.9), (1, "2026-02-21", 11.7), (3, "2026-02-22", 12.0),
+	])
+	merged = merge_stats(check_stats(checks.iloc[:3]), check_stats(checks.iloc[3:]))
+	pd.testing.assert_frame_equal(merged.sort_index(), check_stats(checks).sort_index(), check_like=True)
+
+
+def test_refresh_folds_in_only_new_checks(tmp_path):
+	journal = CheckJournal(tmp_path / "journal", ["id", "battery_id", "voltage_reading", "checked_at"])
+	trends = VoltageTrends(tmp_path / "trends.parquet")
+	journal.append_many([
+		{"battery_id": 1, "voltage_reading": 12.6, "checked_at": "2026-02-01T00:00:00"},
+		{"battery_id": 1, "voltage_reading": 12.1, "checked_at": "2026-02-11T00:00:00"},
+	])
+	trends.refresh(journal)
+	journal.append({"battery_id": 1, "voltage_reading": 11.7, "checked_at": "2026-02-21T00:00:00"})
+	trends.refresh(journal)
+
+	# A fresh rollup from the saved file agrees with one rebuilt from the whole journal
+	rebuilt = VoltageTrends()
+	rebuilt.rebuild(journal)
+	reloaded = VoltageTrends(tmp_path / "trends.parquet")
+	assert reloaded.refresh(journal) == 0
+	assert reloaded.forecast(10.5, NOW).loc[1, "checks"] == 3
+	pd.testing.assert_frame_equal(reloaded.forecast(10.5, NOW), rebuilt.forecast(10.5, NOW))
+	journal.close()
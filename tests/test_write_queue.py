@@ -0,0 +1,120 @@
+import threading
+import uuid
+
+import pytest
+
+from utils import battery_functions as bf
+from utils import excel_handler
+from utils.excel_handler import AfterCommitError, after_commit
+from utils.write_queue import get_writer
+
+
+def _battery(voltage: float = 12.0) -> int:
+	return int(bf.add_battery(f"WQ-{uuid.uuid4().hex[:8]}", None, voltage)["id"])
+
+
+def _checks(battery_id: int, first_check: int):
+	# Both backends share the journal, so battery ids recur across the parametrized runs
+	history = bf.battery_history(battery_id)
+	return history[history["id"] >= first_check]
+
+
+def test_rolled_back_mutation_leaves_no_trace(backend):
+	battery_id = _battery()
+	next_check = bf.check_journal().next_id()
+
+	def failing():
+		bf.update_voltage(battery_id, 9.0, "qa")
+		bf.bulk_update_voltages([{"battery_id": battery_id, "voltage_reading": 9.5}], "qa")
+		raise RuntimeError("boom")
+
+	with pytest.raises(RuntimeError, match="boom"):
+		get_writer().run(failing)
+
+	row = bf.scan_battery(str(battery_id))
+	assert row["current_voltage"] == 12.0
+	assert row["total_checks"] == 0
+	assert bf.check_journal().next_id() == next_check
+	assert _checks(battery_id, next_check).empty
+	assert bf.verify_dashboard_kpis()
+
+
+def test_committed_mutation_journals_its_checks(backend):
+	battery_id = _battery()
+	next_check = bf.check_journal().next_id()
+	bf.update_voltage(battery_id, 11.5, "qa", notes="ok")
+
+	history = _checks(battery_id, next_check)
+	assert history["voltage_reading"].tolist() == [11.5]
+	assert history["notes"].tolist() == ["ok"]
+	assert bf.scan_battery(str(battery_id))["total_checks"] == 1
+
+
+def test_queued_mutations_share_one_commit(backend):
+	writer = get_writer()
+	ids = [_battery() for _ in range(3)]
+	next_check = bf.check_journal().next_id()
+	started, release = threading.Event(), threading.Event()
+
+	def blocker():
+		started.set()
+		release.wait(5)
+
+	def failing(battery_id):
+		bf.update_voltage(battery_id, 9.0, "qa")
+		raise RuntimeError("boom")
+
+	held = writer.submit(blocker)
+	assert started.wait(5)
+	commits = writer.commits
+	futures = [
+		writer.submit(bf.update_voltage, ids[0], 11.0, "qa"),
+		writer.submit(failing, ids[1]),
+		writer.submit(bf.update_voltage, ids[2], 11.2, "qa"),
+	]
+	release.set()
+	held.result(5)
+	futures[0].result(5)
+	futures[2].result(5)
+	with pytest.raises(RuntimeError, match="boom"):
+		futures[1].result(5)
+
+	# The blocker's group, then everything queued behind it in one commit
+	assert writer.commits == commits + 2
+	assert [bf.scan_battery(str(i))["current_voltage"] for i in ids] == pytest.approx([11.0, 12.0, 11.2])
+	assert [len(_checks(i, next_check)) for i in ids] == [1, 0, 1]
+	assert bf.verify_dashboard_kpis()
+
+
+def test_failed_journal_append_is_not_reported_as_rollback(backend, monkeypatch):
+	monkeypatch.setattr(excel_handler, "AFTER_COMMIT_BACKOFF", 0)
+	writer = get_writer()
+	ids = [_battery() for _ in range(2)]
+	started, release = threading.Event(), threading.Event()
+	attempts = []
+
+	def blocker():
+		started.set()
+		release.wait(5)
+
+	def unjournaled(battery_id):
+		bf.update_voltage(battery_id, 9.0, "qa")
+		after_commit(attempts.append, battery_id)
+		after_commit(lambda: 1 / 0)
+
+	held = writer.submit(blocker)
+	assert started.wait(5)
+	futures = [
+		writer.submit(unjournaled, ids[0]),
+		writer.submit(bf.update_voltage, ids[1], 11.2, "qa"),
+	]
+	release.set()
+	held.result(5)
+	with pytest.raises(AfterCommitError, match="Changes were saved") as failure:
+		futures[0].result(5)
+	assert futures[1].result(5)["current_voltage"] == pytest.approx(11.2)
+
+	# The failing step was retried, the others ran once, and the writes stayed
+	assert isinstance(failure.value.errors[0], ZeroDivisionError)
+	assert attempts == [ids[0]]
+	assert bf.scan_battery(str(ids[0]))["current_voltage"] == pytest.approx(9.0)
@@ -0,0 +1,390 @@
+from __future__ import annotations
+
+import contextvars
+import heapq
+import json
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .battery_index import TableView, normalize_product
+from .file_lock import file_lock
+from .thresholds import get_profiles
+
+
+# Days a battery may go unchecked, by its status_color bucket. Gray batteries
+# have no usable reading and are due straight away. A battery that was never
+# checked is due at once too, but is alerted on once rather than reminded daily.
+CHECK_INTERVAL_DAYS = {"red": 1.0, "yellow": 3.0, "green": 14.0, "gray": 0.0}
+# An overdue alert repeats this often until the battery is checked
+REMIND_AFTER_DAYS = 1.0
+# Handed-over batteries (SPD, production) are no longer watched
+WATCHED_STATUSES = frozenset({"active"})
+LOW_LEVELS = frozenset({"red", "yellow"})
+
+OVERDUE = "overdue"
+LOW_VOLTAGE_ALERT = "low_voltage"
+
+# Longest the worker sleeps before checking for writes from other processes
+MAX_IDLE_SECONDS = 60.0
+# Alerts popped per pass, so one burst never holds the lock for long
+POP_BATCH = 10_000
+RECENT_ALERTS = 500
+
+ALERT_COLUMNS = ["kind", "battery_id", "product_number", "voltage", "level", "last_checked_date", "due_at", "raised_at"]
+UPCOMING_COLUMNS = ["due_at", "kind", "battery_id", "product_number", "voltage", "level", "last_checked_date"]
+
+_DAY_NS = 86_400 * 10**9
+_NAT = np.iinfo(np.int64).min
+_EPOCH = datetime(1970, 1, 1)
+
+
+@dataclass(frozen=True)
+class Alert:
+	kind: str
+	battery_id: int
+	product_number: Optional[str]
+	voltage: Optional[float]
+	level: str
+	last_checked_date: Optional[str]
+	due_at: str
+	raised_at: str
+
+
+def _ns(value: Any) -> int:
+	if value is None or (not isinstance(value, str) and pd.isna(value)):
+		return _NAT
+	ts = pd.to_datetime(value, errors="coerce")
+	return _NAT if pd.isna(ts) else int(ts.as_unit("ns").value)
+
+
+def _iso(ns: int) -> Optional[str]:
+	if ns == _NAT:
+		return None
+	return (_EPOCH + timedelta(microseconds=ns // 1000)).isoformat(timespec="seconds")
+
+
+def _watched(status: Any) -> bool:
+	return str(status).lower() in WATCHED_STATUSES
+
+
+def _check_due(last_ns: int, level: str, now_ns: int) -> int:
+	if last_ns == _NAT:
+		return now_ns
+	return last_ns + int(CHECK_INTERVAL_DAYS[level] * _DAY_NS)
+
+
+class AlertScheduler(TableView):
+	"""Overdue-check and low-voltage alerts, kept on a min-heap by due time.
+
+	Each watched battery has an overdue entry due `CHECK_INTERVAL_DAYS` after
+	its last check, and a low-voltage entry when a red or yellow reading
+	comes in. Row changes re-key only the batteries they touch: the new
+	entry is pushed and the old one is left in the heap as stale, to be
+	skipped when it surfaces. The worker thread sleeps until the earliest
+	entry is due (or a push makes an earlier one), so the inventory is never
+	rescanned on a timer.
+	"""
+
+	def __init__(self, log_path: Optional[str | Path] = None):
+		super().__init__()
+		self.log_path = Path(log_path) if log_path is not None else None
+		# (kind, battery id) -> latest due_at in the log, as far as it has been read
+		self._logged: dict[tuple[str, int], str] = {}
+		# Batteries with an overdue alert logged before their first check
+		self._logged_unchecked: set[int] = set()
+		self._log_offset = 0
+		self.cond = threading.Condition(self.lock)
+		# battery id -> (product number, voltage, last checked ns, level) for watched batteries
+		self.rows: dict[int, tuple[Optional[str], Optional[float], int, str]] = {}
+		# [due ns, seq, battery id, kind]; an entry is live while pending[(id, kind)] == seq
+		self.heap: list[tuple[int, int, int, str]] = []
+		self.pending: dict[tuple[int, str], int] = {}
+		# (id, kind) -> (last checked ns alerted on, next reminder ns); survives rebuilds
+		self.sent: dict[tuple[int, str], tuple[int, int]] = {}
+		# Low-voltage alerts on rebuild only cover readings taken after this
+		self.since_ns: Optional[int] = None
+		self.recent: deque[Alert] = deque(maxlen=RECENT_ALERTS)
+		self.raised = 0
+		self.last_error: Optional[str] = None
+		self._seq = 0
+		self._handlers: list[Callable[[list[Alert]], None]] = []
+		self._stop = threading.Event()
+		self._thread: Optional[threading.Thread] = None
+		self._start_lock = threading.Lock()
+		self.profiles = get_profiles()
+
+	def stale(self) -> bool:
+		# Changed thresholds move batteries between levels, so the schedule is rebuilt
+		return self.profiles is not get_profiles()
+
+	# --- schedule ----------------------------------------------------------
+
+	def build(self, df: pd.DataFrame) -> None:
+		now = pd.Timestamp.now().value
+		df = df[df["id"].notna()].drop_duplicates("id")
+		df = df[df["status"].astype("string").str.lower().isin(WATCHED_STATUSES).to_numpy(bool, na_value=False)]
+		ids = df["id"].to_numpy("int64")
+		self.profiles = get_profiles()
+		levels = self.profiles.buckets(df["current_voltage"], df["product_number"])
+		voltages = df["current_voltage"].to_numpy("float64", na_value=np.nan)
+		last = pd.to_datetime(df["last_checked_date"], errors="coerce").to_numpy("datetime64[ns]").view("int64")
+		interval = (pd.Series(levels, dtype=object).map(CHECK_INTERVAL_DAYS).to_numpy("float64") * _DAY_NS).astype("int64")
+		due = np.where(last == _NAT, now, last + interval)
+		products = df["product_number"].to_numpy(object, na_value=None)
+
+		self.rows = dict(zip(
+			ids.tolist(),
+			zip(products.tolist(), np.where(np.isnan(voltages), None, voltages).tolist(), last.tolist(), levels.tolist()),
+		))
+		seqs = range(self._seq, self._seq + len(ids))
+		self._seq += len(ids)
+		heap = list(zip(due.tolist(), seqs, ids.tolist(), [OVERDUE] * len(ids)))
+		# Readings taken since the last look (none on the first build) also raise a low-voltage alert
+		since = self.since_ns if self.since_ns is not None else now
+		low = np.isin(levels, list(LOW_LEVELS)) & (last != _NAT) & (last >= since)
+		low_seqs = range(self._seq, self._seq + int(low.sum()))
+		self._seq += len(low_seqs)
+		heap += zip(last[low].tolist(), low_seqs, ids[low].tolist(), [LOW_VOLTAGE_ALERT] * len(low_seqs))
+		heapq.heapify(heap)
+		self.heap = heap
+		self.pending = {(battery_id, kind): seq for _, seq, battery_id, kind in heap}
+		self.since_ns = now
+
+		# Keep reminders and already-sent alerts for batteries not checked since
+		for (battery_id, kind), (last_ns, remind_ns) in list(self.sent.items()):
+			row = self.rows.get(battery_id)
+			if row is None or row[2] != last_ns:
+				del self.sent[(battery_id, kind)]
+			elif kind == OVERDUE and last_ns != _NAT:
+				self._push(remind_ns, battery_id, OVERDUE)
+			else:
+				self.pending.pop((battery_id, kind), None)
+		with self.cond:
+			self.cond.notify_all()
+
+	def apply(self, old: Optional[dict], new: Optional[dict]) -> None:
+		if new is None:
+			if old is not None:
+				self._drop(int(old["id"]))
+			return
+		battery_id = int(new["id"])
+		if not _watched(new.get("status")):
+			self._drop(battery_id)
+			return
+		voltage = new.get("current_voltage")
+		voltage = None if voltage is None or pd.isna(voltage) else float(voltage)
+		product = normalize_product(new.get("product_number"))
+		level = self.profiles.bucket(voltage, product)
+		row = (product, voltage, _ns(new.get("last_checked_date")), level)
+		prev = self.rows.get(battery_id)
+		self.rows[battery_id] = row
+		now = pd.Timestamp.now().value
+		if prev is None or prev[2:] != row[2:]:
+			self.sent.pop((battery_id, OVERDUE), None)
+			self._push(_check_due(row[2], level, now), battery_id, OVERDUE)
+		if level in LOW_LEVELS and row[2] != _NAT and (prev is None or prev[2] != row[2]):
+			# A low reading just came in; due at its check time, as on a rebuild, so every process agrees
+			self.sent.pop((battery_id, LOW_VOLTAGE_ALERT), None)
+			self._push(row[2], battery_id, LOW_VOLTAGE_ALERT)
+		elif level not in LOW_LEVELS:
+			self.pending.pop((battery_id, LOW_VOLTAGE_ALERT), None)
+
+	def advance(self, before: tuple, after: tuple, changes: list[tuple[Optional[dict], Optional[dict]]]) -> None:
+		super().advance(before, after, changes)
+		if self.version is None:
+			# Missed a write: wake the worker so it rebuilds
+			with self.cond:
+				self.cond.notify_all()
+
+	def _drop(self, battery_id: int) -> None:
+		self.rows.pop(battery_id, None)
+		for kind in (OVERDUE, LOW_VOLTAGE_ALERT):
+			self.pending.pop((battery_id, kind), None)
+			self.sent.pop((battery_id, kind), None)
+
+	def _push(self, due_ns: int, battery_id: int, kind: str) -> None:
+		wake = not self.heap or due_ns < self.heap[0][0]
+		self._seq += 1
+		self.pending[(battery_id, kind)] = self._seq
+		heapq.heappush(self.heap, (due_ns, self._seq, battery_id, kind))
+		if len(self.heap) > 2 * len(self.pending) + 1024:
+			# Mostly stale entries: drop them in one pass
+			self.heap = [e for e in self.heap if self.pending.get((e[2], e[3])) == e[1]]
+			heapq.heapify(self.heap)
+		if wake:
+			with self.cond:
+				self.cond.notify_all()
+
+	def _live(self, entry: tuple[int, int, int, str]) -> bool:
+		return self.pending.get((entry[2], entry[3])) == entry[1]
+
+	def next_due(self) -> Optional[int]:
+		"""Due time (ns) of the earliest live entry; stale entries on top are discarded."""
+		with self.lock:
+			while self.heap and not self._live(self.heap[0]):
+				heapq.heappop(self.heap)
+			return self.heap[0][0] if self.heap else None
+
+	def pop_due(self, now_ns: Optional[int] = None, limit: int = POP_BATCH) -> list[Alert]:
+		"""Remove and return up to `limit` alerts due by `now_ns`, scheduling overdue reminders."""
+		now = pd.Timestamp.now().value if now_ns is None else now_ns
+		raised_at = _iso(now)
+		alerts = []
+		with self.lock:
+			while self.heap and self.heap[0][0] <= now and len(alerts) < limit:
+				entry = heapq.heappop(self.heap)
+				if not self._live(entry):
+					continue
+				due, _, battery_id, kind = entry
+				del self.pending[(battery_id, kind)]
+				product, voltage, last_ns, level = self.rows[battery_id]
+				alerts.append(Alert(kind, battery_id, product, voltage, level, _iso(last_ns), _iso(due), raised_at))
+				if kind == OVERDUE and last_ns != _NAT:
+					# Whole reminder periods after the due time, so every process reminds at the same times
+					period = int(REMIND_AFTER_DAYS * _DAY_NS)
+					remind = due + ((now - due) // period + 1) * period
+					self.sent[(battery_id, kind)] = (last_ns, remind)
+					self._push(remind, battery_id, kind)
+				else:
+					self.sent[(battery_id, kind)] = (last_ns, now)
+		return alerts
+
+	def upcoming(self, limit: int = 20) -> pd.DataFrame:
+		"""The next `limit` scheduled alerts, soonest first (some may already be due)."""
+		with self.lock:
+			entries = heapq.nsmallest(limit, (e for e in self.heap if self._live(e)))
+			rows = [(due, kind, battery_id, *self.rows[battery_id]) for due, _, battery_id, kind in entries]
+		df = pd.DataFrame(rows, columns=["due_at", "kind", "battery_id", "product_number", "voltage", "last_checked_date", "level"])
+		df["due_at"] = pd.to_datetime(df["due_at"], unit="ns")
+		df["last_checked_date"] = pd.to_datetime(df["last_checked_date"].where(df["last_checked_date"] != _NAT), unit="ns")
+		return df[UPCOMING_COLUMNS]
+
+	def recent_alerts(self, limit: int = 50) -> pd.DataFrame:
+		"""Alerts raised by this process, newest first."""
+		with self.lock:
+			alerts = list(self.recent)[-limit:][::-1] if limit > 0 else []
+		return pd.DataFrame([vars(a) for a in alerts], columns=ALERT_COLUMNS)
+
+	# --- worker ------------------------------------------------------------
+
+	def subscribe(self, handler: Callable[[list[Alert]], None]) -> None:
+		"""Call `handler` with each batch of alerts as it is raised (on the worker thread)."""
+		self._handlers.append(handler)
+
+	def start(self, refresh: Callable[[], Any]) -> None:
+		"""Run the worker; `refresh` brings the schedule up to date with the battery table."""
+		if self._thread is not None and self._thread.is_alive():
+			return
+		with self._start_lock:
+			if self._thread is None or not self._thread.is_alive():
+				self._stop.clear()
+				# In the starting caller's context, so the worker sees the same data directory and profiles
+				run = contextvars.copy_context().run
+				self._thread = threading.Thread(target=run, args=(self._loop, refresh), name="alerts", daemon=True)
+				self._thread.start()
+
+	def stop(self) -> None:
+		self._stop.set()
+		with self.cond:
+			self.cond.notify_all()
+		if self._thread is not None:
+			self._thread.join()
+
+	@property
+	def running(self) -> bool:
+		return self._thread is not None and self._thread.is_alive()
+
+	def _loop(self, refresh: Callable[[], Any]) -> None:
+		while not self._stop.is_set():
+			try:
+				refresh()
+				failed = False
+			except Exception as e:
+				self.last_error = f"{type(e).__name__}: {e}"
+				failed = True
+			alerts = self.pop_due()
+			if alerts:
+				self._emit(alerts)
+				continue
+			with self.cond:
+				if self._stop.is_set():
+					break
+				due = self.next_due()
+				wait = MAX_IDLE_SECONDS if due is None else (due - pd.Timestamp.now().value) / 1e9
+				# A stale schedule (missed write) is rebuilt at once unless that just failed
+				if wait > 0 and (self.version is not None or failed):
+					self.cond.wait(min(wait, MAX_IDLE_SECONDS))
+
+	def _read_log(self) -> None:
+		"""Fold in what was appended to the log since the last read."""
+		try:
+			with open(self.log_path, "rb") as fh:
+				if fh.seek(0, 2) < self._log_offset:
+					# Truncated or replaced: read it again from the start
+					self._logged.clear()
+					self._logged_unchecked.clear()
+					self._log_offset = 0
+				fh.seek(self._log_offset)
+				data = fh.read()
+		except FileNotFoundError:
+			return
+		end = data.rfind(b"\n") + 1
+		for line in data[:end].splitlines():
+			try:
+				record = json.loads(line)
+				key = (record["kind"], int(record["battery_id"]))
+			except (ValueError, KeyError, TypeError):
+				continue
+			due = record.get("due_at") or ""
+			if due > self._logged.get(key, ""):
+				self._logged[key] = due
+			if key[0] == OVERDUE and not record.get("last_checked_date"):
+				self._logged_unchecked.add(key[1])
+		self._log_offset += end
+
+	def _record(self, alerts: list[Alert]) -> list[Alert]:
+		"""Log the alerts no process has logged yet, and return them.
+
+		Every process using the data directory runs a worker over the same
+		log, so it is appended under a file lock after reading what the others
+		wrote. An alert is a repeat when its battery already has one of its kind
+		logged at the same or a later due time. A never-checked battery is due
+		whenever a schedule is built, so its overdue alert is a repeat once any
+		has been logged before its first check.
+		"""
+		if self.log_path is None:
+			return alerts
+		self.log_path.parent.mkdir(parents=True, exist_ok=True)
+		with file_lock(self.log_path.with_name(f".{self.log_path.name}.lock")):
+			self._read_log()
+			fresh = [a for a in alerts if not self._repeat(a)]
+			if fresh:
+				with open(self.log_path, "a", encoding="utf-8") as fh:
+					fh.writelines(json.dumps(vars(a)) + "\n" for a in fresh)
+				self._read_log()
+		return fresh
+
+	def _repeat(self, alert: Alert) -> bool:
+		if alert.kind == OVERDUE and alert.last_checked_date is None:
+			return alert.battery_id in self._logged_unchecked
+		return alert.due_at <= self._logged.get((alert.kind, alert.battery_id), "")
+
+	def _emit(self, alerts: list[Alert]) -> None:
+		alerts = self._record(alerts)
+		if not alerts:
+			return
+		with self.lock:
+			self.recent.extend(alerts)
+			self.raised += len(alerts)
+		for handler in list(self._handlers):
+			try:
+				handler(alerts)
+			except Exception as e:
+				self.last_error = f"{type(e).__name__}: {e}"
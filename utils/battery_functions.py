@@ -1,80 +1,285 @@
 from __future__ import annotations
 
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Iterator, Optional
 
+import numpy as np
 import pandas as pd
 
+from .alerts import AlertScheduler
+from .battery_index import BatteryIndex, TableView
+from .check_journal import CheckJournal, open_journal
 from .excel_handler import (
 	DATA_DIR,
+	after_commit,
 	append_row,
+	append_rows,
+	data_root,
+	delete_row,
 	ensure_file,
 	generate_next_id,
+	get_backend,
+	on_commit,
 	read_excel,
+	table_version,
+	update_row,
+	update_rows,
 	write_excel,
 )
+from .instrumentation import instrument_module
+from .kpis import DashboardKPIs, voltage_bucket
+from .product_search import ProductSearch
+from .replica import ReadReplica, ReplicaPublisher
+from .schema import BATTERY_SCHEMA, CHECK_SCHEMA, apply_schema, widen
+from .subscriptions import SUBSCRIPTION_COLUMNS
+from .thresholds import get_profiles
+from .trends import VoltageTrends
+from .write_queue import serialized
 
 
+BATTERY_COLUMNS = [
+	"id",
+	"product_number",
+	"current_voltage",
+	"last_checked_date",
+	"packing_month",
+	"status",
+	"total_checks",
+]
+CHECK_COLUMNS = [
+	"id",
+	"battery_id",
+	"voltage_reading",
+	"voltage_during_check",
+	"checked_by",
+	"notes",
+	"checked_at",
+]
+
+
+class DataRoot:
+	"""The tables of one data directory and the structures derived from them.
+
+	Every directory the process works on (DATA_DIR, and each site) has one,
+	built on first use and found by `_data()` from `data_root()`. Background
+	threads (replica publisher, alert worker) are handed their directory's
+	instance, so they never depend on the context they were started from.
+	"""
+
+	def __init__(self, root: Path):
+		self.root = root
+		self.batteries = root / "batteries.xlsx"
+		self.stakeholders = root / "stakeholders.xlsx"
+		self.checks = root / "battery_checks.xlsx"
+		# Append-only check log; seeded from `checks` the first time it is opened
+		self.journal_dir = root / "battery_checks"
+		# Per-battery voltage regression rollup, advanced from the journal by check id
+		self.trends = VoltageTrends(self.journal_dir / "voltage_trends.parquet")
+		# Structures derived from the battery table, kept in step with mutations below
+		self.scan_index = BatteryIndex()
+		self.kpis = DashboardKPIs()
+		self.product_search = ProductSearch()
+		# Every alert raised by the background scheduler, one JSON object per line
+		self.alerts = AlertScheduler(root / "alerts.jsonl")
+		self.views: list[TableView] = [self.scan_index, self.kpis, self.product_search, self.alerts]
+		# Memory-mapped Arrow snapshots of the committed battery and check tables
+		self.replica = ReadReplica(root / "replica")
+		self.publisher = ReplicaPublisher(self.replica, {
+			"batteries": (lambda: table_version(self.batteries), lambda: _load_batteries(self)),
+			# Check history is append-only: the snapshot holds the compacted months, is
+			# republished only when a compaction moves them, and readers add the journal tail
+			"battery_checks": (lambda: _journal(self).compacted_id(), lambda: _load_compacted_checks(self)),
+		})
+
+
+# The app's own directory
 BATTERIES_XLSX = DATA_DIR / "batteries.xlsx"
 STAKEHOLDERS_XLSX = DATA_DIR / "stakeholders.xlsx"
 CHECKS_XLSX = DATA_DIR / "battery_checks.xlsx"
+CHECKS_JOURNAL_DIR = DATA_DIR / "battery_checks"
+ALERTS_LOG = DATA_DIR / "alerts.jsonl"
+REPLICA_DIR = DATA_DIR / "replica"
+
+_roots: dict[Path, DataRoot] = {}
+_roots_lock = threading.Lock()
+
+
+def _data() -> DataRoot:
+	"""State of the data directory in use (see `use_data_root`)."""
+	root = data_root()
+	data = _roots.get(root)
+	if data is None:
+		with _roots_lock:
+			data = _roots.get(root)
+			if data is None:
+				data = _roots[root] = DataRoot(root)
+	return data
+
+
+def _ensure(data: DataRoot) -> None:
+	ensure_file(data.batteries, BATTERY_COLUMNS)
+	ensure_file(data.stakeholders, ["id", "name", "email"] + SUBSCRIPTION_COLUMNS)
+	ensure_file(data.checks, CHECK_COLUMNS)
 
 
 def ensure_all_files() -> None:
-	ensure_file(BATTERIES_XLSX, [
-		"id",
-		"product_number",
-		"current_voltage",
-		"last_checked_date",
-		"packing_month",
-		"status",
-		"total_checks",
-	])
-	ensure_file(STAKEHOLDERS_XLSX, ["id", "name", "email"])
-	ensure_file(CHECKS_XLSX, [
-		"id",
-		"battery_id",
-		"voltage_reading",
-		"voltage_during_check",
-		"checked_by",
-		"notes",
-		"checked_at",
-	])
+	_ensure(_data())
+
+
+def _journal(data: DataRoot) -> CheckJournal:
+	_ensure(data)
+	return open_journal(data.journal_dir, CHECK_COLUMNS, seed=lambda: read_excel(data.checks))
+
+
+def check_journal() -> CheckJournal:
+	return _journal(_data())
+
+
+def _load_compacted_checks(data: DataRoot) -> pd.DataFrame:
+	return apply_schema(_journal(data).read_compacted()[1], CHECK_SCHEMA)
+
+
+def _load_checks() -> pd.DataFrame:
+	return apply_schema(check_journal().read(), CHECK_SCHEMA)
+
+
+def _checks_tail(data: DataRoot, covered: Any) -> pd.DataFrame:
+	return apply_schema(_journal(data).read_since(int(covered)), CHECK_SCHEMA)
+
+
+def read_checks() -> pd.DataFrame:
+	"""Full check history: monthly partitions plus the journal tail.
+
+	The partitions come from the replica when one has been published; any
+	snapshot is complete up to the id it covers, so only the checks after it
+	are read from the journal.
+	"""
+	data = _data()
+	snapshot = data.replica.latest("battery_checks")
+	if snapshot is None:
+		data.publisher.wake()
+		return widen(_load_checks(), CHECK_SCHEMA)
+	covered, df = snapshot
+	tail = _checks_tail(data, covered)
+	if not len(tail) or not len(df):
+		df = df if not len(tail) else tail
+	else:
+		df = pd.concat([df, tail.astype(df.dtypes.to_dict())], ignore_index=True)
+	return widen(df, CHECK_SCHEMA)
+
+
+def recent_checks(days: float = 7) -> pd.DataFrame:
+	"""Checks from the last `days` days; only the months they fall in are read."""
+	since = pd.Timestamp.now() - pd.Timedelta(days=float(days))
+	return widen(apply_schema(check_journal().read_range(start=since), CHECK_SCHEMA), CHECK_SCHEMA)
+
+
+def battery_history(battery_id: int, days: Optional[float] = None) -> pd.DataFrame:
+	"""One battery's checks, newest first, optionally limited to the last `days` days."""
+	since = pd.Timestamp.now() - pd.Timedelta(days=float(days)) if days is not None else None
+	df = widen(apply_schema(check_journal().read_range(start=since, battery_ids=[int(battery_id)]), CHECK_SCHEMA), CHECK_SCHEMA)
+	return df.sort_values("checked_at", ascending=False, kind="stable", na_position="last", ignore_index=True)
+
+
+def iter_checks(chunk_rows: int = 50_000) -> Iterator[pd.DataFrame]:
+	"""Check history in typed chunks, for consumers that must not hold it whole."""
+	data = _data()
+	snapshot = data.replica.latest_batches("battery_checks", chunk_rows)
+	if snapshot is None:
+		data.publisher.wake()
+		for chunk in _journal(data).iter_chunks(chunk_rows):
+			yield widen(apply_schema(chunk, CHECK_SCHEMA), CHECK_SCHEMA)
+		return
+	covered, chunks = snapshot
+	for chunk in chunks:
+		yield widen(apply_schema(chunk, CHECK_SCHEMA), CHECK_SCHEMA)
+	tail = widen(_checks_tail(data, covered), CHECK_SCHEMA)
+	for start in range(0, len(tail), chunk_rows):
+		yield tail.iloc[start : start + chunk_rows]
+
+
+def _load_batteries(data: DataRoot) -> pd.DataFrame:
+	_ensure(data)
+	return read_excel(data.batteries)
+
+
+def _replicated(data: DataRoot, name: str, version: Callable[[], Any]) -> Optional[pd.DataFrame]:
+	"""The replica of `name` if it is current; otherwise ask for a publish and return None.
+
+	Writes inside a transaction are not committed yet, so the writer always
+	reads the primary tables.
+	"""
+	if get_backend().in_transaction():
+		return None
+	df = data.replica.read(name, version())
+	if df is None:
+		data.publisher.wake()
+	return df
+
+
+def _read_batteries(data: DataRoot) -> pd.DataFrame:
+	_ensure(data)
+	df = _replicated(data, "batteries", lambda: table_version(data.batteries))
+	return read_excel(data.batteries) if df is None else df
 
 
 def read_batteries() -> pd.DataFrame:
-	ensure_all_files()
-	return read_excel(BATTERIES_XLSX)
+	"""The battery table, from the memory-mapped replica when it is current."""
+	return widen(_read_batteries(_data()), BATTERY_SCHEMA)
 
 
 def save_batteries(df: pd.DataFrame) -> None:
-	write_excel(df, BATTERIES_XLSX)
+	write_excel(df, _data().batteries)
+
+
+def _fresh(data: DataRoot, view: TableView) -> TableView:
+	"""Return `view` rebuilt if the battery table changed since it was built."""
+	if view.version != table_version(data.batteries) or view.stale():
+		_ensure(data)
+		view.refresh(table_version(data.batteries), lambda: _read_batteries(data))
+	return view
+
+
+def _rows_changed(data: DataRoot, before: tuple, changes: list[tuple[Optional[dict], Optional[dict]]]) -> None:
+	"""Fold (old, new) row changes into every view that was current before them."""
+	after = table_version(data.batteries)
+	for view in data.views:
+		view.advance(before, after, changes)
+
+
+def _committed(changes: dict[Path, tuple]) -> None:
+	for data in list(_roots.values()):
+		change = changes.get(data.batteries.resolve())
+		if change is None:
+			continue
+		for view in data.views:
+			view.settle(*change)
+		if change[1] is not None:
+			# The check snapshot is only republished once a compaction has moved it
+			data.publisher.wake()
+
+
+on_commit(_committed)
 
 
 def scan_battery(identifier: str) -> Optional[pd.Series]:
 	"""Find a battery by id or product_number."""
-	df = read_batteries()
-	if df.empty:
+	data = _data()
+	index = _fresh(data, data.scan_index)
+	row = index.lookup(identifier)
+	if row is None:
 		return None
-	# Try id exact match
-	try:
-		ident_int = int(identifier)
-		match = df.loc[df["id"] == ident_int]
-		if not match.empty:
-			return match.iloc[0]
-	except Exception:
-		pass
-	# Try product number exact match (string compare)
-	match = df.loc[df["product_number"].astype(str).str.strip() == str(identifier).strip()]
-	if not match.empty:
-		return match.iloc[0]
-	return None
+	return widen(index.series(row), BATTERY_SCHEMA)
 
 
+@serialized
 def add_battery(product_number: str, packing_month: str | None = None, initial_voltage: float | None = None) -> pd.Series:
-	df = read_batteries()
-	new_id = generate_next_id(df)
+	data = _data()
+	_ensure(data)
+	before = table_version(data.batteries)
+	new_id = generate_next_id(data.batteries)
 	row = {
 		"id": new_id,
 		"product_number": product_number,
@@ -84,19 +289,96 @@ def add_battery(product_number: str, packing_month: str | None = None, initial_v
 		"status": "active",
 		"total_checks": 0,
 	}
-	df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-	save_batteries(df)
-	return df.loc[df["id"] == new_id].iloc[0]
+	added = append_row(data.batteries, row)
+	_rows_changed(data, before, [(None, added.to_dict())])
+	return widen(added, BATTERY_SCHEMA)
+
+
+@serialized
+def import_batteries(
+	manifest: pd.DataFrame | list[dict],
+	packing_month: str | None = None,
+) -> pd.DataFrame:
+	"""Add every new battery on a supplier manifest in one write.
+
+	`manifest` needs `product_number` (or `product`); `packing_month` and
+	`current_voltage` (or `voltage`, `initial_voltage`) are optional, with
+	`packing_month` falling back to the argument. Product numbers are
+	stripped and matched against the inventory and the rest of the manifest
+	in one join: numbers already stocked, and repeats after the first, are
+	skipped. New rows get one contiguous id range and are appended together.
+
+	Returns the manifest with `status` ("inserted", "duplicate" or
+	"invalid"), `error` and the assigned `id`.
+	"""
+	data = _data()
+	df = pd.DataFrame(manifest).reset_index(drop=True)
+	for alias, column in (("product", "product_number"), ("voltage", "current_voltage"), ("initial_voltage", "current_voltage")):
+		if column not in df.columns and alias in df.columns:
+			df = df.rename(columns={alias: column})
+	if "product_number" not in df.columns:
+		raise ValueError("Missing column: product_number")
+	for column in ("packing_month", "current_voltage"):
+		if column not in df.columns:
+			df[column] = None
+	if packing_month:
+		df["packing_month"] = df["packing_month"].where(df["packing_month"].notna(), packing_month)
 
+	products = df["product_number"].astype("string").str.strip()
+	raw_volts = df["current_voltage"].astype("string").str.strip()
+	volts = pd.to_numeric(raw_volts, errors="coerce")
+	blank = (products.isna() | (products == "")).to_numpy(bool, na_value=True)
+	bad_voltage = (volts.isna() & raw_volts.notna() & (raw_volts != "")).to_numpy(bool, na_value=False)
+	stocked = products.isin(_read_batteries(data)["product_number"].dropna().unique()).to_numpy(bool, na_value=False)
+	# Repeats count only against earlier rows that would themselves be inserted
+	candidates = ~(blank | bad_voltage | stocked)
+	repeated = candidates & products.where(candidates).duplicated(keep="first").to_numpy(bool, na_value=False)
+	df["error"] = np.select(
+		[blank, bad_voltage, stocked, repeated],
+		["Product number required", "Invalid voltage", "Already in inventory", "Repeated in manifest"],
+		default="",
+	)
+	df["status"] = np.select(
+		[df["error"] == "", df["error"].isin(["Already in inventory", "Repeated in manifest"])],
+		["inserted", "duplicate"],
+		default="invalid",
+	)
+	ok = (df["status"] == "inserted").to_numpy()
+	df["id"] = pd.array([pd.NA] * len(df), dtype="Int64")
+	if not ok.any():
+		return df
 
+	before = table_version(data.batteries)
+	start = generate_next_id(data.batteries)
+	ids = np.arange(start, start + int(ok.sum()), dtype="int64")
+	rows = pd.DataFrame({
+		"id": ids,
+		"product_number": products[ok].to_numpy(object),
+		"current_voltage": volts[ok].to_numpy("float64"),
+		"last_checked_date": pd.Series(pd.NaT, index=range(len(ids)), dtype="datetime64[ns]"),
+		"packing_month": df.loc[ok, "packing_month"].astype("string").str.strip().to_numpy(object),
+		"status": "active",
+		"total_checks": 0,
+	})[BATTERY_COLUMNS]
+	append_rows(data.batteries, rows)
+	df.loc[ok, "id"] = ids
+	records = rows.astype(object).where(rows.notna(), None).to_dict("records")
+	_rows_changed(data, before, [(None, row) for row in records])
+	return df
+
+
+@serialized
 def delete_battery(battery_id: int) -> bool:
-	df = read_batteries()
-	before = len(df)
-	df = df.loc[df["id"] != battery_id]
-	save_batteries(df)
-	return len(df) < before
+	data = _data()
+	old = _fresh(data, data.scan_index).get_id(battery_id)
+	before = table_version(data.batteries)
+	removed = delete_row(data.batteries, battery_id)
+	if removed:
+		_rows_changed(data, before, [(old, None)])
+	return removed
 
 
+@serialized
 def update_voltage(
 	battery_id: int,
 	voltage_reading: float,
@@ -105,39 +387,211 @@ def update_voltage(
 	voltage_during_check: float | None = None,
 ) -> pd.Series:
 	"""Update a battery's voltage, increment total_checks, create a check row."""
-	ensure_all_files()
-	b_df = read_batteries()
-	if b_df.empty or battery_id not in set(b_df["id"]):
+	data = _data()
+	current = _fresh(data, data.scan_index).get_id(battery_id)
+	if current is None:
+		raise ValueError("Battery not found")
+	before = table_version(data.batteries)
+	total_checks = int(current["total_checks"]) if pd.notna(current["total_checks"]) else 0
+	updated = update_row(data.batteries, battery_id, {
+		"current_voltage": voltage_reading,
+		"last_checked_date": datetime.now(),
+		"total_checks": total_checks + 1,
+	})
+	if updated is None:
 		raise ValueError("Battery not found")
-	row_idx = b_df.index[b_df["id"] == battery_id][0]
-	b_df.at[row_idx, "current_voltage"] = voltage_reading
-	b_df.at[row_idx, "last_checked_date"] = datetime.now()
-	b_df.at[row_idx, "total_checks"] = int(b_df.at[row_idx, "total_checks"] or 0) + 1
-	save_batteries(b_df)
-
-	checks_df = read_excel(CHECKS_XLSX)
-	new_check_id = generate_next_id(checks_df)
-	check_row = {
-		"id": new_check_id,
+	_rows_changed(data, before, [(current, updated.to_dict())])
+
+	after_commit(_journal(data).append, {
 		"battery_id": battery_id,
 		"voltage_reading": voltage_reading,
 		"voltage_during_check": voltage_during_check,
 		"checked_by": checked_by,
 		"notes": notes,
 		"checked_at": datetime.now(),
-	}
-	append_row(CHECKS_XLSX, check_row)
-	return b_df.loc[b_df["id"] == battery_id].iloc[0]
+	})
+	return widen(updated, BATTERY_SCHEMA)
+
+
+@serialized
+def bulk_update_voltages(readings: pd.DataFrame | list[dict], checked_by: str | None = None) -> pd.DataFrame:
+	"""Apply many voltage readings at once, e.g. a handheld meter export.
+
+	`readings` needs `battery_id` (or `id`) and `voltage_reading` (or
+	`voltage`); `checked_by`, `notes`, `voltage_during_check` and `checked_at`
+	are optional, with `checked_by` falling back to the argument. All rows
+	are validated together, the battery table is written once and every check
+	row is appended in one journal batch. Invalid rows do not stop the rest.
+	A reading taken before the battery's last check is journaled and counted
+	but leaves its current voltage and last check date alone.
+
+	Returns the readings with `status` ("updated", "stale" for such older
+	readings, or "failed") and `error`.
+	"""
+	df = pd.DataFrame(readings).reset_index(drop=True)
+	for alias, column in (("id", "battery_id"), ("voltage", "voltage_reading")):
+		if column not in df.columns and alias in df.columns:
+			df = df.rename(columns={alias: column})
+	missing = [c for c in ("battery_id", "voltage_reading") if c not in df.columns]
+	if missing:
+		raise ValueError(f"Missing column(s): {', '.join(missing)}")
+	for column in ("checked_by", "notes", "voltage_during_check", "checked_at"):
+		if column not in df.columns:
+			df[column] = None
+	if checked_by:
+		df["checked_by"] = df["checked_by"].where(df["checked_by"].notna(), checked_by)
+
+	data = _data()
+	index = _fresh(data, data.scan_index)
+	ids = pd.to_numeric(df["battery_id"], errors="coerce")
+	volts = pd.to_numeric(df["voltage_reading"], errors="coerce")
+	during = pd.to_numeric(df["voltage_during_check"], errors="coerce")
+	now = datetime.now()
+	checked_at = pd.to_datetime(df["checked_at"], errors="coerce", format="mixed").fillna(pd.Timestamp(now))
+	by = df["checked_by"].astype("string").str.strip()
+	df["error"] = np.select(
+		[
+			ids.isna() | (ids % 1 != 0),
+			~ids.isin(list(index.rows)),
+			volts.isna(),
+			by.isna() | (by == ""),
+		],
+		["Invalid battery id", "Battery not found", "Invalid voltage", "checked_by required"],
+		default="",
+	)
+	df["status"] = np.where(df["error"] == "", "updated", "failed")
+	ok = df["status"] == "updated"
+	if not ok.any():
+		return df
+	stored = pd.to_datetime(pd.Series(
+		[index.get_id(int(i))["last_checked_date"] if found else pd.NaT for i, found in zip(ids, ok)],
+		index=df.index,
+		dtype=object,
+	))
+	stale = ok & (checked_at < stored)
+	df.loc[stale, "status"] = "stale"
+
+	valid = pd.DataFrame({
+		"battery_id": ids[ok].astype("int64"),
+		"voltage_reading": volts[ok],
+		"voltage_during_check": during[ok],
+		"checked_by": by[ok],
+		"notes": df.loc[ok, "notes"],
+		"checked_at": checked_at[ok],
+	})
+	# Latest reading per battery wins unless the stored check is later; every reading counts as a check
+	counts = valid.groupby("battery_id").size()
+	latest = (
+		valid[~stale[ok]]
+		.sort_values("checked_at", kind="stable")
+		.drop_duplicates("battery_id", keep="last")
+		.set_index("battery_id")
+		.reindex(counts.index)
+	)
+	old_rows = {battery_id: index.get_id(battery_id) for battery_id in counts.index}
+	old = pd.DataFrame(list(old_rows.values()), index=counts.index)
+	old_totals = pd.to_numeric(old["total_checks"], errors="coerce").fillna(0).astype("int64")
+	kept = latest["checked_at"].isna()
+	updates = pd.DataFrame({
+		"id": counts.index,
+		"current_voltage": latest["voltage_reading"].where(~kept, pd.to_numeric(old["current_voltage"], errors="coerce")).to_numpy(),
+		"last_checked_date": latest["checked_at"].where(~kept, pd.to_datetime(old["last_checked_date"])).to_numpy(),
+		"total_checks": (old_totals + counts).to_numpy(),
+	})
+
+	before = table_version(data.batteries)
+	update_rows(data.batteries, updates)
+	_rows_changed(data, before, [
+		(old_rows[update["id"]], {**old_rows[update["id"]], **update})
+		for update in updates.to_dict("records")
+	])
+
+	after_commit(_journal(data).append_many, valid.to_dict("records"))
+	return df
 
 
+@serialized
 def handover_status(battery_id: int, new_status: str) -> pd.Series:
-	b_df = read_batteries()
-	if b_df.empty or battery_id not in set(b_df["id"]):
+	data = _data()
+	current = _fresh(data, data.scan_index).get_id(battery_id)
+	before = table_version(data.batteries)
+	updated = update_row(data.batteries, battery_id, {"status": new_status})
+	if updated is None:
 		raise ValueError("Battery not found")
-	row_idx = b_df.index[b_df["id"] == battery_id][0]
-	b_df.at[row_idx, "status"] = new_status
-	save_batteries(b_df)
-	return b_df.loc[b_df["id"] == battery_id].iloc[0]
+	_rows_changed(data, before, [(current, updated.to_dict())])
+	return widen(updated, BATTERY_SCHEMA)
+
+
+def dashboard_kpis() -> dict[str, int]:
+	"""Total, active, low, need_charging and red/yellow/green/gray counts."""
+	data = _data()
+	return _fresh(data, data.kpis).snapshot()
+
+
+def verify_dashboard_kpis() -> bool:
+	"""Check the incrementally maintained KPIs against a full recount."""
+	data = _data()
+	kpis = _fresh(data, data.kpis)
+	with kpis.lock:
+		return kpis.verify(_read_batteries(data))
+
+
+def voltage_forecast(within_days: Optional[float] = None) -> pd.DataFrame:
+	"""Batteries forecast to drop below their profile's critical voltage, soonest first.
+
+	Rates come from a least-squares fit over each battery's check history;
+	only batteries checked since the last call are refitted.
+	"""
+	data = _data()
+	data.trends.refresh(_journal(data))
+	batteries = _read_batteries(data)[["id", "product_number", "current_voltage", "status"]]
+	critical = pd.Series(get_profiles().critical(batteries["product_number"]), index=batteries["id"].to_numpy())
+	forecast = data.trends.forecast(critical[~critical.index.duplicated()])
+	forecast = forecast[forecast["critical_on"].notna()]
+	if within_days is not None:
+		forecast = forecast[forecast["days_to_critical"] <= float(within_days)]
+	df = widen(batteries, BATTERY_SCHEMA).merge(forecast, left_on="id", right_index=True, how="inner")
+	return df.sort_values("days_to_critical", kind="stable").reset_index(drop=True)
+
+
+def _start_alerts(data: DataRoot) -> AlertScheduler:
+	data.alerts.start(lambda: _fresh(data, data.alerts))
+	return data.alerts
+
+
+def start_alerts() -> None:
+	"""Start the background overdue-check and low-voltage alert worker (once per data directory)."""
+	_start_alerts(_data())
+
+
+def upcoming_alerts(limit: int = 20) -> pd.DataFrame:
+	"""The next scheduled alerts, soonest first; rows already due are raised shortly."""
+	data = _data()
+	return _fresh(data, _start_alerts(data)).upcoming(limit)
+
+
+def recent_alerts(limit: int = 50) -> pd.DataFrame:
+	"""Alerts raised in this process, newest first (all of them are in the directory's alerts.jsonl)."""
+	return _start_alerts(_data()).recent_alerts(limit)
+
+
+def complete_product_number(prefix: str, limit: int = 10) -> list[str]:
+	"""Product numbers starting with `prefix` (any case), for scanner autocomplete."""
+	if not str(prefix).strip():
+		return []
+	data = _data()
+	return _fresh(data, data.product_search).complete(prefix, limit)
+
+
+def _rows_with_ids(df: pd.DataFrame, ids: np.ndarray) -> pd.DataFrame:
+	"""Rows of `df` whose id is in the sorted array `ids`."""
+	table_ids = df["id"].to_numpy("int64", na_value=-1)
+	if len(table_ids) > 1 and not (table_ids[1:] > table_ids[:-1]).all():
+		return df[np.isin(table_ids, ids)]
+	# Ids are assigned in increasing order, so usually a binary search suffices
+	pos = np.searchsorted(table_ids, ids).clip(0, max(len(table_ids) - 1, 0))
+	pos = pos[table_ids[pos] == ids] if len(table_ids) else pos[:0]
+	return df.iloc[pos]
 
 
 def filter_inventory(
@@ -146,26 +600,50 @@ def filter_inventory(
 	voltage_min: Optional[float] = None,
 	voltage_max: Optional[float] = None,
 ) -> pd.DataFrame:
-	df = read_batteries()
-	if product_query:
-		df = df[df["product_number"].astype(str).str.contains(str(product_query), case=False, na=False)]
+	data = _data()
+	# Widened first, so a bound typed as 10.2 keeps a reading stored as 10.2
+	df = widen(_read_batteries(data), BATTERY_SCHEMA)
+	if product_query and str(product_query).strip():
+		df = _rows_with_ids(df, _fresh(data, data.product_search).contains(product_query))
 	if status:
-		df = df[df["status"].astype(str) == status]
+		df = df[df["status"] == status]
 	if voltage_min is not None:
-		df = df[pd.to_numeric(df["current_voltage"], errors="coerce") >= float(voltage_min)]
+		df = df[df["current_voltage"] >= float(voltage_min)]
 	if voltage_max is not None:
-		df = df[pd.to_numeric(df["current_voltage"], errors="coerce") <= float(voltage_max)]
+		df = df[df["current_voltage"] <= float(voltage_max)]
 	return df
 
 
-def status_color(voltage: Optional[float]) -> str:
-	"""Determine color status based on voltage."""
-	if voltage is None:
-		return "gray"
-	if voltage < 10.5:
-		return "red"
-	if voltage < 11.0:
-		return "yellow"
-	return "green"
+INVENTORY_SORT_COLUMNS = ("id", "product_number", "current_voltage", "last_checked_date", "status", "total_checks")
+
+
+def inventory_page(
+	filtered: pd.DataFrame,
+	page: int = 1,
+	page_size: int = 50,
+	sort_by: str = "id",
+	ascending: bool = True,
+) -> tuple[pd.DataFrame, int, int]:
+	"""Sort a filtered inventory and slice out one page.
+
+	Only the sort key is ordered; the page's rows are then taken by label, so
+	the wide frame is never copied in full. Returns (page rows, total
+	matches, page count); `page` is clamped into range.
+	"""
+	total = len(filtered)
+	pages = max(1, -(-total // page_size))
+	page = min(max(1, int(page)), pages)
+	if sort_by not in filtered.columns:
+		raise ValueError(f"Cannot sort by {sort_by}")
+	order = filtered[sort_by].sort_values(ascending=ascending, na_position="last", kind="stable").index
+	start = (page - 1) * page_size
+	return filtered.loc[order[start:start + page_size]], total, pages
+
+
+def status_color(voltage: Optional[float], product_number: Optional[str] = None) -> str:
+	"""Determine color status based on voltage, under the product's threshold profile."""
+	return voltage_bucket(voltage, product_number)
 
 
+# Every public function above is timed and counted when a trace is active
+instrument_module(__name__)
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Optional
+
+import pandas as pd
+
+
+class TableView:
+	"""In-memory structure derived from one table and tied to its data version.
+
+	`build` recomputes it from a full table. After a mutation made through the
+	utils layer, `advance` folds the changed rows in with `apply` instead,
+	provided the view was current before the write; otherwise it stays stale
+	and is rebuilt on next use. `settle` follows a transaction's commit or
+	rollback.
+	"""
+
+	def __init__(self):
+		self.version: Optional[tuple] = None
+		self.lock = threading.RLock()
+
+	def build(self, df: pd.DataFrame) -> None:
+		raise NotImplementedError
+
+	def apply(self, old: Optional[dict], new: Optional[dict]) -> None:
+		"""Replace row `old` by `new`; either is None for an insert or a delete."""
+		raise NotImplementedError
+
+	def stale(self) -> bool:
+		"""Whether the view needs a rebuild even at the current version, e.g. its settings changed."""
+		return False
+
+	def refresh(self, version: tuple, load) -> None:
+		"""Rebuild from `load()` unless already current for `version`."""
+		if self.version == version and not self.stale():
+			return
+		with self.lock:
+			if self.version != version or self.stale():
+				self.build(load())
+				self.version = version
+
+	def advance(self, before: tuple, after: tuple, changes: list[tuple[Optional[dict], Optional[dict]]]) -> None:
+		with self.lock:
+			if self.version == before:
+				for old, new in changes:
+					self.apply(old, new)
+				self.version = after
+			else:
+				self.version = None
+
+	def settle(self, before: tuple, after: Optional[tuple]) -> None:
+		"""Move to the committed version `after`, or go stale when it is None (a rollback)."""
+		with self.lock:
+			if after is None:
+				# Rows folded in by the rolled-back writes may carry any version token
+				self.version = None
+			elif self.version == before:
+				self.version = after
+
+
+def normalize_product(value: Any) -> Optional[str]:
+	if value is None or (not isinstance(value, str) and pd.isna(value)):
+		return None
+	return str(value).strip()
+
+
+class BatteryIndex(TableView):
+	"""Hash lookup from battery id and normalized product number to row."""
+
+	def __init__(self):
+		super().__init__()
+		self.rows: dict[int, dict] = {}
+		# Several rows may share a product number; keep them in table order
+		self.by_product: dict[str, list[int]] = {}
+		self._keys: tuple = ()
+		self._columns = pd.Index([])
+
+	def build(self, df: pd.DataFrame) -> None:
+		rows: dict[int, dict] = {}
+		by_product: dict[str, list[int]] = {}
+		for record in df.to_dict("records"):
+			if pd.isna(record.get("id")):
+				continue
+			battery_id = int(record["id"])
+			if battery_id in rows:
+				continue
+			rows[battery_id] = record
+			product = normalize_product(record.get("product_number"))
+			if product is not None:
+				by_product.setdefault(product, []).append(battery_id)
+		self.rows, self.by_product = rows, by_product
+		self._keys, self._columns = tuple(df.columns), pd.Index(df.columns)
+
+	def apply(self, old: Optional[dict], new: Optional[dict]) -> None:
+		if old is not None:
+			battery_id = int(old["id"])
+			self.rows.pop(battery_id, None)
+			product = normalize_product(old.get("product_number"))
+			ids = self.by_product.get(product)
+			if ids and battery_id in ids:
+				ids.remove(battery_id)
+				if not ids:
+					del self.by_product[product]
+		if new is not None:
+			battery_id = int(new["id"])
+			self.rows[battery_id] = dict(new)
+			product = normalize_product(new.get("product_number"))
+			if product is not None:
+				ids = self.by_product.setdefault(product, [])
+				if battery_id not in ids:
+					ids.append(battery_id)
+					ids.sort()
+
+	def series(self, row: dict) -> pd.Series:
+		"""Row as an object Series, reusing the table's column index when it fits."""
+		if tuple(row) == self._keys:
+			return pd.Series(list(row.values()), index=self._columns, dtype=object)
+		return pd.Series(row, dtype=object)
+
+	def get_id(self, battery_id: int) -> Optional[dict]:
+		return self.rows.get(battery_id)
+
+	def lookup(self, identifier: str) -> Optional[dict]:
+		"""Id match first, then exact (stripped) product number match."""
+		try:
+			row = self.rows.get(int(identifier))
+			if row is not None:
+				return row
+		except (TypeError, ValueError):
+			pass
+		ids = self.by_product.get(str(identifier).strip())
+		if ids:
+			return self.rows.get(ids[0])
+		return None
@@ -0,0 +1,668 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import threading
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from .file_lock import file_lock
+
+
+SEGMENT_RE = re.compile(r"^segment-(\d{6})\.jsonl$")
+MANIFEST_RE = re.compile(r"^manifest-(\d{6})\.json$")
+# Single-file snapshots written before history was partitioned by month
+SNAPSHOT_RE = re.compile(r"^snapshot-(\d{6})\.parquet$")
+
+PARTITION_DIR = "partitions"
+ARCHIVE_DIR = "archive"
+# Partition of rows whose check time is missing or unparseable
+UNDATED = "undated"
+# Rows per Parquet row group. Partitions are stored clustered by battery, so
+# per-battery reads skip the row groups of other batteries by their statistics
+PARTITION_ROW_GROUP = 16_384
+# Months older than this are rewritten into the archive with heavier compression
+ARCHIVE_AFTER_MONTHS = 12
+PARTITION_COMPRESSION = ("snappy", None)
+ARCHIVE_COMPRESSION = ("zstd", 9)
+
+
+def _json_default(value: Any) -> Any:
+	if isinstance(value, (pd.Timestamp, datetime, date)):
+		return value.isoformat()
+	if hasattr(value, "item"):
+		return value.item()
+	raise TypeError(f"Cannot serialise {type(value).__name__}")
+
+
+def _clean(row: dict) -> dict:
+	"""Replace NaN/NaT/NA with None so rows serialise as valid JSON."""
+	out = {}
+	for key, value in row.items():
+		if value is pd.NaT or value is pd.NA or (isinstance(value, float) and math.isnan(value)):
+			value = None
+		out[key] = value
+	return out
+
+
+def _stamp(value: Any) -> Optional[pd.Timestamp]:
+	if value is None:
+		return None
+	value = pd.Timestamp(value)
+	return None if pd.isna(value) else value
+
+
+class _Segment:
+	"""Incrementally parsed view of one append-only segment file."""
+
+	__slots__ = ("offset", "records", "max_id", "frame")
+
+	def __init__(self):
+		self.offset = 0
+		self.records: list[dict] = []
+		self.max_id = 0
+		self.frame: Optional[pd.DataFrame] = None
+
+
+EMPTY_MANIFEST = {"number": -1, "max_id": 0, "rows": 0, "partitions": []}
+
+
+class CheckJournal:
+	"""Append-only log of battery checks, folded into monthly partitions.
+
+	Each check is one JSON line in the active segment file, so recording a
+	check costs O(1) regardless of history size. fsync is batched: it runs
+	every `fsync_every` appends, or at most `fsync_interval` seconds after the
+	first unsynced append. Sealed segments are folded by `compact()` (run in
+	the background by `start_compactor()`) into one Parquet file per month of
+	`partition_column`, listed in a manifest with each partition's row count,
+	id range and time range. Readers see the newest manifest merged with the
+	segments it does not cover yet, and time- or id-bounded reads open only
+	the partitions that can match. Months older than `archive_after_months`
+	are moved to `archive/` with zstd compression at the next compaction.
+
+	The active segment and the next check id are derived from the files on
+	disk under an advisory lock, so several processes can append to the same
+	journal without clashing ids.
+	"""
+
+	def __init__(
+		self,
+		root: str | Path,
+		columns: list[str],
+		seed: Optional[Callable[[], pd.DataFrame]] = None,
+		fsync_every: int = 64,
+		fsync_interval: float = 1.0,
+		segment_max_rows: int = 10_000,
+		datetime_columns: tuple[str, ...] = ("checked_at",),
+		cluster_columns: tuple[str, ...] = ("battery_id", "id"),
+		archive_after_months: int = ARCHIVE_AFTER_MONTHS,
+	):
+		self.root = Path(root)
+		self.columns = list(columns)
+		self.fsync_every = fsync_every
+		self.fsync_interval = fsync_interval
+		self.segment_max_rows = segment_max_rows
+		self.datetime_columns = datetime_columns
+		self.partition_column = datetime_columns[0]
+		self.cluster_columns = [c for c in cluster_columns if c in self.columns]
+		self.archive_after_months = archive_after_months
+		self._lock = threading.RLock()
+		self._append_lock = file_lock(self.root / ".append.lock")
+		self._compact_lock = file_lock(self.root / ".compact.lock")
+		self._handle = None
+		self._handle_path: Optional[Path] = None
+		self._unsynced = 0
+		self._first_unsynced_at = 0.0
+		self._manifest: tuple[Optional[Path], dict] = (None, EMPTY_MANIFEST)
+		# Parsed partitions by path; partition files are never modified in place
+		self._partitions: dict[Path, pd.DataFrame] = {}
+		self._segments: dict[Path, _Segment] = {}
+		self._compactor: Optional[threading.Thread] = None
+		self._wake = threading.Event()
+		self._stop = threading.Event()
+		self._open(seed)
+
+	# --- file layout -------------------------------------------------------
+
+	def _segment_path(self, number: int) -> Path:
+		return self.root / f"segment-{number:06d}.jsonl"
+
+	def _manifest_path(self, number: int) -> Path:
+		return self.root / f"manifest-{number:06d}.json"
+
+	def _list(self, pattern: re.Pattern) -> list[tuple[int, Path]]:
+		found = []
+		for path in self.root.iterdir():
+			m = pattern.match(path.name)
+			if m:
+				found.append((int(m.group(1)), path))
+		return sorted(found)
+
+	def _latest_manifest(self) -> tuple[int, Optional[Path]]:
+		manifests = self._list(MANIFEST_RE)
+		if not manifests:
+			return -1, None
+		return manifests[-1]
+
+	def _live_segments(self) -> tuple[int, Optional[Path], list[tuple[int, Path]]]:
+		"""Latest manifest plus the segments it does not cover, oldest first."""
+		number, manifest_path = self._latest_manifest()
+		return number, manifest_path, [(n, p) for n, p in self._list(SEGMENT_RE) if n > number]
+
+	def _open(self, seed: Optional[Callable[[], pd.DataFrame]]) -> None:
+		self.root.mkdir(parents=True, exist_ok=True)
+		with self._append_lock:
+			if self._list(MANIFEST_RE):
+				return
+			snapshots = self._list(SNAPSHOT_RE)
+			if snapshots:
+				# Split a pre-partitioning snapshot into months, covering the same segments
+				number, path = snapshots[-1]
+				self._publish(self._merge(EMPTY_MANIFEST, pd.read_parquet(path), number), number)
+				for _, old in snapshots:
+					old.unlink(missing_ok=True)
+			elif not self._list(SEGMENT_RE) and seed is not None:
+				# Carry the legacy check table over as the first partitions
+				self._publish(self._merge(EMPTY_MANIFEST, seed(), 0), 0)
+
+	# --- partitions --------------------------------------------------------
+
+	def _months(self, df: pd.DataFrame) -> pd.Series:
+		return df[self.partition_column].dt.strftime("%Y-%m").fillna(UNDATED)
+
+	def _archive_before(self) -> str:
+		"""Months sorting before this key are due for the archive."""
+		return (pd.Timestamp.now().to_period("M") - self.archive_after_months).strftime("%Y-%m")
+
+	def _load_manifest(self, path: Optional[Path]) -> dict:
+		if path is None:
+			return EMPTY_MANIFEST
+		if self._manifest[0] != path:
+			self._manifest = (path, json.loads(path.read_text(encoding="utf-8")))
+		return self._manifest[1]
+
+	def _partition_frame(self, entry: dict) -> pd.DataFrame:
+		"""Whole partition in id order, parsed once per file."""
+		path = self.root / entry["path"]
+		frame = self._partitions.get(path)
+		if frame is None:
+			frame = pd.read_parquet(path).sort_values("id", kind="stable", ignore_index=True)
+			self._partitions[path] = frame
+		return frame
+
+	def _read_partition(self, entry: dict, filters: list[tuple]) -> pd.DataFrame:
+		"""Rows of one partition matching `filters`, from memory when already parsed."""
+		path = self.root / entry["path"]
+		frame = self._partitions.get(path)
+		if frame is None:
+			return pq.read_table(path, filters=filters or None).to_pandas()
+		mask = pd.Series(True, index=frame.index)
+		for column, op, value in filters:
+			values = frame[column]
+			if op == ">":
+				mask &= values > value
+			elif op == ">=":
+				mask &= values >= value
+			elif op == "<":
+				mask &= values < value
+			elif op == "in":
+				mask &= values.isin(value)
+		return frame[mask]
+
+	def _write_partition(self, df: pd.DataFrame, month: str, number: int, archived: bool) -> dict:
+		folder = self.root / (ARCHIVE_DIR if archived else PARTITION_DIR)
+		folder.mkdir(exist_ok=True)
+		path = folder / f"checks-{month}-{number:06d}.parquet"
+		tmp = path.with_suffix(".parquet.tmp")
+		df = df.sort_values(self.cluster_columns, kind="stable", ignore_index=True) if self.cluster_columns else df
+		compression, level = ARCHIVE_COMPRESSION if archived else PARTITION_COMPRESSION
+		df.to_parquet(tmp, index=False, row_group_size=PARTITION_ROW_GROUP, compression=compression, compression_level=level)
+		os.replace(tmp, path)
+		times = df[self.partition_column]
+		return {
+			"month": month,
+			"path": path.relative_to(self.root).as_posix(),
+			"rows": len(df),
+			"min_id": int(df["id"].min()) if len(df) else 0,
+			"max_id": int(df["id"].max()) if len(df) else 0,
+			"start": None if times.isna().all() else times.min().isoformat(),
+			"end": None if times.isna().all() else times.max().isoformat(),
+			"archived": archived,
+			"bytes": path.stat().st_size,
+		}
+
+	def _merge(self, manifest: dict, delta: pd.DataFrame, number: int) -> dict:
+		"""Manifest with `delta` folded in; only the months it touches are rewritten."""
+		entries = {e["month"]: e for e in manifest["partitions"]}
+		archive_before = self._archive_before()
+		due = lambda month: month != UNDATED and month < archive_before
+		if not delta.empty:
+			delta = self._typed(delta.reindex(columns=self.columns))
+			for month, rows in delta.groupby(self._months(delta), sort=True):
+				old = entries.get(month)
+				frame = pd.concat([self._partition_frame(old), rows], ignore_index=True) if old is not None else rows
+				entries[month] = self._write_partition(frame, month, number, due(month))
+		for month, entry in list(entries.items()):
+			if due(month) and not entry["archived"]:
+				entries[month] = self._write_partition(self._partition_frame(entry), month, number, True)
+		partitions = [entries[m] for m in sorted(entries, key=lambda m: (m == UNDATED, m))]
+		return {
+			"number": number,
+			"max_id": max([manifest["max_id"]] + [e["max_id"] for e in partitions]),
+			"rows": sum(e["rows"] for e in partitions),
+			"partitions": partitions,
+		}
+
+	def _publish(self, manifest: dict, number: int) -> Path:
+		path = self._manifest_path(number)
+		tmp = path.with_suffix(".json.tmp")
+		tmp.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+		os.replace(tmp, path)
+		return path
+
+	def partitions(self) -> pd.DataFrame:
+		"""The current manifest: one row per month with its rows, id and time range."""
+		with self._lock:
+			manifest = self._load_manifest(self._latest_manifest()[1])
+		columns = ["month", "path", "rows", "min_id", "max_id", "start", "end", "archived", "bytes"]
+		return pd.DataFrame(manifest["partitions"], columns=columns)
+
+	# --- reading -----------------------------------------------------------
+
+	def _scan(self, path: Path) -> _Segment:
+		"""Parse whatever was appended to `path` since the last scan."""
+		seg = self._segments.get(path)
+		if seg is None:
+			seg = self._segments[path] = _Segment()
+		with open(path, "rb") as fh:
+			fh.seek(seg.offset)
+			data = fh.read()
+		# A torn final line (crash or concurrent write) is picked up next time
+		end = data.rfind(b"\n") + 1
+		if end:
+			for line in data[:end].splitlines():
+				if line.strip():
+					record = json.loads(line)
+					seg.records.append(record)
+					seg.max_id = max(seg.max_id, int(record.get("id") or 0))
+			seg.offset += end
+			seg.frame = None
+		return seg
+
+	def _segment_frame(self, path: Path) -> pd.DataFrame:
+		seg = self._scan(path)
+		if seg.frame is None:
+			seg.frame = self._typed(pd.DataFrame.from_records(seg.records, columns=self.columns))
+		return seg.frame
+
+	def _forget(self, manifest: dict, live: Iterable[tuple[int, Path]]) -> None:
+		keep = {p for _, p in live}
+		for path in list(self._segments):
+			if path not in keep:
+				del self._segments[path]
+		current = {self.root / e["path"] for e in manifest["partitions"]}
+		for path in list(self._partitions):
+			if path not in current:
+				del self._partitions[path]
+
+	def _collect(self, pick: Callable[[dict, list[tuple[int, Path]]], list[pd.DataFrame]]) -> pd.DataFrame:
+		"""Frames chosen by `pick(manifest, live segments)`, retried if a compaction races the read."""
+		with self._lock:
+			if self._handle is not None:
+				self._handle.flush()
+			frames: list[pd.DataFrame] = []
+			for _ in range(5):
+				try:
+					_, manifest_path, live = self._live_segments()
+					manifest = self._load_manifest(manifest_path)
+					frames = pick(manifest, live)
+					self._forget(manifest, live)
+					break
+				except FileNotFoundError:
+					# Raced with a compaction; list again
+					continue
+			frames = [f for f in frames if not f.empty]
+			if not frames:
+				return pd.DataFrame(columns=self.columns)
+			df = pd.concat(frames, ignore_index=True)
+		return self._typed(df)
+
+	def read(self) -> pd.DataFrame:
+		"""Every partition, month by month, then the segments the manifest does not cover."""
+		return self._collect(lambda manifest, live: (
+			[self._partition_frame(e) for e in manifest["partitions"]]
+			+ [self._segment_frame(p) for _, p in live]
+		))
+
+	def compacted_id(self) -> int:
+		"""Highest check id folded into the partitions; it only moves when a compaction publishes."""
+		with self._lock:
+			return self._load_manifest(self._latest_manifest()[1])["max_id"]
+
+	def read_compacted(self) -> tuple[int, pd.DataFrame]:
+		"""Every partition of the current manifest, and the highest check id they cover."""
+		covered = 0
+
+		def pick(manifest: dict, live: list[tuple[int, Path]]) -> list[pd.DataFrame]:
+			nonlocal covered
+			covered = manifest["max_id"]
+			return [self._partition_frame(e) for e in manifest["partitions"]]
+
+		df = self._collect(pick)
+		return covered, df
+
+	def read_since(self, after_id: int) -> pd.DataFrame:
+		"""Checks with an id above `after_id`, in id order.
+
+		Partitions whose highest id is at or below `after_id` are skipped
+		unread, so catching up on a long history costs about the size of the
+		tail (usually just the current month).
+		"""
+		def pick(manifest: dict, live: list[tuple[int, Path]]) -> list[pd.DataFrame]:
+			frames = [
+				self._read_partition(e, [("id", ">", after_id)])
+				for e in manifest["partitions"]
+				if e["max_id"] > after_id
+			]
+			for _, path in live:
+				if self._scan(path).max_id > after_id:
+					frame = self._segment_frame(path)
+					frames.append(frame[frame["id"] > after_id])
+			return frames
+
+		df = self._collect(pick)
+		return df.sort_values("id", kind="stable", ignore_index=True) if len(df) else df
+
+	def read_range(
+		self,
+		start: Optional[Any] = None,
+		end: Optional[Any] = None,
+		battery_ids: Optional[Iterable[int]] = None,
+	) -> pd.DataFrame:
+		"""Checks with `start <= checked_at < end` (either bound optional), for some batteries.
+
+		Only the months overlapping the range are opened, and within them
+		only the row groups whose battery id range can match. Undated checks
+		are left out whenever a bound is given. Returned in id order.
+		"""
+		start, end = _stamp(start), _stamp(end)
+		ids = None if battery_ids is None else sorted({int(b) for b in battery_ids})
+		column = self.partition_column
+		filters: list[tuple] = []
+		if start is not None:
+			filters.append((column, ">=", start))
+		if end is not None:
+			filters.append((column, "<", end))
+		if ids is not None:
+			filters.append(("battery_id", "in", ids))
+
+		def overlaps(entry: dict) -> bool:
+			if start is None and end is None:
+				return True
+			if entry["start"] is None:
+				return False
+			return (start is None or pd.Timestamp(entry["end"]) >= start) and (end is None or pd.Timestamp(entry["start"]) < end)
+
+		def pick(manifest: dict, live: list[tuple[int, Path]]) -> list[pd.DataFrame]:
+			frames = [self._read_partition(e, filters) for e in manifest["partitions"] if overlaps(e)]
+			for _, path in live:
+				frame = self._segment_frame(path)
+				mask = pd.Series(True, index=frame.index)
+				if start is not None:
+					mask &= frame[column] >= start
+				if end is not None:
+					mask &= frame[column] < end
+				if ids is not None:
+					mask &= frame["battery_id"].isin(ids)
+				frames.append(frame[mask])
+			return frames
+
+		if ids is not None and not ids:
+			return pd.DataFrame(columns=self.columns)
+		df = self._collect(pick)
+		return df.sort_values("id", kind="stable", ignore_index=True) if len(df) else df
+
+	def _typed(self, df: pd.DataFrame) -> pd.DataFrame:
+		for column in self.datetime_columns:
+			if column in df.columns and not pd.api.types.is_datetime64_any_dtype(df[column]):
+				df[column] = pd.to_datetime(df[column], errors="coerce", format="mixed")
+		return df
+
+	def iter_chunks(self, chunk_rows: int = 50_000) -> Iterator[pd.DataFrame]:
+		"""Full history as frames of at most `chunk_rows`, month by month.
+
+		Partitions are streamed by Parquet record batch and each segment is
+		parsed on its own, so memory stays bounded by the chunk size rather
+		than the history. Files are opened up front: a compaction running
+		meanwhile cannot pull them away mid-read.
+		"""
+		with self._lock:
+			if self._handle is not None:
+				self._handle.flush()
+			files, handles = [], []
+			for _ in range(5):
+				files, handles = [], []
+				try:
+					_, manifest_path, live = self._live_segments()
+					for entry in self._load_manifest(manifest_path)["partitions"]:
+						files.append(pq.ParquetFile(self.root / entry["path"]))
+					for _, path in live:
+						handles.append(open(path, "rb"))
+					break
+				except FileNotFoundError:
+					for f in files:
+						f.close()
+					for fh in handles:
+						fh.close()
+					continue
+		try:
+			for f in files:
+				for batch in f.iter_batches(batch_size=chunk_rows):
+					yield self._typed(batch.to_pandas())
+			for fh in handles:
+				data = fh.read()
+				lines = [line for line in data[: data.rfind(b"\n") + 1].splitlines() if line.strip()]
+				for start in range(0, len(lines), chunk_rows):
+					records = [json.loads(line) for line in lines[start : start + chunk_rows]]
+					yield self._typed(pd.DataFrame.from_records(records, columns=self.columns))
+		finally:
+			for f in files:
+				f.close()
+			for fh in handles:
+				fh.close()
+
+	# --- writing -----------------------------------------------------------
+
+	def _max_id(self, manifest_path: Optional[Path], live: list[tuple[int, Path]]) -> int:
+		max_id = self._load_manifest(manifest_path)["max_id"]
+		for _, path in live:
+			max_id = max(max_id, self._scan(path).max_id)
+		return max_id
+
+	def next_id(self) -> int:
+		with self._append_lock, self._lock:
+			_, manifest_path, live = self._live_segments()
+			return self._max_id(manifest_path, live) + 1
+
+	def _active(self, number: int, live: list[tuple[int, Path]]) -> Path:
+		"""Newest live segment, or a new one after the manifest and any leftovers."""
+		if live:
+			return live[-1][1]
+		numbers = [n for n, _ in self._list(SEGMENT_RE)]
+		return self._segment_path(max([number] + numbers) + 1)
+
+	def _switch(self, path: Path) -> None:
+		if self._handle_path == path and self._handle is not None:
+			return
+		self._close_handle()
+		self._handle = open(path, "a", encoding="utf-8")
+		self._handle_path = path
+
+	def _close_handle(self) -> None:
+		if self._handle is None:
+			return
+		self.sync()
+		self._handle.close()
+		self._handle = None
+		self._handle_path = None
+
+	def append(self, row: dict) -> dict:
+		"""Append one check; assigns `id` when missing and returns the stored row."""
+		return self.append_many([row])[0]
+
+	def append_many(self, rows: list[dict]) -> list[dict]:
+		stored = []
+		with self._append_lock, self._lock:
+			number, manifest_path, live = self._live_segments()
+			next_id = self._max_id(manifest_path, live) + 1
+			active = self._active(number, live)
+			self._switch(active)
+			count = len(self._segments[active].records) if active in self._segments else 0
+			for row in rows:
+				row = _clean({c: row.get(c) for c in self.columns})
+				if row.get("id") is None:
+					row["id"] = next_id
+				next_id = max(next_id, int(row["id"]) + 1)
+				self._handle.write(json.dumps(row, default=_json_default) + "\n")
+				if self._unsynced == 0:
+					self._first_unsynced_at = time.monotonic()
+				self._unsynced += 1
+				stored.append(row)
+				count += 1
+				if count >= self.segment_max_rows:
+					self._rotate(active)
+					active = self._handle_path
+					count = 0
+			self._handle.flush()
+			due = time.monotonic() - self._first_unsynced_at >= self.fsync_interval
+			if self._unsynced >= self.fsync_every or (self._unsynced and due):
+				self.sync()
+		return stored
+
+	def _rotate(self, active: Path) -> None:
+		"""Seal `active` by starting the next segment; the compactor picks it up."""
+		number = int(SEGMENT_RE.match(active.name).group(1)) + 1
+		self._switch(self._segment_path(number))
+		# Create the file now so every process appends to it from here on
+		self._handle.flush()
+		self._wake.set()
+
+	def sync(self) -> None:
+		"""fsync the active segment."""
+		with self._lock:
+			if self._handle is not None and self._unsynced:
+				self._handle.flush()
+				os.fsync(self._handle.fileno())
+			self._unsynced = 0
+
+	def close(self) -> None:
+		self.stop_compactor()
+		with self._lock:
+			self._close_handle()
+
+	# --- compaction --------------------------------------------------------
+
+	def compact(self) -> bool:
+		"""Fold sealed segments into the monthly partitions; returns True if a manifest was written.
+
+		Writers are only blocked while the active segment is rotated; the
+		partitions are built from sealed, immutable segments, and only the
+		months those segments touch (or that just aged into the archive) are
+		rewritten. The new manifest is published atomically, after which the
+		folded segments and the files no manifest refers to are removed.
+		"""
+		with self._compact_lock:
+			with self._append_lock, self._lock:
+				_, manifest_path, live = self._live_segments()
+				if not live:
+					return False
+				if live[-1][1].stat().st_size:
+					self._rotate(live[-1][1])
+					sealed = live
+				else:
+					sealed = live[:-1]
+				if not sealed:
+					return False
+				manifest = self._load_manifest(manifest_path)
+				frames = [self._segment_frame(p) for _, p in sealed]
+			frames = [f for f in frames if not f.empty]
+			delta = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=self.columns)
+			new_no = sealed[-1][0]
+			merged = self._merge(manifest, delta, new_no)
+			self._publish(merged, new_no)
+			# Appenders list and scan segments under the append lock; delete under it too
+			with self._append_lock, self._lock:
+				for _, path in sealed:
+					path.unlink(missing_ok=True)
+					self._segments.pop(path, None)
+				for number, path in self._list(SEGMENT_RE):
+					if number <= new_no:
+						path.unlink(missing_ok=True)
+				for number, path in self._list(MANIFEST_RE):
+					if number < new_no:
+						path.unlink(missing_ok=True)
+				referenced = {self.root / e["path"] for e in merged["partitions"]}
+				for folder in (PARTITION_DIR, ARCHIVE_DIR):
+					for path in (self.root / folder).glob("checks-*.parquet"):
+						if path not in referenced:
+							path.unlink(missing_ok=True)
+							self._partitions.pop(path, None)
+		return True
+
+	def start_compactor(self, interval: float = 30.0) -> None:
+		"""Run a daemon thread that fsyncs pending appends every `fsync_interval`
+		and compacts whenever a segment seals or `interval` elapses."""
+		if self._compactor is not None and self._compactor.is_alive():
+			return
+		self._stop.clear()
+
+		def _loop() -> None:
+			last_compaction = time.monotonic()
+			while not self._stop.is_set():
+				woke = self._wake.wait(self.fsync_interval)
+				self._wake.clear()
+				if self._stop.is_set():
+					break
+				try:
+					self.sync()
+					if woke or time.monotonic() - last_compaction >= interval:
+						self.compact()
+						last_compaction = time.monotonic()
+				except Exception:
+					# Compaction is best effort; the journal stays readable without it
+					pass
+
+		self._compactor = threading.Thread(target=_loop, name="check-journal-compactor", daemon=True)
+		self._compactor.start()
+
+	def stop_compactor(self) -> None:
+		if self._compactor is None:
+			return
+		self._stop.set()
+		self._wake.set()
+		self._compactor.join(timeout=5)
+		self._compactor = None
+
+
+_journals: dict[Path, CheckJournal] = {}
+_journals_lock = threading.Lock()
+
+
+def open_journal(root: str | Path, columns: list[str], seed: Optional[Callable[[], pd.DataFrame]] = None) -> CheckJournal:
+	"""Return the process-wide journal for `root`, starting its compactor on first use."""
+	root = Path(root).resolve()
+	with _journals_lock:
+		journal = _journals.get(root)
+		if journal is None:
+			journal = CheckJournal(root, columns, seed=seed)
+			journal.start_compactor()
+			_journals[root] = journal
+		return journal
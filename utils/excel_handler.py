@@ -1,41 +1,370 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
 import pandas as pd
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Iterator, Optional
+
+from .instrumentation import annotate, instrument_module
+from .schema import apply_schema, conform_row, schema_for, to_storage
+from .storage import StorageBackend, create_backend
+
+
+# Cached tables are handed out as shallow copies; copy-on-write keeps callers
+# from mutating the shared frame (always on from pandas 3)
+if int(pd.__version__.split(".")[0]) < 3:
+	pd.set_option("mode.copy_on_write", True)
 
 
-# Resolve data directory relative to this file to avoid CWD issues when running Streamlit
+# Resolve data directory relative to this file to avoid CWD issues when running Streamlit;
+# VOLT_GUARD_DATA_DIR points the whole app at another directory
 BASE_DIR = Path(__file__).resolve().parents[1]
-DATA_DIR = BASE_DIR / "data"
+DATA_DIR = Path(os.environ.get("VOLT_GUARD_DATA_DIR") or BASE_DIR / "data")
+
+# Data directory that calls in the current context work on. Sites switch it
+# per call with use_data_root(); threads and write-queue jobs carry it along
+# with the rest of the caller's context
+_data_root: ContextVar[Path] = ContextVar("data_root", default=DATA_DIR.resolve())
+
+# Active storage engine; chosen by VOLT_GUARD_STORAGE (excel | sqlite)
+_backend: StorageBackend = create_backend()
+
+# Process-wide table cache shared by every Streamlit session:
+# resolved path -> (backend version token, parsed DataFrame)
+_cache: dict[Path, tuple[tuple, pd.DataFrame]] = {}
+_cache_lock = threading.Lock()
+
+# Per-thread record of tables written inside transaction(): path -> version before the first write
+_txn = threading.local()
+_commit_listeners: list[Callable[[dict[Path, tuple]], None]] = []
+# Tables `ensure_file` has set up on the current backend: (path, columns)
+_ensured: set[tuple[Path, tuple[str, ...]]] = set()
+
+# Tries per after_commit callback, with a doubling pause between them
+AFTER_COMMIT_ATTEMPTS = 3
+AFTER_COMMIT_BACKOFF = 0.05
+
+
+class AfterCommitError(Exception):
+	"""The writes were committed, but work deferred to the commit failed.
+
+	Nothing was rolled back. `failed` holds the positions (in deferral order)
+	of the callbacks that still failed after retries; `errors` their last
+	exceptions.
+	"""
+
+	def __init__(self, failed: list[int], errors: list[BaseException]):
+		super().__init__(f"Changes were saved, but {len(failed)} step(s) after the commit failed: {errors[0]!r}")
+		self.failed = failed
+		self.errors = errors
+
+
+def get_backend() -> StorageBackend:
+	return _backend
+
+
+def data_root() -> Path:
+	"""The data directory in use: DATA_DIR unless a site set another one."""
+	return _data_root.get()
+
+
+@contextmanager
+def use_data_root(root: str | Path) -> Iterator[Path]:
+	"""Work on the data directory `root` for the rest of the block (in this context only)."""
+	token = _data_root.set(Path(root).resolve())
+	try:
+		yield _data_root.get()
+	finally:
+		_data_root.reset(token)
+
+
+def set_backend(backend: StorageBackend | str) -> StorageBackend:
+	"""Swap the storage engine, by instance or by name."""
+	global _backend
+	_backend = create_backend(backend) if isinstance(backend, str) else backend
+	clear_cache()
+	_ensured.clear()
+	return _backend
+
+
+@lru_cache(maxsize=256)
+def _cache_key(file_path: str | Path) -> Path:
+	return Path(file_path).resolve()
+
+
+def _cached(file_path: str | Path) -> Optional[pd.DataFrame]:
+	"""Return the cached table if it is still current on disk."""
+	if _backend.in_transaction():
+		# Uncommitted writes are only visible through the backend
+		return None
+	key = _cache_key(file_path)
+	with _cache_lock:
+		entry = _cache.get(key)
+	if entry is None or entry[0] != _backend.version(key):
+		return None
+	return entry[1]
+
+
+def table_version(file_path: str | Path) -> tuple:
+	"""Current on-disk version token of a table."""
+	return _backend.version(_cache_key(file_path))
+
+
+def invalidate(file_path: str | Path) -> None:
+	with _cache_lock:
+		_cache.pop(_cache_key(file_path), None)
+
+
+def clear_cache() -> None:
+	with _cache_lock:
+		_cache.clear()
+
+
+def on_commit(listener: Callable[[dict[Path, tuple]], None]) -> None:
+	"""Register `listener(changes)`, called after each transaction ends.
+
+	`changes` maps every table written in it to `(version_before, version_after)`;
+	`version_after` is None when the writes were rolled back.
+	"""
+	_commit_listeners.append(listener)
+
+
+def _notify(changes: dict[Path, tuple]) -> None:
+	if not changes:
+		return
+	for listener in list(_commit_listeners):
+		listener(changes)
+
+
+def _touch(file_path: str | Path) -> None:
+	"""Note the pre-write version of a table written inside a transaction."""
+	touched = getattr(_txn, "touched", None)
+	if touched is not None:
+		key = _cache_key(file_path)
+		if key not in touched:
+			touched[key] = _backend.version(key)
+		_txn.writes.append(key)
+
+
+def after_commit(fn: Callable[..., Any], *args: Any) -> None:
+	"""Run `fn(*args)` once this thread's transaction commits, or right away outside one.
+
+	Work deferred inside a savepoint that rolls back is dropped with it, so
+	side effects kept outside the tables (journal appends) never outlive the
+	writes they go with.
+	"""
+	deferred = getattr(_txn, "deferred", None)
+	if deferred is None:
+		fn(*args)
+	else:
+		deferred.append((fn, args))
+
+
+def deferred_count() -> int:
+	"""How many callbacks this thread's open transaction has deferred so far (0 outside one)."""
+	deferred = getattr(_txn, "deferred", None)
+	return 0 if deferred is None else len(deferred)
+
+
+def _run_deferred(deferred: list[tuple[Callable[..., Any], tuple]]) -> None:
+	"""Run every deferred callback, retrying each; the tables are already committed."""
+	failed, errors = [], []
+	for position, (fn, args) in enumerate(deferred):
+		for attempt in range(AFTER_COMMIT_ATTEMPTS):
+			try:
+				fn(*args)
+				break
+			except Exception as e:
+				if attempt + 1 == AFTER_COMMIT_ATTEMPTS:
+					failed.append(position)
+					errors.append(e)
+				else:
+					time.sleep(AFTER_COMMIT_BACKOFF * 2 ** attempt)
+	if failed:
+		raise AfterCommitError(failed, errors)
+
+
+@contextmanager
+def transaction(root: Optional[str | Path] = None) -> Iterator[None]:
+	"""Apply every write made in the block to `root` (default: `data_root()`) as one commit.
+
+	Nested blocks are savepoints. Reads inside see the uncommitted writes and
+	bypass the shared cache. Work passed to `after_commit` runs once the
+	outermost block commits, before listeners hear of the commit; if any of
+	it still fails after retries, AfterCommitError is raised, not a rollback.
+	"""
+	outermost = getattr(_txn, "touched", None) is None
+	if outermost:
+		_txn.touched, _txn.writes, _txn.deferred = {}, [], []
+	touched, writes, deferred = _txn.touched, _txn.writes, _txn.deferred
+	marks = (len(writes), len(deferred))
+	try:
+		with _backend.transaction(data_root() if root is None else root):
+			yield
+	except BaseException:
+		# Only the tables written in this block were rolled back
+		rolled_back = {path: touched[path] for path in dict.fromkeys(writes[marks[0]:])}
+		del writes[marks[0]:], deferred[marks[1]:]
+		if outermost:
+			_txn.touched = _txn.writes = _txn.deferred = None
+		_notify({path: (before, None) for path, before in rolled_back.items()})
+		raise
+	if outermost:
+		_txn.touched = _txn.writes = _txn.deferred = None
+		changes = {}
+		for path, before in touched.items():
+			invalidate(path)
+			changes[path] = (before, _backend.version(path))
+		try:
+			_run_deferred(deferred)
+		finally:
+			_notify(changes)
 
 
 def ensure_file(file_path: str | Path, columns: list[str]) -> Path:
-	"""Ensure an Excel file exists with the provided columns."""
+	"""Ensure a table exists with the provided columns.
+
+	The backend is asked once per table and column list; later calls (on
+	every read path) return at once until `set_backend` swaps the engine.
+	"""
 	path = Path(file_path)
-	path.parent.mkdir(parents=True, exist_ok=True)
-	if not path.exists():
-		pd.DataFrame(columns=columns).to_excel(path, index=False)
+	key = (_cache_key(path), tuple(columns))
+	if key in _ensured:
+		return path
+	before = _backend.version(path)
+	_backend.ensure(path, columns)
+	if _backend.version(path) != before:
+		invalidate(path)
+	# A table created inside a transaction is gone again if it rolls back
+	if not _backend.in_transaction():
+		_ensured.add(key)
 	return path
 
 
+def _typed_row(file_path: str | Path, row: Optional[pd.Series]) -> Optional[pd.Series]:
+	"""A row fetched straight from the backend, coerced like a cached table row."""
+	if row is None:
+		return None
+	return apply_schema(row.to_frame().T, schema_for(file_path)).iloc[0]
+
+
 def read_excel(file_path: str | Path) -> pd.DataFrame:
-	return pd.read_excel(file_path)
+	"""Read a table, parsing it at most once per on-disk version.
+
+	The table's schema (see utils/schema.py) is applied at load, so cached
+	frames are already typed. The returned frame shares memory with the
+	cache; copy-on-write makes any modification by the caller private to
+	that caller.
+	"""
+	df = _cached(file_path)
+	if df is None:
+		key = _cache_key(file_path)
+		version = _backend.version(key)
+		df = apply_schema(_backend.read(key), schema_for(key))
+		if not _backend.in_transaction():
+			with _cache_lock:
+				_cache[key] = (version, df)
+		annotate(cache="miss")
+	else:
+		annotate(cache="hit")
+	return df.copy(deep=False)
 
 
 def write_excel(df: pd.DataFrame, file_path: str | Path) -> None:
-	df.to_excel(file_path, index=False)
+	_touch(file_path)
+	_backend.write(to_storage(df, schema_for(file_path)), file_path)
+	invalidate(file_path)
+
+
+def append_row(file_path: str | Path, row: dict) -> pd.Series:
+	"""Append a single row to a table and return it, typed like `find_row` and `update_row` rows."""
+	_touch(file_path)
+	row = conform_row(row, schema_for(file_path))
+	_backend.append(file_path, [row])
+	invalidate(file_path)
+	return _typed_row(file_path, pd.Series(row))
+
+
+def append_rows(file_path: str | Path, rows: pd.DataFrame) -> int:
+	"""Append many rows to a table in a single write and return how many."""
+	if rows.empty:
+		return 0
+	_touch(file_path)
+	_backend.append(file_path, to_storage(rows, schema_for(file_path)).to_dict("records"))
+	invalidate(file_path)
+	return len(rows)
+
+
+def find_row(file_path: str | Path, key: Any, key_column: str = "id") -> Optional[pd.Series]:
+	"""Return the first row whose `key_column` equals `key`, or None."""
+	df = _cached(file_path)
+	if df is None:
+		return _typed_row(file_path, _backend.find(file_path, key, key_column))
+	match = df.loc[df[key_column] == key]
+	if match.empty:
+		return None
+	return match.iloc[0]
+
+
+def update_row(file_path: str | Path, key: Any, values: dict, key_column: str = "id") -> Optional[pd.Series]:
+	"""Update one row in place and return it, or None if no row matched."""
+	_touch(file_path)
+	row = _backend.update(file_path, key, conform_row(values, schema_for(file_path)), key_column)
+	invalidate(file_path)
+	return _typed_row(file_path, row)
+
+
+def update_rows(file_path: str | Path, updates: pd.DataFrame, key_column: str = "id") -> int:
+	"""Apply per-key updates (one row each in `updates`) in a single write."""
+	_touch(file_path)
+	count = _backend.update_many(file_path, to_storage(updates, schema_for(file_path)), key_column)
+	invalidate(file_path)
+	return count
+
+
+def delete_row(file_path: str | Path, key: Any, key_column: str = "id") -> bool:
+	_touch(file_path)
+	removed = _backend.delete(file_path, key, key_column)
+	invalidate(file_path)
+	return removed > 0
 
 
-def append_row(file_path: str | Path, row: dict) -> pd.DataFrame:
-	"""Append a single row to an Excel sheet and return the updated DataFrame."""
-	df = read_excel(file_path)
-	df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-	write_excel(df, file_path)
-	return df
+def read_upload(source: Any, filename: str) -> pd.DataFrame:
+	"""Parse an uploaded CSV or Excel file, picking the reader by extension."""
+	suffix = Path(filename).suffix.lower()
+	if suffix == ".csv":
+		return pd.read_csv(source)
+	if suffix in (".xlsx", ".xls"):
+		return pd.read_excel(source)
+	raise ValueError(f"Unsupported file type: {suffix or filename}")
 
 
-def generate_next_id(df: pd.DataFrame, id_column: str = "id") -> int:
-	if df.empty:
+def generate_next_id(source: pd.DataFrame | str | Path, id_column: str = "id") -> int:
+	"""Next id for a loaded DataFrame, or for a table addressed by path."""
+	if not isinstance(source, pd.DataFrame):
+		cached = _cached(source)
+		if cached is None:
+			return _backend.max_id(source, id_column) + 1
+		source = cached
+	if source.empty:
 		return 1
-	return int(df[id_column].max()) + 1
+	return int(source[id_column].max()) + 1
 
 
+# Table I/O shows up as spans when a trace is active (see utils/instrumentation.py)
+instrument_module(__name__, "io", [
+	"ensure_file",
+	"read_excel",
+	"write_excel",
+	"append_row",
+	"append_rows",
+	"find_row",
+	"update_row",
+	"update_rows",
+	"delete_row",
+	"read_upload",
+])
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import tempfile
+from typing import IO, Any, Iterable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+
+from .battery_functions import filter_inventory, iter_checks, read_batteries
+
+
+# format -> (mime type, file extension)
+FORMATS = {
+	"csv": ("text/csv", "csv"),
+	"xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+	"parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# dataset -> download file stem
+DATASETS = {
+	"batteries": "battery_inventory",
+	"filtered": "battery_inventory_filtered",
+	"checks": "battery_checks",
+}
+
+CHUNK_ROWS = 50_000
+# Excel caps a sheet at 1,048,576 rows including the header
+XLSX_SHEET_ROWS = 1_048_575
+# Temp files spill from memory to disk beyond this size
+SPOOL_BYTES = 8 * 1024 * 1024
+
+
+def _chunked(df: pd.DataFrame, chunk_rows: int) -> Iterator[pd.DataFrame]:
+	for start in range(0, len(df), chunk_rows):
+		yield df.iloc[start : start + chunk_rows]
+
+
+def _plain(df: pd.DataFrame) -> pd.DataFrame:
+	"""Drop per-chunk dtypes (categories, float32) so every chunk exports alike."""
+	out = {}
+	for column in df.columns:
+		series = df[column]
+		if isinstance(series.dtype, pd.CategoricalDtype):
+			out[column] = series.astype("string")
+		elif series.dtype == "float32":
+			out[column] = series.astype("float64").round(4)
+	return df.assign(**out) if out else df
+
+
+def dataset_chunks(
+	dataset: str,
+	filters: Optional[dict[str, Any]] = None,
+	chunk_rows: int = CHUNK_ROWS,
+) -> Iterator[pd.DataFrame]:
+	"""Rows of `dataset` as frames of at most `chunk_rows`.
+
+	`filters` are the `filter_inventory` arguments for the "filtered" dataset.
+	Check history is streamed from the journal, never loaded whole.
+	"""
+	if dataset == "batteries":
+		chunks = _chunked(read_batteries(), chunk_rows)
+	elif dataset == "filtered":
+		chunks = _chunked(filter_inventory(**(filters or {})), chunk_rows)
+	elif dataset == "checks":
+		chunks = iter_checks(chunk_rows)
+	else:
+		raise ValueError(f"Unknown export dataset: {dataset}")
+	for chunk in chunks:
+		yield _plain(chunk)
+
+
+def _write_csv(chunks: Iterable[pd.DataFrame], out: IO[bytes]) -> None:
+	header = True
+	for chunk in chunks:
+		out.write(chunk.to_csv(index=False, header=header).encode("utf-8"))
+		header = False
+
+
+def _cell(value: Any) -> Any:
+	if value is None or value is pd.NA or value is pd.NaT:
+		return None
+	if isinstance(value, pd.Timestamp):
+		return value.to_pydatetime()
+	if isinstance(value, float) and np.isnan(value):
+		return None
+	if isinstance(value, np.generic):
+		return value.item()
+	return value
+
+
+def _write_xlsx(chunks: Iterable[pd.DataFrame], out: IO[bytes]) -> None:
+	# write_only streams rows to the zip instead of building the sheet in memory
+	wb = Workbook(write_only=True)
+	ws, rows, columns = None, 0, None
+	for chunk in chunks:
+		if columns is None:
+			columns = list(chunk.columns)
+		for record in chunk.itertuples(index=False, name=None):
+			if ws is None or rows == XLSX_SHEET_ROWS:
+				ws = wb.create_sheet(f"Sheet{len(wb.worksheets) + 1}")
+				ws.append(columns)
+				rows = 0
+			ws.append([_cell(v) for v in record])
+			rows += 1
+	if ws is None:
+		wb.create_sheet("Sheet1").append(columns or [])
+	wb.save(out)
+
+
+def _write_parquet(chunks: Iterable[pd.DataFrame], out: IO[bytes]) -> None:
+	writer: Optional[pq.ParquetWriter] = None
+	try:
+		for chunk in chunks:
+			if writer is None:
+				table = pa.Table.from_pandas(chunk, preserve_index=False)
+				writer = pq.ParquetWriter(out, table.schema)
+			else:
+				# Later chunks may infer narrower types (e.g. an all-null column)
+				table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+			writer.write_table(table)
+	finally:
+		if writer is not None:
+			writer.close()
+
+
+_WRITERS = {"csv": _write_csv, "xlsx": _write_xlsx, "parquet": _write_parquet}
+
+
+def write_export(chunks: Iterable[pd.DataFrame], fmt: str, out: IO[bytes]) -> None:
+	"""Write `chunks` to the binary stream `out` one chunk at a time."""
+	if fmt not in _WRITERS:
+		raise ValueError(f"Unknown export format: {fmt}")
+	_WRITERS[fmt](chunks, out)
+
+
+def export_file(
+	dataset: str,
+	fmt: str,
+	filters: Optional[dict[str, Any]] = None,
+	chunk_rows: int = CHUNK_ROWS,
+) -> IO[bytes]:
+	"""Build an export into a temp file (spilled to disk when large), rewound for reading."""
+	out = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+	try:
+		write_export(dataset_chunks(dataset, filters, chunk_rows), fmt, out)
+	except BaseException:
+		out.close()
+		raise
+	out.seek(0)
+	return out
+
+
+def export_bytes(
+	dataset: str,
+	fmt: str,
+	filters: Optional[dict[str, Any]] = None,
+) -> bytes:
+	"""Finished export as bytes, for callers (like `st.download_button`) that need it whole.
+
+	Only the encoded file is held at the end; rows are still written chunk
+	by chunk, so the frame for the full dataset never exists at once.
+	"""
+	with export_file(dataset, fmt, filters) as fh:
+		return fh.read()
+
+
+def iter_export(
+	dataset: str,
+	fmt: str,
+	filters: Optional[dict[str, Any]] = None,
+	block_size: int = 1024 * 1024,
+) -> Iterator[bytes]:
+	"""Export as a stream of byte blocks, for chunked HTTP responses."""
+	with export_file(dataset, fmt, filters) as fh:
+		while True:
+			block = fh.read(block_size)
+			if not block:
+				return
+			yield block
+
+
+def export_name(dataset: str, fmt: str) -> str:
+	return f"{DATASETS[dataset]}.{FORMATS[fmt][1]}"
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import threading
+import time
+from pathlib import Path
+
+try:
+	import fcntl
+except ImportError:  # Windows
+	fcntl = None
+	import msvcrt
+
+
+def _lock(fh) -> None:
+	if fcntl is not None:
+		fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+		return
+	while True:
+		try:
+			fh.seek(0)
+			msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+			return
+		except OSError:
+			# LK_LOCK gives up after ~10s; keep waiting like flock would
+			time.sleep(0.05)
+
+
+def _unlock(fh) -> None:
+	if fcntl is not None:
+		fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+		return
+	fh.seek(0)
+	msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+	"""Re-entrant advisory lock on a file.
+
+	Threads of this process serialise on an RLock; the OS lock is held while
+	any thread is inside, so other processes wait too. Use `file_lock()` to get
+	the shared instance for a path: two instances on the same path would
+	deadlock each other under flock.
+	"""
+
+	def __init__(self, path: str | Path):
+		self.path = Path(path)
+		self._rlock = threading.RLock()
+		self._depth = 0
+		self._fh = None
+
+	def acquire(self) -> None:
+		self._rlock.acquire()
+		if self._depth == 0:
+			try:
+				self.path.parent.mkdir(parents=True, exist_ok=True)
+				self._fh = open(self.path, "a+b")
+				_lock(self._fh)
+			except BaseException:
+				if self._fh is not None:
+					self._fh.close()
+					self._fh = None
+				self._rlock.release()
+				raise
+		self._depth += 1
+
+	def release(self) -> None:
+		self._depth -= 1
+		if self._depth == 0:
+			try:
+				_unlock(self._fh)
+			finally:
+				self._fh.close()
+				self._fh = None
+		self._rlock.release()
+
+	def __enter__(self) -> "FileLock":
+		self.acquire()
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self.release()
+
+
+_locks: dict[Path, FileLock] = {}
+_locks_guard = threading.Lock()
+
+
+def file_lock(path: str | Path) -> FileLock:
+	"""Process-wide FileLock for `path`."""
+	path = Path(path).resolve()
+	with _locks_guard:
+		lock = _locks.get(path)
+		if lock is None:
+			lock = _locks[path] = FileLock(path)
+		return lock
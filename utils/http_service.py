@@ -0,0 +1,512 @@
+"""Headless HTTP API for scanners and other machine clients.
+
+A small asyncio HTTP/1.1 server over `battery_functions`: the tables, scan
+index and KPIs stay hot in this process, connections are kept alive, and
+write endpoints accept a JSON array to apply many items in one request.
+Streamlit remains the human UI; both can run against the same data
+directory at once.
+
+    python -m utils.http_service --host 0.0.0.0 --port 8600
+
+Endpoints (JSON in and out):
+
+    GET  /health
+    GET  /v1/kpis
+    GET  /v1/scan?q=<id or product number>
+    POST /v1/scan       {"identifier": ...}            or an array of them
+    GET  /v1/complete?q=<prefix>&limit=10              product number autocomplete
+    POST /v1/batteries  {"product_number", "packing_month"?, "initial_voltage"?}  or an array
+    POST /v1/voltage    {"battery_id", "voltage_reading", "checked_by", "notes"?, "voltage_during_check"?}
+                        an array is applied as one bulk update
+    POST /v1/handover   {"battery_id", "status"}       or an array
+    POST /v1/readings   bulk ingest: JSON array, NDJSON or CSV body
+    POST /v1/manifest   supplier manifest import (same body formats), ?packing_month=
+    GET  /v1/export?dataset=checks&format=csv          streamed (chunked)
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import time
+from datetime import date, datetime
+from typing import Any, Awaitable, Callable, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from . import battery_functions as bf
+from .excel_handler import get_backend, read_upload
+from .exports import DATASETS, FORMATS, export_name, iter_export
+from .schema import STATUSES
+
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 64 * 1024 * 1024
+IDLE_TIMEOUT = 30.0
+
+REASONS = {
+	200: "OK",
+	400: "Bad Request",
+	404: "Not Found",
+	405: "Method Not Allowed",
+	411: "Length Required",
+	413: "Payload Too Large",
+	431: "Request Header Fields Too Large",
+	500: "Internal Server Error",
+}
+
+
+class HttpError(Exception):
+	def __init__(self, status: int, message: str):
+		super().__init__(message)
+		self.status = status
+
+
+class Request:
+	__slots__ = ("method", "path", "query", "version", "headers", "body")
+
+	def __init__(self, method: str, target: str, version: str, headers: dict[str, str], body: bytes):
+		url = urlsplit(target)
+		self.method = method
+		self.path = url.path.rstrip("/") or "/"
+		self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+		self.version = version
+		self.headers = headers
+		self.body = body
+
+	@property
+	def keep_alive(self) -> bool:
+		connection = self.headers.get("connection", "").lower()
+		if self.version == "HTTP/1.0":
+			return connection == "keep-alive"
+		return connection != "close"
+
+	def json(self) -> Any:
+		if not self.body:
+			raise HttpError(400, "Request body required")
+		try:
+			return json.loads(self.body)
+		except ValueError as e:
+			raise HttpError(400, f"Invalid JSON: {e}") from None
+
+
+def _jsonable(value: Any) -> Any:
+	"""A response payload with plain JSON values throughout."""
+	if isinstance(value, dict):
+		return {str(k): _jsonable(v) for k, v in value.items()}
+	if isinstance(value, (list, tuple)):
+		return [_jsonable(v) for v in value]
+	if value is None or value is pd.NA or value is pd.NaT:
+		return None
+	if isinstance(value, (pd.Timestamp, datetime, date)):
+		return value.isoformat()
+	if isinstance(value, np.generic):
+		value = value.item()
+	if isinstance(value, float) and math.isnan(value):
+		return None
+	return value
+
+
+def _record(row: Optional[pd.Series]) -> Optional[dict]:
+	if row is None:
+		return None
+	return _jsonable(row.to_dict())
+
+
+def _records(df: pd.DataFrame) -> list[dict]:
+	return _jsonable(df.to_dict("records"))
+
+
+def _items(payload: Any) -> tuple[list, bool]:
+	"""Items of a single-or-batch body, and whether it was a batch."""
+	if isinstance(payload, list):
+		return payload, True
+	return [payload], False
+
+
+def _field(item: Any, name: str, required: bool = True) -> Any:
+	if not isinstance(item, dict):
+		raise ValueError("Each item must be a JSON object")
+	value = item.get(name)
+	if required and (value is None or value == ""):
+		raise ValueError(f"{name} is required")
+	return value
+
+
+def _text(item: Any, name: str, required: bool = True) -> Optional[str]:
+	value = _field(item, name, required)
+	if value is None:
+		return None
+	if isinstance(value, bool) or not isinstance(value, (str, int)):
+		raise ValueError(f"{name} must be a string")
+	return str(value).strip()
+
+
+def _number(item: Any, name: str, kind: type = float, required: bool = True) -> Any:
+	value = _field(item, name, required)
+	if value is None or value == "":
+		return None
+	what = "an integer" if kind is int else "a number"
+	if isinstance(value, bool) or not isinstance(value, (str, int, float)) or (kind is int and isinstance(value, float) and not value.is_integer()):
+		raise ValueError(f"{name} must be {what}")
+	try:
+		number = kind(value)
+	except ValueError:
+		raise ValueError(f"{name} must be {what}") from None
+	if kind is float and not math.isfinite(number):
+		raise ValueError(f"{name} must be {what}")
+	return number
+
+
+def _status_for(error: Exception) -> int:
+	return 404 if "not found" in str(error).lower() else 400
+
+
+# --- handlers --------------------------------------------------------------
+# Every call into battery_functions runs in a worker thread: a read can
+# rebuild a stale index and writes block on the single writer, so neither
+# may stall the event loop. Concurrent writes share the writer's group commits.
+
+async def health(request: Request) -> tuple[int, Any]:
+	return 200, {"status": "ok", "storage": get_backend().name}
+
+
+async def kpis(request: Request) -> tuple[int, Any]:
+	return 200, await asyncio.to_thread(bf.dashboard_kpis)
+
+
+def _scan_one(identifier: Any) -> dict:
+	if isinstance(identifier, dict):
+		identifier = identifier.get("identifier")
+	if identifier is None or str(identifier).strip() == "":
+		return {"ok": False, "error": "identifier is required"}
+	if isinstance(identifier, bool) or not isinstance(identifier, (str, int)):
+		return {"ok": False, "error": "identifier must be a string"}
+	row = bf.scan_battery(str(identifier).strip())
+	if row is None:
+		return {"ok": False, "identifier": identifier, "error": "Battery not found"}
+	return {"ok": True, "identifier": identifier, "battery": _record(row)}
+
+
+async def scan(request: Request) -> tuple[int, Any]:
+	if request.method == "GET":
+		result = await asyncio.to_thread(_scan_one, request.query.get("q"))
+		return (200 if result["ok"] else 404 if "identifier" in result else 400), result
+	items, batch = _items(request.json())
+	results = await asyncio.to_thread(lambda: [_scan_one(item) for item in items])
+	if batch:
+		return 200, {"results": results}
+	result = results[0]
+	return (200 if result["ok"] else 404 if "identifier" in result else 400), result
+
+
+async def _each(items: list, batch: bool, fn: Callable[[Any], dict]) -> tuple[int, Any]:
+	"""Apply `fn` to every item concurrently; failures are reported per item."""
+	async def one(item: Any) -> tuple[int, dict]:
+		try:
+			return 200, {"ok": True, **await asyncio.to_thread(fn, item)}
+		except ValueError as e:
+			return _status_for(e), {"ok": False, "error": str(e)}
+
+	outcomes = await asyncio.gather(*(one(item) for item in items))
+	if batch:
+		return 200, {"results": [result for _, result in outcomes]}
+	return outcomes[0]
+
+
+async def complete(request: Request) -> tuple[int, Any]:
+	try:
+		limit = min(max(int(request.query.get("limit", 10)), 1), 100)
+	except ValueError:
+		raise HttpError(400, "limit must be an integer") from None
+	return 200, {"matches": await asyncio.to_thread(bf.complete_product_number, request.query.get("q", ""), limit)}
+
+
+def _add(item: Any) -> dict:
+	added = bf.add_battery(
+		_text(item, "product_number"),
+		_text(item, "packing_month", required=False) or None,
+		_number(item, "initial_voltage", required=False),
+	)
+	return {"battery": _record(added)}
+
+
+async def add(request: Request) -> tuple[int, Any]:
+	return await _each(*_items(request.json()), _add)
+
+
+def _voltage(item: Any) -> dict:
+	updated = bf.update_voltage(
+		_number(item, "battery_id", int),
+		_number(item, "voltage_reading"),
+		_text(item, "checked_by"),
+		_text(item, "notes", required=False),
+		_number(item, "voltage_during_check", required=False),
+	)
+	return {"battery": _record(updated)}
+
+
+async def _bulk(readings: pd.DataFrame | list[dict], checked_by: Optional[str]) -> tuple[int, Any]:
+	try:
+		result = await asyncio.to_thread(bf.bulk_update_voltages, readings, checked_by)
+	except ValueError as e:
+		raise HttpError(400, str(e)) from None
+	counts = result["status"].value_counts()
+	return 200, {
+		"updated": int(counts.get("updated", 0)),
+		"stale": int(counts.get("stale", 0)),
+		"failed": int(counts.get("failed", 0)),
+		"results": _records(result[["battery_id", "status", "error"]]),
+	}
+
+
+async def voltage(request: Request) -> tuple[int, Any]:
+	payload = request.json()
+	if isinstance(payload, list):
+		# A batch is one validated bulk update: one table write, one journal append
+		if not all(isinstance(item, dict) for item in payload):
+			raise HttpError(400, "Each item must be a JSON object")
+		return await _bulk(payload, request.query.get("checked_by"))
+	return await _each([payload], False, _voltage)
+
+
+def _handover(item: Any) -> dict:
+	status = _text(item, "status")
+	if status not in STATUSES:
+		raise ValueError(f"status must be one of {', '.join(STATUSES)}")
+	return {"battery": _record(bf.handover_status(_number(item, "battery_id", int), status))}
+
+
+async def handover(request: Request) -> tuple[int, Any]:
+	return await _each(*_items(request.json()), _handover)
+
+
+def _rows_body(request: Request, what: str) -> pd.DataFrame:
+	"""A JSON array, NDJSON or CSV request body as a frame."""
+	content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+	if not request.body:
+		raise HttpError(400, "Request body required")
+	if content_type in ("text/csv", "application/csv"):
+		return read_upload(io.BytesIO(request.body), f"{what}.csv")
+	if content_type in ("application/x-ndjson", "application/jsonl"):
+		try:
+			return pd.DataFrame([json.loads(line) for line in request.body.splitlines() if line.strip()])
+		except ValueError as e:
+			raise HttpError(400, f"Invalid NDJSON: {e}") from None
+	payload = request.json()
+	if not isinstance(payload, list):
+		raise HttpError(400, f"Expected a JSON array of {what}")
+	return pd.DataFrame(payload)
+
+
+async def readings(request: Request) -> tuple[int, Any]:
+	return await _bulk(_rows_body(request, "readings"), request.query.get("checked_by"))
+
+
+async def manifest(request: Request) -> tuple[int, Any]:
+	try:
+		result = await asyncio.to_thread(bf.import_batteries, _rows_body(request, "manifest"), request.query.get("packing_month"))
+	except ValueError as e:
+		raise HttpError(400, str(e)) from None
+	counts = result["status"].value_counts()
+	return 200, {
+		**{status: int(counts.get(status, 0)) for status in ("inserted", "duplicate", "invalid")},
+		"results": _records(result[["product_number", "id", "status", "error"]]),
+	}
+
+
+ROUTES: dict[str, dict[str, Callable[[Request], Awaitable[tuple[int, Any]]]]] = {
+	"/health": {"GET": health},
+	"/v1/kpis": {"GET": kpis},
+	"/v1/scan": {"GET": scan, "POST": scan},
+	"/v1/complete": {"GET": complete},
+	"/v1/batteries": {"POST": add},
+	"/v1/voltage": {"POST": voltage},
+	"/v1/handover": {"POST": handover},
+	"/v1/readings": {"POST": readings},
+	"/v1/manifest": {"POST": manifest},
+}
+
+
+# --- HTTP plumbing ---------------------------------------------------------
+
+def _size(value: bytes | str, base: int, what: str) -> int:
+	try:
+		size = int(value, base)
+	except ValueError:
+		raise HttpError(400, f"Malformed {what}") from None
+	if size < 0:
+		raise HttpError(400, f"Malformed {what}")
+	return size
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+	try:
+		head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT)
+	except asyncio.IncompleteReadError as e:
+		if e.partial.strip():
+			raise HttpError(400, "Incomplete request") from None
+		return None
+	except asyncio.LimitOverrunError:
+		raise HttpError(431, "Request headers too large") from None
+	lines = head.decode("latin-1").split("\r\n")
+	try:
+		method, target, version = lines[0].split(" ", 2)
+	except ValueError:
+		raise HttpError(400, "Malformed request line") from None
+	headers = {}
+	for line in lines[1:]:
+		if line:
+			name, _, value = line.partition(":")
+			headers[name.strip().lower()] = value.strip()
+
+	if headers.get("transfer-encoding", "").lower() == "chunked":
+		body = bytearray()
+		while True:
+			size = _size((await reader.readline()).split(b";")[0].strip() or b"0", 16, "chunk size")
+			if size == 0:
+				await reader.readuntil(b"\r\n")
+				break
+			# Checked before reading, so a chunk declaring a huge size is never buffered
+			if len(body) + size > MAX_BODY_BYTES:
+				raise HttpError(413, "Request body too large")
+			body += await reader.readexactly(size)
+			if await reader.readexactly(2) != b"\r\n":
+				raise HttpError(400, "Malformed chunk")
+		body = bytes(body)
+	else:
+		length = _size(headers.get("content-length") or "0", 10, "Content-Length")
+		if length > MAX_BODY_BYTES:
+			raise HttpError(413, "Request body too large")
+		body = await reader.readexactly(length) if length else b""
+	return Request(method.upper(), target, version, headers, body)
+
+
+def _head(status: int, headers: dict[str, str]) -> bytes:
+	lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"] + [f"{k}: {v}" for k, v in headers.items()]
+	return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def _respond(writer: asyncio.StreamWriter, status: int, payload: Any, keep_alive: bool) -> None:
+	body = json.dumps(_jsonable(payload)).encode("utf-8")
+	writer.write(_head(status, {
+		"Content-Type": "application/json",
+		"Content-Length": str(len(body)),
+		"Connection": "keep-alive" if keep_alive else "close",
+	}) + body)
+	await writer.drain()
+
+
+async def _stream_export(request: Request, writer: asyncio.StreamWriter) -> None:
+	"""Chunked transfer of an export, generated block by block off the event loop."""
+	dataset = request.query.get("dataset", "checks")
+	fmt = request.query.get("format", "csv")
+	if dataset not in DATASETS or fmt not in FORMATS:
+		raise HttpError(400, f"dataset must be one of {', '.join(DATASETS)}; format one of {', '.join(FORMATS)}")
+	blocks = iter_export(dataset, fmt)
+	first = await asyncio.to_thread(next, blocks, b"")
+	writer.write(_head(200, {
+		"Content-Type": FORMATS[fmt][0],
+		"Content-Disposition": f'attachment; filename="{export_name(dataset, fmt)}"',
+		"Transfer-Encoding": "chunked",
+		"Connection": "keep-alive" if request.keep_alive else "close",
+	}))
+	block = first
+	while block:
+		writer.write(f"{len(block):X}\r\n".encode() + block + b"\r\n")
+		await writer.drain()
+		block = await asyncio.to_thread(next, blocks, b"")
+	writer.write(b"0\r\n\r\n")
+	await writer.drain()
+
+
+async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+	"""Serve requests on one connection until the client closes it or goes idle."""
+	try:
+		while True:
+			try:
+				request = await _read_request(reader)
+			except HttpError as e:
+				await _respond(writer, e.status, {"error": str(e)}, False)
+				break
+			except ValueError:
+				# A line past the stream limit: the framing is lost, so answer and close
+				await _respond(writer, 400, {"error": "Malformed request"}, False)
+				break
+			except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError):
+				break
+			if request is None:
+				break
+			try:
+				if request.path == "/v1/export" and request.method == "GET":
+					await _stream_export(request, writer)
+				else:
+					route = ROUTES.get(request.path)
+					if route is None:
+						raise HttpError(404, f"No route for {request.path}")
+					handler = route.get(request.method)
+					if handler is None:
+						raise HttpError(405, f"{request.method} not allowed on {request.path}")
+					status, payload = await handler(request)
+					await _respond(writer, status, payload, request.keep_alive)
+			except HttpError as e:
+				await _respond(writer, e.status, {"error": str(e)}, request.keep_alive)
+			except ValueError as e:
+				await _respond(writer, _status_for(e), {"error": str(e)}, request.keep_alive)
+			except Exception as e:
+				await _respond(writer, 500, {"error": f"{type(e).__name__}: {e}"}, False)
+				break
+			if not request.keep_alive:
+				break
+	except ConnectionError:
+		pass
+	finally:
+		writer.close()
+		try:
+			await writer.wait_closed()
+		except ConnectionError:
+			pass
+
+
+def warm() -> float:
+	"""Load the tables, scan index, KPIs and journal before taking traffic."""
+	started = time.perf_counter()
+	bf.ensure_all_files()
+	bf.read_batteries()
+	bf.scan_battery("")
+	bf.complete_product_number("0")
+	bf.dashboard_kpis()
+	bf.check_journal()
+	return time.perf_counter() - started
+
+
+async def serve(host: str = "127.0.0.1", port: int = 8600) -> asyncio.Server:
+	await asyncio.to_thread(warm)
+	return await asyncio.start_server(handle, host, port, limit=MAX_HEADER_BYTES)
+
+
+async def _main(host: str, port: int) -> None:
+	server = await serve(host, port)
+	addresses = ", ".join(str(s.getsockname()) for s in server.sockets)
+	print(f"Volt Guard HTTP service listening on {addresses}", flush=True)
+	async with server:
+		await server.serve_forever()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+	parser = argparse.ArgumentParser(description="Volt Guard HTTP ingestion service")
+	parser.add_argument("--host", default="127.0.0.1")
+	parser.add_argument("--port", type=int, default=8600)
+	args = parser.parse_args(argv)
+	try:
+		asyncio.run(_main(args.host, args.port))
+	except KeyboardInterrupt:
+		pass
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+import pandas as pd
+
+
+class Span:
+	"""One timed call: wall time plus the rows and bytes it touched."""
+
+	__slots__ = ("name", "category", "start", "duration", "rows", "bytes_read", "bytes_written", "thread", "depth", "args")
+
+	def __init__(self, name: str, category: str, depth: int):
+		self.name = name
+		self.category = category
+		self.start = time.perf_counter()
+		self.duration = 0.0
+		self.rows: Optional[int] = None
+		self.bytes_read = 0
+		self.bytes_written = 0
+		self.thread = threading.current_thread().name
+		self.depth = depth
+		self.args: dict[str, Any] = {}
+
+
+class Trace:
+	"""Spans recorded while the trace is active, e.g. during one Streamlit rerun.
+
+	Spans nest: bytes and rows recorded inside a call also count towards
+	every call that encloses it, like wall time does.
+	"""
+
+	def __init__(self, label: str = "rerun"):
+		self.label = label
+		self.started_at = time.time()
+		self.origin = time.perf_counter()
+		self.spans: list[Span] = []
+		self.lock = threading.Lock()
+
+	@property
+	def elapsed(self) -> float:
+		return time.perf_counter() - self.origin
+
+	def summary(self) -> pd.DataFrame:
+		"""Calls, wall time, rows and bytes per function, slowest first."""
+		with self.lock:
+			spans = list(self.spans)
+		columns = ["name", "category", "calls", "total_ms", "mean_ms", "max_ms", "rows", "bytes_read", "bytes_written"]
+		if not spans:
+			return pd.DataFrame(columns=columns)
+		df = pd.DataFrame({
+			"name": [s.name for s in spans],
+			"category": [s.category for s in spans],
+			"ms": [s.duration * 1000 for s in spans],
+			"rows": [s.rows for s in spans],
+			"bytes_read": [s.bytes_read for s in spans],
+			"bytes_written": [s.bytes_written for s in spans],
+		})
+		out = df.groupby(["name", "category"], sort=False).agg(
+			calls=("ms", "size"),
+			total_ms=("ms", "sum"),
+			mean_ms=("ms", "mean"),
+			max_ms=("ms", "max"),
+			rows=("rows", "sum"),
+			bytes_read=("bytes_read", "sum"),
+			bytes_written=("bytes_written", "sum"),
+		).reset_index()
+		return out.sort_values("total_ms", ascending=False, kind="stable").reset_index(drop=True)[columns]
+
+	def to_chrome(self) -> dict:
+		"""Chrome trace-event JSON (open in chrome://tracing or ui.perfetto.dev)."""
+		with self.lock:
+			spans = list(self.spans)
+		threads: dict[str, int] = {}
+		events = []
+		for s in spans:
+			tid = threads.setdefault(s.thread, len(threads) + 1)
+			args = {"rows": s.rows, "bytes_read": s.bytes_read, "bytes_written": s.bytes_written, **s.args}
+			events.append({
+				"name": s.name,
+				"cat": s.category,
+				"ph": "X",
+				"ts": round((s.start - self.origin) * 1e6, 1),
+				"dur": round(s.duration * 1e6, 1),
+				"pid": os.getpid(),
+				"tid": tid,
+				"args": args,
+			})
+		events += [
+			{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+			for name, tid in threads.items()
+		]
+		return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"label": self.label, "started_at": self.started_at}}
+
+	def save(self, path: str | Path) -> Path:
+		path = Path(path)
+		path.write_text(json.dumps(self.to_chrome()))
+		return path
+
+
+# Active trace and the spans open in this context, innermost last. Both are
+# context variables, so they follow work handed to the writer thread.
+_trace: ContextVar[Optional[Trace]] = ContextVar("volt_guard_trace", default=None)
+_open: ContextVar[tuple[Span, ...]] = ContextVar("volt_guard_open_spans", default=())
+
+
+def current_trace() -> Optional[Trace]:
+	return _trace.get()
+
+
+def begin_trace(label: str = "rerun") -> Trace:
+	"""Start recording in this context; later calls here (and in work it submits) are traced."""
+	trace = Trace(label)
+	_trace.set(trace)
+	_open.set(())
+	return trace
+
+
+def resume_trace(trace: Trace) -> Trace:
+	"""Continue recording into `trace`, e.g. one begun by a rerun that was cut short."""
+	_trace.set(trace)
+	_open.set(())
+	return trace
+
+
+def end_trace() -> Optional[Trace]:
+	trace = _trace.get()
+	_trace.set(None)
+	_open.set(())
+	return trace
+
+
+@contextmanager
+def span(name: str, category: str = "app") -> Iterator[Optional[Span]]:
+	"""Time a block as its own span; a no-op when no trace is active."""
+	trace = _trace.get()
+	if trace is None:
+		yield None
+		return
+	stack = _open.get()
+	current = Span(name, category, len(stack))
+	token = _open.set(stack + (current,))
+	try:
+		yield current
+	finally:
+		current.duration = time.perf_counter() - current.start
+		_open.reset(token)
+		with trace.lock:
+			trace.spans.append(current)
+
+
+@contextmanager
+def collect(name: str) -> Iterator[Span]:
+	"""Record a block into a scratch span, whether or not a trace is active.
+
+	Used where work happens outside any caller's context, such as the
+	writer's final commit, so its bytes can be handed back to the callers.
+	"""
+	trace_token = _trace.set(Trace(name))
+	open_token = _open.set(())
+	try:
+		with span(name, "io") as current:
+			yield current
+	finally:
+		_open.reset(open_token)
+		_trace.reset(trace_token)
+
+
+def record_io(bytes_read: int = 0, bytes_written: int = 0) -> None:
+	"""Attribute bytes to every open span."""
+	trace = _trace.get()
+	if trace is None:
+		return
+	with trace.lock:
+		for s in _open.get():
+			s.bytes_read += bytes_read
+			s.bytes_written += bytes_written
+
+
+def annotate(**values: Any) -> None:
+	"""Attach key/values to the innermost open span (shown in the trace file)."""
+	stack = _open.get()
+	if stack:
+		stack[-1].args.update(values)
+
+
+def add_span(name: str, category: str, duration: float, rows: Optional[int] = None, bytes_written: int = 0) -> None:
+	"""Record an already-finished piece of work (e.g. a shared commit) in the active trace."""
+	trace = _trace.get()
+	if trace is None:
+		return
+	done = Span(name, category, len(_open.get()))
+	done.start -= duration
+	done.duration = duration
+	done.rows = rows
+	done.bytes_written = bytes_written
+	with trace.lock:
+		trace.spans.append(done)
+
+
+def _rows(result: Any) -> Optional[int]:
+	if isinstance(result, (pd.DataFrame, list)):
+		return len(result)
+	if isinstance(result, pd.Series):
+		return 1
+	if isinstance(result, bool):
+		return int(result)
+	if isinstance(result, int):
+		return result
+	if isinstance(result, tuple) and result and isinstance(result[0], pd.DataFrame):
+		return len(result[0])
+	if result is None:
+		return 0
+	return None
+
+
+def instrumented(fn: Callable, category: str = "function") -> Callable:
+	"""Wrap `fn` so each call becomes a span with its wall time and result rows."""
+	name = f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+	@functools.wraps(fn)
+	def wrapper(*args: Any, **kwargs: Any) -> Any:
+		if _trace.get() is None:
+			return fn(*args, **kwargs)
+		with span(name, category) as current:
+			result = fn(*args, **kwargs)
+			current.rows = _rows(result)
+			return result
+
+	return wrapper
+
+
+def instrument_module(module_name: str, category: str = "function", names: Optional[Iterable[str]] = None) -> None:
+	"""Instrument the public functions defined in a module (or just `names`).
+
+	Call at the bottom of the module: later imports of its functions get the
+	wrapped versions, and calls between the module's own functions nest.
+	"""
+	module = sys.modules[module_name]
+	for attr in list(names) if names is not None else list(vars(module)):
+		fn = getattr(module, attr)
+		if attr.startswith("_") or not inspect.isfunction(fn) or fn.__module__ != module_name:
+			continue
+		setattr(module, attr, instrumented(fn, category))
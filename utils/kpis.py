@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from .battery_index import TableView
+from .thresholds import BUCKETS, get_profiles
+
+
+def voltage_bucket(voltage: Any, product_number: Any = None) -> str:
+	"""Colour bucket of one reading under its product's threshold profile; gray if unknown."""
+	return get_profiles().bucket(voltage, product_number)
+
+
+def voltage_buckets(voltages: pd.Series, product_numbers: Optional[pd.Series] = None) -> pd.Series:
+	"""Vectorized `voltage_bucket` over a column; without product numbers the default thresholds apply."""
+	return pd.Series(get_profiles().buckets(voltages, product_numbers), index=voltages.index)
+
+
+def bucket_counts(df: pd.DataFrame) -> dict[str, int]:
+	"""Red/yellow/green/gray counts for any battery frame, in one pass."""
+	if df.empty:
+		return dict.fromkeys(BUCKETS, 0)
+	codes = get_profiles().classify(df["current_voltage"], df["product_number"] if "product_number" in df.columns else None)
+	return dict(zip(BUCKETS, np.bincount(codes, minlength=len(BUCKETS)).tolist()))
+
+
+def _is_active(status: Any) -> bool:
+	return str(status).lower() == "active"
+
+
+class DashboardKPIs(TableView):
+	"""Materialized dashboard counts, maintained from row deltas.
+
+	Total, active, low (yellow) and need-charging (red) are the header KPIs;
+	the full colour breakdown backs the unfiltered Inventory metrics.
+	"""
+
+	def __init__(self):
+		super().__init__()
+		self.total = 0
+		self.active = 0
+		self.buckets = dict.fromkeys(BUCKETS, 0)
+		self.profiles = get_profiles()
+
+	def stale(self) -> bool:
+		return self.profiles is not get_profiles()
+
+	def build(self, df: pd.DataFrame) -> None:
+		self.profiles = get_profiles()
+		self.total = len(df)
+		self.active = int((df["status"].astype("string").str.lower() == "active").sum()) if not df.empty else 0
+		self.buckets = bucket_counts(df)
+
+	def _count(self, row: dict, sign: int) -> None:
+		self.total += sign
+		if _is_active(row.get("status")):
+			self.active += sign
+		self.buckets[self.profiles.bucket(row.get("current_voltage"), row.get("product_number"))] += sign
+
+	def apply(self, old: Optional[dict], new: Optional[dict]) -> None:
+		if old is not None:
+			self._count(old, -1)
+		if new is not None:
+			self._count(new, 1)
+
+	def snapshot(self) -> dict[str, int]:
+		return {
+			"total": self.total,
+			"active": self.active,
+			"low": self.buckets["yellow"],
+			"need_charging": self.buckets["red"],
+			**self.buckets,
+		}
+
+	def verify(self, df: pd.DataFrame) -> bool:
+		"""Rebuild from `df` into a scratch copy and compare with the live counts."""
+		check = DashboardKPIs()
+		check.build(df)
+		return check.snapshot() == self.snapshot()
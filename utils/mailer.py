@@ -0,0 +1,358 @@
+from __future__ import annotations
+
+import itertools
+import json
+import os
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from dataclasses import dataclass
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+import pandas as pd
+
+from .excel_handler import DATA_DIR
+from .reports import Report, ReportBuilder
+from .subscriptions import FREQUENCIES, subscription_rules
+
+try:
+	from dotenv import load_dotenv
+except ImportError:  # optional: settings can come from the real environment
+	load_dotenv = None
+
+
+# One JSON line per finished delivery
+DELIVERY_LOG = DATA_DIR / "email_deliveries.jsonl"
+
+
+@dataclass(frozen=True)
+class SmtpSettings:
+	host: str = ""
+	port: int = 25
+	username: str = ""
+	password: str = ""
+	sender: str = "volt-guard@localhost"
+	starttls: bool = False
+	use_ssl: bool = False
+	timeout: float = 30.0
+
+	@property
+	def configured(self) -> bool:
+		return bool(self.host)
+
+	@classmethod
+	def from_env(cls) -> "SmtpSettings":
+		"""Read VOLT_GUARD_SMTP_* variables (from `.env` too, when python-dotenv is installed)."""
+		if load_dotenv is not None:
+			load_dotenv(override=False)
+		env = os.environ.get
+		flag = lambda name: env(name, "").strip().lower() in ("1", "true", "yes", "on")
+		return cls(
+			host=env("VOLT_GUARD_SMTP_HOST", "").strip(),
+			port=int(env("VOLT_GUARD_SMTP_PORT") or 25),
+			username=env("VOLT_GUARD_SMTP_USER", ""),
+			password=env("VOLT_GUARD_SMTP_PASSWORD", ""),
+			sender=env("VOLT_GUARD_SMTP_FROM") or cls.sender,
+			starttls=flag("VOLT_GUARD_SMTP_STARTTLS"),
+			use_ssl=flag("VOLT_GUARD_SMTP_SSL"),
+		)
+
+
+def _transient(error: Exception) -> bool:
+	"""4xx replies and dropped connections are retried; 5xx replies are final."""
+	if isinstance(error, smtplib.SMTPRecipientsRefused):
+		codes = [code for code, _ in error.recipients.values()]
+		return bool(codes) and all(400 <= code < 500 for code in codes)
+	if isinstance(error, smtplib.SMTPResponseException):
+		return 400 <= error.smtp_code < 500
+	return isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError))
+
+
+def clean_recipients(emails: Iterable[Any]) -> list[str]:
+	"""Stripped, de-duplicated addresses in their original order; blanks dropped."""
+	seen: dict[str, str] = {}
+	for email in emails:
+		if email is None or email is pd.NA or (isinstance(email, float) and email != email):
+			continue
+		email = str(email).strip()
+		if "@" in email and email.lower() not in seen:
+			seen[email.lower()] = email
+	return list(seen.values())
+
+
+class Mailer:
+	"""Background worker that delivers reports over one pooled SMTP connection.
+
+	`submit()` queues a report and returns a delivery id at once; the worker
+	renders the message once, sends it to the recipients in batches of
+	`batch_size` (envelope recipients, so nobody sees the others' addresses),
+	and retries transient failures with exponential backoff. The connection
+	is kept open between batches and deliveries and closed after
+	`idle_timeout` seconds without work. Each delivery's status is kept in
+	memory and appended to `log_path` when it finishes.
+	"""
+
+	def __init__(
+		self,
+		settings: SmtpSettings,
+		batch_size: int = 50,
+		max_attempts: int = 4,
+		backoff: float = 1.0,
+		max_backoff: float = 30.0,
+		idle_timeout: float = 60.0,
+		log_path: Optional[str | Path] = DELIVERY_LOG,
+		connect: Optional[Callable[[SmtpSettings], smtplib.SMTP]] = None,
+	):
+		self.settings = settings
+		self.batch_size = batch_size
+		self.max_attempts = max_attempts
+		self.backoff = backoff
+		self.max_backoff = max_backoff
+		self.idle_timeout = idle_timeout
+		self.log_path = Path(log_path) if log_path is not None else None
+		self.connections = 0
+		self._connect = connect or self._open
+		self._smtp: Optional[smtplib.SMTP] = None
+		self._deliveries: dict[str, dict] = {}
+		self._lock = threading.Lock()
+		self._queue: queue.Queue = queue.Queue()
+		self._ids = itertools.count(1)
+		self._stop = threading.Event()
+		self._thread: Optional[threading.Thread] = None
+		self._start_lock = threading.Lock()
+
+	# --- public API --------------------------------------------------------
+
+	def submit(self, report: Report, recipients: Iterable[Any]) -> str:
+		recipients = clean_recipients(recipients)
+		delivery_id = f"{time.strftime('%Y%m%d%H%M%S')}-{next(self._ids)}"
+		record = {
+			"id": delivery_id,
+			"subject": report.subject,
+			"status": "queued" if recipients else "failed",
+			"recipients": len(recipients),
+			"delivered": 0,
+			"failed": {},
+			"attempts": 0,
+			"error": None if recipients else "No recipients",
+			"queued_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+			"finished_at": None,
+		}
+		with self._lock:
+			self._deliveries[delivery_id] = record
+		if recipients:
+			self._ensure_started()
+			self._queue.put((delivery_id, report, recipients))
+		return delivery_id
+
+	def status(self, delivery_id: str) -> Optional[dict]:
+		with self._lock:
+			record = self._deliveries.get(delivery_id)
+			return None if record is None else {**record, "failed": dict(record["failed"])}
+
+	def recent(self, limit: int = 10) -> list[dict]:
+		with self._lock:
+			ids = list(self._deliveries)[-limit:]
+		return [self.status(i) for i in reversed(ids)]
+
+	def wait(self, timeout: Optional[float] = None) -> bool:
+		"""Block until every queued delivery has finished."""
+		deadline = None if timeout is None else time.monotonic() + timeout
+		while self._queue.unfinished_tasks:
+			if deadline is not None and time.monotonic() >= deadline:
+				return False
+			time.sleep(0.01)
+		return True
+
+	def stop(self) -> None:
+		self._stop.set()
+		self._queue.put(None)
+		if self._thread is not None:
+			self._thread.join()
+
+	# --- worker ------------------------------------------------------------
+
+	def _ensure_started(self) -> None:
+		if self._thread is not None and self._thread.is_alive():
+			return
+		with self._start_lock:
+			if self._thread is None or not self._thread.is_alive():
+				self._stop.clear()
+				self._thread = threading.Thread(target=self._loop, name="mailer", daemon=True)
+				self._thread.start()
+
+	def _loop(self) -> None:
+		while not self._stop.is_set():
+			try:
+				job = self._queue.get(timeout=self.idle_timeout)
+			except queue.Empty:
+				self._disconnect()
+				continue
+			try:
+				if job is not None:
+					self._deliver(*job)
+			finally:
+				self._queue.task_done()
+		self._disconnect()
+
+	def _open(self, settings: SmtpSettings) -> smtplib.SMTP:
+		if settings.use_ssl:
+			smtp = smtplib.SMTP_SSL(settings.host, settings.port, timeout=settings.timeout, context=ssl.create_default_context())
+		else:
+			smtp = smtplib.SMTP(settings.host, settings.port, timeout=settings.timeout)
+			if settings.starttls:
+				smtp.starttls(context=ssl.create_default_context())
+		if settings.username:
+			smtp.login(settings.username, settings.password)
+		return smtp
+
+	def _connection(self) -> smtplib.SMTP:
+		if self._smtp is None:
+			self._smtp = self._connect(self.settings)
+			self.connections += 1
+		return self._smtp
+
+	def _disconnect(self) -> None:
+		if self._smtp is None:
+			return
+		try:
+			self._smtp.quit()
+		except (smtplib.SMTPException, OSError):
+			self._smtp.close()
+		self._smtp = None
+
+	def _reset(self, error: Exception) -> None:
+		"""Keep the connection after an SMTP reply error if it still answers RSET."""
+		if self._smtp is not None and isinstance(error, smtplib.SMTPResponseException):
+			try:
+				self._smtp.rset()
+				return
+			except (smtplib.SMTPException, OSError):
+				pass
+		self._disconnect()
+
+	def _message(self, report: Report) -> EmailMessage:
+		msg = EmailMessage()
+		msg["Subject"] = report.subject
+		msg["From"] = self.settings.sender
+		msg["To"] = "undisclosed-recipients:;"
+		msg["Date"] = formatdate(localtime=True)
+		msg["Message-ID"] = make_msgid(domain=self.settings.sender.rpartition("@")[2] or None)
+		msg.set_content(report.text)
+		msg.add_alternative(report.html, subtype="html")
+		return msg
+
+	def _update(self, delivery_id: str, **values: Any) -> None:
+		with self._lock:
+			self._deliveries[delivery_id].update(values)
+
+	def _send_batch(self, delivery_id: str, payload: bytes, batch: list[str]) -> dict[str, str]:
+		"""Send one batch with retries; returns the recipients that failed and why."""
+		for attempt in range(1, self.max_attempts + 1):
+			with self._lock:
+				self._deliveries[delivery_id]["attempts"] += 1
+			try:
+				refused = self._connection().sendmail(self.settings.sender, batch, payload)
+				return {r: f"{code} {reply.decode(errors='replace')}" for r, (code, reply) in refused.items()}
+			except Exception as e:
+				self._reset(e)
+				if not _transient(e) or attempt == self.max_attempts:
+					if isinstance(e, smtplib.SMTPRecipientsRefused):
+						return {r: f"{code} {reply.decode(errors='replace')}" for r, (code, reply) in e.recipients.items()}
+					return dict.fromkeys(batch, f"{type(e).__name__}: {e}")
+				if self._stop.wait(min(self.backoff * 2 ** (attempt - 1), self.max_backoff)):
+					return dict.fromkeys(batch, "Mailer stopped")
+		return {}
+
+	def _deliver(self, delivery_id: str, report: Report, recipients: list[str]) -> None:
+		self._update(delivery_id, status="sending")
+		payload = self._message(report).as_bytes()
+		failed: dict[str, str] = {}
+		for start in range(0, len(recipients), self.batch_size):
+			batch = recipients[start : start + self.batch_size]
+			batch_failed = self._send_batch(delivery_id, payload, batch)
+			failed.update(batch_failed)
+			with self._lock:
+				record = self._deliveries[delivery_id]
+				record["delivered"] += len(batch) - len(batch_failed)
+				record["failed"] = dict(failed)
+		delivered = len(recipients) - len(failed)
+		status = "sent" if not failed else ("partial" if delivered else "failed")
+		error = next(iter(failed.values())) if failed else None
+		self._update(delivery_id, status=status, error=error, finished_at=pd.Timestamp.now().isoformat(timespec="seconds"))
+		self._log(delivery_id)
+
+	def _log(self, delivery_id: str) -> None:
+		if self.log_path is None:
+			return
+		record = self.status(delivery_id)
+		self.log_path.parent.mkdir(parents=True, exist_ok=True)
+		with open(self.log_path, "a", encoding="utf-8") as fh:
+			fh.write(json.dumps(record) + "\n")
+
+
+_mailer: Optional[Mailer] = None
+_mailer_lock = threading.Lock()
+
+
+def get_mailer() -> Mailer:
+	"""Process-wide mailer configured from the environment."""
+	global _mailer
+	with _mailer_lock:
+		if _mailer is None:
+			_mailer = Mailer(SmtpSettings.from_env())
+		return _mailer
+
+
+def send_subscription_reports(
+	builder: ReportBuilder,
+	stakeholders: pd.DataFrame,
+	frequency: Optional[str] = None,
+	mailer: Optional[Mailer] = None,
+) -> list[str]:
+	"""Queue each stakeholder's report, narrowed to their subscription; returns the delivery ids.
+
+	Stakeholders with the same subscription share one rendered report and
+	one delivery. `frequency` sends only that digest.
+	"""
+	mailer = mailer or get_mailer()
+	rules = subscription_rules(stakeholders, frequency)
+	reports = builder.render_subscriptions(rules)
+	return [mailer.submit(report, emails) for report, emails in zip(reports, rules["emails"])]
+
+
+def main(argv: list[str] | None = None) -> None:
+	"""CLI: python -m utils.mailer [--frequency daily|weekly|monthly] [--dry-run], e.g. from cron."""
+	import argparse
+
+	from .stakeholder_functions import read_stakeholders
+
+	parser = argparse.ArgumentParser(description="Send every stakeholder the report for their subscription.")
+	parser.add_argument("--frequency", choices=FREQUENCIES, help="only stakeholders on this digest (default: all)")
+	parser.add_argument("--dry-run", action="store_true", help="list the reports and recipients without sending")
+	args = parser.parse_args(argv)
+
+	builder = ReportBuilder()
+	stakeholders = read_stakeholders()
+	if args.dry_run:
+		rules = subscription_rules(stakeholders, args.frequency)
+		for report, emails in zip(builder.render_subscriptions(rules), rules["emails"]):
+			print(f"{report.subject}: {len(clean_recipients(emails))} recipient(s)")
+		return
+	mailer = get_mailer()
+	if not mailer.settings.configured:
+		raise SystemExit("SMTP is not configured: set VOLT_GUARD_SMTP_HOST")
+	delivery_ids = send_subscription_reports(builder, stakeholders, args.frequency, mailer)
+	mailer.wait()
+	for delivery_id in delivery_ids:
+		record = mailer.status(delivery_id)
+		print(f"{record['subject']}: {record['status']}, {record['delivered']}/{record['recipients']} delivered")
+
+
+if __name__ == "__main__":
+	main()
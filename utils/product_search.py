@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .battery_index import TableView, normalize_product
+
+
+# Keys are lowercased UTF-8 wrapped in these markers, so every 1- and 2-byte
+# query is the start of some trigram (the end marker is doubled for that)
+# and "starts with" is just "contains ^q"
+START = b"\x01"
+END = b"\x02\x02"
+
+# Added or changed rows are kept in a small delta scanned directly; once it
+# (or the count of deleted rows) passes this share of the base, the base is
+# rebuilt from the live rows
+COMPACT_MIN = 1024
+COMPACT_RATIO = 0.05
+
+
+def search_key(product: object) -> Optional[bytes]:
+	value = normalize_product(product)
+	if value is None:
+		return None
+	return START + value.lower().encode("utf-8") + END
+
+
+def _query(text: str) -> bytes:
+	return str(text).strip().lower().encode("utf-8")
+
+
+def _trigram_postings(keys: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+	"""Sorted distinct trigram codes, their offsets into `rows`, and the rows holding each."""
+	width = keys.dtype.itemsize
+	if len(keys) == 0 or width < 3:
+		return np.empty(0, np.int32), np.zeros(1, np.int64), np.empty(0, np.int32)
+	b = keys.view(np.uint8).reshape(len(keys), width).astype(np.int32)
+	codes = (b[:, :-2] << 16) | (b[:, 1:-1] << 8) | b[:, 2:]
+	# Shorter keys are NUL-padded; a trigram is real if its last byte is
+	valid = b[:, 2:] != 0
+	rows = np.broadcast_to(np.arange(len(keys), dtype=np.int64)[:, None], codes.shape)[valid]
+	pairs = np.sort((codes[valid].astype(np.int64) << 32) | rows)
+	pairs = pairs[np.r_[True, pairs[1:] != pairs[:-1]]]
+	codes = (pairs >> 32).astype(np.int32)
+	starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+	return codes[starts], np.r_[starts, len(codes)].astype(np.int64), (pairs & 0xFFFFFFFF).astype(np.int32)
+
+
+class ProductSearch(TableView):
+	"""Case-insensitive substring, prefix and autocomplete lookups on product_number.
+
+	The base is a trigram index over the stripped, lowercased product
+	numbers: a query's trigrams are looked up and their row lists
+	intersected, and the few candidates are confirmed with a direct
+	substring test. Rows added, deleted or renamed after the build go to a
+	delta and a deleted-row mask, so writes never rebuild the index.
+	"""
+
+	def __init__(self):
+		super().__init__()
+		self._set_base(np.empty(0, np.int64), np.empty(0, "S1"), np.empty(0, object))
+
+	def _set_base(self, ids: np.ndarray, keys: np.ndarray, products: np.ndarray) -> None:
+		self.ids = ids
+		self.keys = keys
+		self.products = products
+		self.codes, self.offsets, self.postings = _trigram_postings(keys)
+		self.order = np.argsort(keys, kind="stable")
+		self.alive = np.ones(len(ids), dtype=bool)
+		self.dead = 0
+		self.row_of = dict(zip(ids.tolist(), range(len(ids))))
+		# id -> (key, product) for rows added or renamed since the build
+		self.delta: dict[int, tuple[bytes, str]] = {}
+
+	def build(self, df: pd.DataFrame) -> None:
+		df = df[df["id"].notna() & df["product_number"].notna()].drop_duplicates("id")
+		products = df["product_number"].astype("string").str.strip()
+		keys = (START.decode() + products.str.lower() + END.decode()).str.encode("utf-8")
+		self._set_base(
+			df["id"].to_numpy("int64"),
+			np.array(keys.tolist(), dtype=bytes) if len(keys) else np.empty(0, "S1"),
+			products.to_numpy(object),
+		)
+
+	def apply(self, old: Optional[dict], new: Optional[dict]) -> None:
+		old_key = search_key(old.get("product_number")) if old is not None else None
+		new_key = search_key(new.get("product_number")) if new is not None else None
+		if old is not None and new is not None and old_key == new_key:
+			return
+		if old is not None:
+			battery_id = int(old["id"])
+			self.delta.pop(battery_id, None)
+			row = self.row_of.pop(battery_id, None)
+			if row is not None:
+				self.alive[row] = False
+				self.dead += 1
+		if new is not None and new_key is not None:
+			self.delta[int(new["id"])] = (new_key, normalize_product(new["product_number"]))
+		limit = max(COMPACT_MIN, int(len(self.ids) * COMPACT_RATIO))
+		if len(self.delta) > limit or self.dead > limit:
+			self._compact()
+
+	def _compact(self) -> None:
+		live = self.alive
+		ids = np.r_[self.ids[live], np.fromiter(self.delta, np.int64, len(self.delta))]
+		keys = np.concatenate([self.keys[live], np.array([k for k, _ in self.delta.values()], dtype=bytes)])
+		products = np.r_[self.products[live], np.array([p for _, p in self.delta.values()], dtype=object)]
+		self._set_base(ids, keys, products)
+
+	def _posting(self, code: int) -> np.ndarray:
+		i = np.searchsorted(self.codes, code)
+		if i == len(self.codes) or self.codes[i] != code:
+			return self.postings[:0]
+		return self.postings[self.offsets[i] : self.offsets[i + 1]]
+
+	def _base_rows(self, q: bytes) -> np.ndarray:
+		"""Base rows (live or not) whose key contains `q`."""
+		if len(q) < 3:
+			# Every trigram starting with q: one contiguous run of codes
+			lo = int.from_bytes(q.ljust(3, b"\x00"), "big")
+			hi = int.from_bytes(q.ljust(3, b"\xff"), "big")
+			i = np.searchsorted(self.codes, lo, side="left")
+			j = np.searchsorted(self.codes, hi, side="right")
+			rows = self.postings[self.offsets[i] : self.offsets[j]]
+			if len(rows) * 16 < len(self.ids):
+				return np.unique(rows)
+			# Broad matches: mark a row mask rather than sort the union
+			mask = np.zeros(len(self.ids), dtype=bool)
+			mask[rows] = True
+			return np.flatnonzero(mask).astype(np.int32)
+		grams = {int.from_bytes(q[k : k + 3], "big") for k in range(len(q) - 2)}
+		lists = sorted((self._posting(code) for code in grams), key=len)
+		rows = lists[0]
+		for other in lists[1:]:
+			if not len(rows):
+				break
+			rows = np.intersect1d(rows, other, assume_unique=True)
+		if len(q) > 3 and len(rows):
+			# Trigrams can all occur without occurring in sequence
+			rows = rows[np.char.find(self.keys[rows], q) >= 0]
+		return rows
+
+	def _match(self, q: bytes) -> np.ndarray:
+		with self.lock:
+			rows = self._base_rows(q)
+			ids = self.ids[rows[self.alive[rows]]]
+			extra = [battery_id for battery_id, (key, _) in self.delta.items() if q in key]
+		if extra:
+			ids = np.r_[ids, np.array(extra, dtype=np.int64)]
+		return np.sort(ids)
+
+	def contains(self, text: str) -> np.ndarray:
+		"""Sorted ids of batteries whose product number contains `text` (any case)."""
+		q = _query(text)
+		if not q:
+			return np.sort(np.r_[self.ids[self.alive], np.fromiter(self.delta, np.int64, len(self.delta))])
+		return self._match(q)
+
+	def startswith(self, text: str) -> np.ndarray:
+		return self._match(START + _query(text))
+
+	def complete(self, text: str, limit: int = 10) -> list[str]:
+		"""Up to `limit` distinct product numbers starting with `text`, in sorted order."""
+		q = START + _query(text)
+		found: dict[bytes, str] = {}
+		with self.lock:
+			lo = np.searchsorted(self.keys, q, sorter=self.order, side="left")
+			hi = np.searchsorted(self.keys, q + b"\xff", sorter=self.order, side="left")
+			for row in self.order[lo:hi].tolist():
+				if len(found) >= limit:
+					break
+				if self.alive[row]:
+					found.setdefault(bytes(self.keys[row]), self.products[row])
+			for key, product in self.delta.values():
+				if key.startswith(q):
+					found.setdefault(key, product)
+		return [found[key] for key in sorted(found)[:limit]]
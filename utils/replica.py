@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+from .instrumentation import annotate
+
+
+# Schema metadata key holding the source table's version token
+VERSION_KEY = b"volt_guard.version"
+# Seconds the publisher waits after a wake-up, so a burst of commits is published once
+PUBLISH_DELAY = 0.2
+
+
+def _token(version: Any) -> str:
+	"""Version tokens (nested tuples) as a stable string; tuples and lists compare alike."""
+	return json.dumps(version, default=str)
+
+
+class _Mapped:
+	"""One memory-mapped snapshot file and the frame viewing it."""
+
+	def __init__(self, path: Path):
+		st = path.stat()
+		self.identity = (st.st_ino, st.st_mtime_ns, st.st_size)
+		self.source = pa.memory_map(str(path))
+		reader = pa.ipc.open_file(self.source)
+		metadata = reader.schema.metadata or {}
+		self.version = metadata.get(VERSION_KEY, b"").decode()
+		self.table = reader.read_all()
+		self._frame: Optional[pd.DataFrame] = None
+		self._frame_lock = threading.Lock()
+
+	def frame(self) -> pd.DataFrame:
+		"""The table as a DataFrame, converted once; numeric and string columns stay on the mapped pages."""
+		with self._frame_lock:
+			if self._frame is None:
+				self._frame = self.table.to_pandas(split_blocks=True)
+			return self._frame
+
+
+class ReadReplica:
+	"""Arrow IPC snapshots of committed tables, opened with memory mapping.
+
+	`publish()` writes a table to `<root>/<name>.arrow` tagged with the
+	source table's version token and swaps it in atomically. `read()` maps
+	the file and hands out a frame only when its tag matches the version
+	the caller is reading at, so a stale replica is never served: the caller
+	falls back to the primary read. The file is uncompressed Arrow, so
+	columns are used in place on the mapped pages: every session and every
+	process reading the same snapshot shares one copy in the page cache.
+	Frames already handed out keep their mapping alive after a newer
+	snapshot replaces the file.
+	"""
+
+	def __init__(self, root: str | Path):
+		self.root = Path(root)
+		self._lock = threading.Lock()
+		self._mapped: dict[str, _Mapped] = {}
+
+	def path(self, name: str) -> Path:
+		return self.root / f"{name}.arrow"
+
+	def publish(self, name: str, df: pd.DataFrame, version: Any) -> Path:
+		"""Write `df` as the snapshot of `name` at `version`."""
+		table = pa.Table.from_pandas(df, preserve_index=False)
+		table = table.replace_schema_metadata({**(table.schema.metadata or {}), VERSION_KEY: _token(version).encode()})
+		path = self.path(name)
+		path.parent.mkdir(parents=True, exist_ok=True)
+		tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+		try:
+			with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+				writer.write_table(table)
+			os.replace(tmp, path)
+		finally:
+			tmp.unlink(missing_ok=True)
+		return path
+
+	def _open(self, name: str) -> Optional[_Mapped]:
+		"""The current mapping of `name`, remapped when the file was replaced."""
+		path = self.path(name)
+		try:
+			st = path.stat()
+		except FileNotFoundError:
+			return None
+		with self._lock:
+			mapped = self._mapped.get(name)
+			if mapped is None or mapped.identity != (st.st_ino, st.st_mtime_ns, st.st_size):
+				try:
+					mapped = self._mapped[name] = _Mapped(path)
+				except (FileNotFoundError, pa.ArrowInvalid):
+					# Replaced or truncated while opening; the caller falls back
+					self._mapped.pop(name, None)
+					return None
+			return mapped
+
+	def published_version(self, name: str) -> Optional[str]:
+		"""Version token the snapshot of `name` was published at, if any."""
+		mapped = self._open(name)
+		return None if mapped is None else mapped.version
+
+	def is_current(self, name: str, version: Any) -> bool:
+		return self.published_version(name) == _token(version)
+
+	def read(self, name: str, version: Any) -> Optional[pd.DataFrame]:
+		"""The snapshot of `name` if it was published at `version`, else None."""
+		mapped = self._open(name)
+		if mapped is None or mapped.version != _token(version):
+			annotate(replica="miss")
+			return None
+		annotate(replica="hit")
+		return mapped.frame().copy(deep=False)
+
+	def iter_batches(self, name: str, version: Any, chunk_rows: int = 50_000) -> Optional[Iterator[pd.DataFrame]]:
+		"""The snapshot as frames of at most `chunk_rows` (zero-copy slices), or None if stale."""
+		mapped = self._open(name)
+		if mapped is None or mapped.version != _token(version):
+			annotate(replica="miss")
+			return None
+		annotate(replica="hit")
+		return _batches(mapped.table, chunk_rows)
+
+	def _latest(self, name: str) -> Optional[_Mapped]:
+		mapped = self._open(name)
+		if mapped is None or not mapped.version:
+			annotate(replica="miss")
+			return None
+		annotate(replica="hit")
+		return mapped
+
+	def latest(self, name: str) -> Optional[tuple[Any, pd.DataFrame]]:
+		"""The last published snapshot of `name`, whatever its version, and that version.
+
+		For append-only sources, where an older snapshot plus whatever was
+		appended after its version is still a complete read.
+		"""
+		mapped = self._latest(name)
+		if mapped is None:
+			return None
+		return json.loads(mapped.version), mapped.frame().copy(deep=False)
+
+	def latest_batches(self, name: str, chunk_rows: int = 50_000) -> Optional[tuple[Any, Iterator[pd.DataFrame]]]:
+		"""`latest` as frames of at most `chunk_rows`."""
+		mapped = self._latest(name)
+		if mapped is None:
+			return None
+		return json.loads(mapped.version), _batches(mapped.table, chunk_rows)
+
+	def close(self) -> None:
+		with self._lock:
+			self._mapped.clear()
+
+
+def _batches(table: pa.Table, chunk_rows: int) -> Iterator[pd.DataFrame]:
+	return (table.slice(start, chunk_rows).to_pandas(split_blocks=True) for start in range(0, table.num_rows, chunk_rows))
+
+
+class ReplicaPublisher:
+	"""Background thread that keeps a replica's snapshots current.
+
+	`sources` maps each snapshot name to `(version, load)`: the primary
+	table's current version token and a loader for it. After `wake()` the
+	thread republishes every snapshot whose version moved. A load is only
+	published if the version is unchanged across it; otherwise it is
+	retried at the next wake-up.
+	"""
+
+	def __init__(
+		self,
+		replica: ReadReplica,
+		sources: dict[str, tuple[Callable[[], Any], Callable[[], pd.DataFrame]]],
+		delay: float = PUBLISH_DELAY,
+	):
+		self.replica = replica
+		self.sources = sources
+		self.delay = delay
+		self.published = 0
+		self.errors = 0
+		self._wake = threading.Event()
+		self._thread: Optional[threading.Thread] = None
+		self._start_lock = threading.Lock()
+
+	def wake(self) -> None:
+		"""Ask for a publish pass, starting the thread on first use."""
+		self._wake.set()
+		if self._thread is not None and self._thread.is_alive():
+			return
+		with self._start_lock:
+			if self._thread is None or not self._thread.is_alive():
+				self._thread = threading.Thread(target=self._loop, name=f"replica:{self.replica.root.parent.name}", daemon=True)
+				self._thread.start()
+
+	def publish_now(self) -> int:
+		"""Republish every stale snapshot in the calling thread; returns how many were written."""
+		written = 0
+		for name, (version, load) in self.sources.items():
+			before = version()
+			if self.replica.is_current(name, before):
+				continue
+			df = load()
+			if _token(version()) != _token(before):
+				# Committed to meanwhile: the next pass picks up the newer version
+				self._wake.set()
+				continue
+			self.replica.publish(name, df, before)
+			written += 1
+		self.published += written
+		return written
+
+	def _loop(self) -> None:
+		while True:
+			self._wake.wait()
+			self._wake.clear()
+			self._wake.wait(self.delay)
+			self._wake.clear()
+			try:
+				self.publish_now()
+			except Exception:
+				# Readers fall back to the primary tables until a later pass succeeds
+				self.errors += 1
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import html
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .battery_functions import read_batteries, recent_checks, voltage_forecast
+from .kpis import voltage_buckets
+from .subscriptions import describe_rule, match_subscriptions
+from .thresholds import get_profiles
+
+
+# Forecast horizon included in emailed reports
+FORECAST_DAYS = 30
+# Window for the "recently checked" summary line
+ACTIVITY_DAYS = 7
+
+REPORT_COLUMNS = {
+	"id": "Battery ID",
+	"product_number": "Product Number",
+	"current_voltage": "Voltage",
+	"last_checked_date": "Last Checked",
+	"status": "Status",
+}
+
+
+@dataclass(frozen=True)
+class Report:
+	"""A rendered report: built once, then sent unchanged to every batch."""
+
+	subject: str
+	text: str
+	html: str
+	generated_at: pd.Timestamp
+	counts: dict[str, int] = field(default_factory=dict)
+
+
+def _section_frame(df: pd.DataFrame) -> pd.DataFrame:
+	out = df[[c for c in REPORT_COLUMNS if c in df.columns]].rename(columns=REPORT_COLUMNS)
+	if "Voltage" in out.columns:
+		out["Voltage"] = out["Voltage"].astype("float64").round(2)
+	if "Last Checked" in out.columns:
+		out["Last Checked"] = out["Last Checked"].dt.strftime("%Y-%m-%d").fillna("")
+	return out.astype("string").fillna("")
+
+
+def _forecast_frame(df: pd.DataFrame) -> pd.DataFrame:
+	return pd.DataFrame({
+		"Battery ID": df["id"],
+		"Product Number": df["product_number"],
+		"Voltage": df["current_voltage"].astype("float64").round(2),
+		"Critical On": df["critical_on"].dt.strftime("%Y-%m-%d"),
+		"Days Left": df["days_to_critical"].round().astype("int64"),
+	}).astype("string").fillna("")
+
+
+def _positions(batteries: pd.DataFrame, df: pd.DataFrame, id_column: str = "id") -> np.ndarray:
+	"""Row position in `batteries` of each row of `df`, by battery id (and site, when merged across sites); -1 if absent."""
+	keys = ["site"] if "site" in batteries.columns and "site" in df.columns else []
+	left = batteries[keys + ["id"]].assign(_pos=np.arange(len(batteries)))
+	right = df[keys + [id_column]].rename(columns={id_column: "id"})
+	return right.merge(left, on=keys + ["id"], how="left")["_pos"].fillna(-1).to_numpy("int64")
+
+
+class _Section:
+	"""One report table, formatted once: a text line and an HTML row per battery."""
+
+	def __init__(self, title: str, frame: pd.DataFrame, positions: np.ndarray):
+		self.title = title
+		self.positions = positions
+		self.columns = list(frame.columns)
+		lines = frame.to_string(index=False).splitlines() if not frame.empty else []
+		self.header = lines[0] if lines else ""
+		self.lines = np.array(lines[1:], dtype=object)
+		rows = pd.Series("    <tr>", index=frame.index, dtype="string")
+		for c in self.columns:
+			rows = rows + "<td>" + frame[c].map(html.escape) + "</td>"
+		self.rows = (rows + "</tr>").to_numpy(dtype=object)
+
+	def render(self, picked: Optional[np.ndarray] = None) -> tuple[int, str, str]:
+		"""(row count, text, html) for all rows, or the rows where `picked` is True."""
+		lines = self.lines if picked is None else self.lines[picked]
+		rows = self.rows if picked is None else self.rows[picked]
+		title = f"{self.title}: {len(lines)}"
+		if not len(lines):
+			return 0, f"{title}\n  none\n", f"<h3>{html.escape(title)}</h3>\n<p>None.</p>"
+		head = "".join(f"<th>{html.escape(str(c))}</th>" for c in self.columns)
+		table = (
+			f'<table border="0" class="dataframe">\n  <thead>\n    <tr style="text-align: right;">{head}</tr>\n  </thead>\n'
+			"  <tbody>\n" + "\n".join(rows) + "\n  </tbody>\n</table>"
+		)
+		text = "\n".join([title, self.header, *lines]) + "\n"
+		return len(lines), text, f"<h3>{html.escape(title)}</h3>\n{table}"
+
+
+class ReportBuilder:
+	"""Builds the report once, then cuts any number of narrower reports from it.
+
+	Every section row is formatted up front. A subset report only joins the
+	rows it keeps, so per-subscriber reports (see `render_subscriptions`)
+	cost little more than the full one. Pass frames the caller already
+	holds to avoid reading them again; `forecast` should be
+	`voltage_forecast(within_days=forecast_days)` and `recent`
+	`recent_checks(ACTIVITY_DAYS)`.
+	"""
+
+	def __init__(
+		self,
+		batteries: Optional[pd.DataFrame] = None,
+		forecast: Optional[pd.DataFrame] = None,
+		forecast_days: int = FORECAST_DAYS,
+		now: Optional[pd.Timestamp] = None,
+		recent: Optional[pd.DataFrame] = None,
+	):
+		batteries = read_batteries() if batteries is None else batteries
+		self.batteries = batteries.reset_index(drop=True)
+		self.forecast = voltage_forecast(within_days=forecast_days) if forecast is None else forecast
+		self.recent = recent_checks(ACTIVITY_DAYS) if recent is None else recent
+		self.forecast_days = forecast_days
+		self.now = pd.Timestamp.now() if now is None else now
+
+		df = self.batteries
+		profiles = get_profiles()
+		buckets = voltage_buckets(df["current_voltage"], df["product_number"]) if not df.empty else pd.Series(dtype="string")
+		red = df[buckets == "red"].sort_values("current_voltage")
+		yellow = df[buckets == "yellow"].sort_values("current_voltage")
+		self.sections = [
+			_Section(f"Critical ({profiles.label('red')})", _section_frame(red), red.index.to_numpy()),
+			_Section(f"Low ({profiles.label('yellow')})", _section_frame(yellow), yellow.index.to_numpy()),
+			_Section(
+				f"Going critical within {forecast_days} days",
+				_forecast_frame(self.forecast),
+				_positions(df, self.forecast) if not df.empty else np.full(len(self.forecast), -1),
+			),
+		]
+		# Recent checks per battery row, for the activity line of narrower reports
+		checked = _positions(df, self.recent, "battery_id") if not df.empty and not self.recent.empty else np.empty(0, dtype="int64")
+		self.checks = np.bincount(checked[checked >= 0], minlength=len(df))
+
+	def _report(self, picks: Optional[list[np.ndarray]], checks: int, checked: int, scope: Optional[str], digest: Optional[str]) -> Report:
+		stamp = self.now.strftime("%Y-%m-%d %H:%M")
+		rendered = [s.render(None if picks is None else p) for s, p in zip(self.sections, picks or [None] * len(self.sections))]
+		counts = {
+			"critical": rendered[0][0],
+			"low": rendered[1][0],
+			"forecast": rendered[2][0],
+			"checks": checks,
+			"checked_batteries": checked,
+		}
+		kind = f"{digest} digest" if digest else "report"
+		subject = f"Volt Guard {kind} {self.now:%Y-%m-%d}: {counts['critical']} critical, {counts['low']} low"
+		activity = f"{checks} checks on {checked} batteries in the last {ACTIVITY_DAYS} days"
+		intro = [f"Generated {stamp}"] + ([f"Covering {scope}"] if scope else []) + [activity]
+		text = [f"Volt Guard battery {kind}, generated {stamp}"] + intro[1:] + [""]
+		body = [f"<h2>Volt Guard battery {html.escape(kind)}</h2>" + "".join(f"<p>{html.escape(line)}</p>" for line in intro)]
+		for _, section_text, section_html in rendered:
+			text.append(section_text)
+			body.append(section_html)
+		return Report(subject=subject, text="\n".join(text), html="\n".join(body), generated_at=self.now, counts=counts)
+
+	def render(self) -> Report:
+		"""The full report: every battery."""
+		return self._report(None, len(self.recent), int(self.recent["battery_id"].nunique()), None, None)
+
+	def render_subscriptions(self, rules: pd.DataFrame) -> list[Report]:
+		"""One report per rule of `subscription_rules()`, in the same order.
+
+		The rules are matched in one pass against the batteries that appear in
+		any section or were checked recently, the only rows a report can show
+		or count. The per-rule section rows and activity counts are then read
+		off one boolean (rule x candidate) matrix.
+		"""
+		if rules.empty:
+			return []
+		in_report = self.checks > 0
+		for section in self.sections:
+			in_report[section.positions[section.positions >= 0]] = True
+		candidates = np.flatnonzero(in_report)
+		pairs = match_subscriptions(self.batteries.iloc[candidates], rules)
+		selected = np.zeros((len(rules), len(candidates)), dtype=bool)
+		selected[pairs["rule"].to_numpy(), pairs["row"].to_numpy()] = True
+
+		# Battery row -> candidate column; rows outside the table never match
+		column = np.full(len(self.batteries) + 1, len(candidates), dtype="int64")
+		column[candidates] = np.arange(len(candidates))
+		selected = np.hstack([selected, np.zeros((len(rules), 1), dtype=bool)])
+		picks = [selected[:, column[s.positions]] for s in self.sections]
+		checks = selected[:, :-1] @ self.checks[candidates]
+		checked = (selected[:, :-1] & (self.checks[candidates] > 0)).sum(axis=1)
+
+		reports = []
+		for i, (_, rule) in enumerate(rules.iterrows()):
+			scope = describe_rule(rule)
+			reports.append(self._report(
+				[p[i] for p in picks],
+				int(checks[i]),
+				int(checked[i]),
+				None if scope == "all batteries" else scope,
+				rule["frequency"],
+			))
+		return reports
+
+
+def render_report(
+	batteries: Optional[pd.DataFrame] = None,
+	forecast: Optional[pd.DataFrame] = None,
+	forecast_days: int = FORECAST_DAYS,
+	now: Optional[pd.Timestamp] = None,
+	recent: Optional[pd.DataFrame] = None,
+) -> Report:
+	"""Critical and low-voltage report (plus the critical forecast) as text and HTML.
+
+	Arguments as for `ReportBuilder`.
+	"""
+	return ReportBuilder(batteries, forecast, forecast_days, now, recent).render()
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+
+# Column kinds:
+#   int      nullable Int64
+#   float32  compact voltages; widened and rounded again on write
+#   datetime datetime64, unparseable values become NaT
+#   string   pandas string dtype
+#   product  string, surrounding whitespace stripped
+#   status   categorical over STATUSES plus any other value present
+STATUSES = ["active", "SPD", "production"]
+
+BATTERY_SCHEMA = {
+	"id": "int",
+	"product_number": "product",
+	"current_voltage": "float32",
+	"last_checked_date": "datetime",
+	"packing_month": "string",
+	"status": "status",
+	"total_checks": "int",
+}
+
+CHECK_SCHEMA = {
+	"id": "int",
+	"battery_id": "int",
+	"voltage_reading": "float32",
+	"voltage_during_check": "float32",
+	"checked_by": "string",
+	"notes": "string",
+	"checked_at": "datetime",
+}
+
+STAKEHOLDER_SCHEMA = {
+	"id": "int",
+	"name": "string",
+	"email": "string",
+	"product_prefixes": "string",
+	"statuses": "string",
+	"voltage_bands": "string",
+	"frequency": "string",
+}
+
+# Keyed by table name (the Excel file stem)
+SCHEMAS = {
+	"batteries": BATTERY_SCHEMA,
+	"battery_checks": CHECK_SCHEMA,
+	"stakeholders": STAKEHOLDER_SCHEMA,
+}
+
+# Decimal places kept when float32 columns are written back out
+FLOAT_DECIMALS = 4
+
+
+def schema_for(file_path: str | Path) -> Optional[dict[str, str]]:
+	return SCHEMAS.get(Path(file_path).stem)
+
+
+def _convert(series: pd.Series, kind: str) -> pd.Series:
+	if kind == "int":
+		if series.dtype == "Int64":
+			return series
+		return pd.to_numeric(series, errors="coerce").round().astype("Int64")
+	if kind == "float32":
+		if series.dtype == "float32":
+			return series
+		return pd.to_numeric(series, errors="coerce").astype("float32")
+	if kind == "datetime":
+		if pd.api.types.is_datetime64_any_dtype(series):
+			return series
+		return pd.to_datetime(series, errors="coerce", format="mixed")
+	if kind in ("string", "product"):
+		out = series if isinstance(series.dtype, pd.StringDtype) else series.astype("string")
+		return out.str.strip() if kind == "product" else out
+	if kind == "status":
+		if isinstance(series.dtype, pd.CategoricalDtype):
+			return series
+		values = series.astype("string")
+		extra = sorted(set(values.dropna().unique()) - set(STATUSES))
+		return values.astype(pd.CategoricalDtype(STATUSES + extra))
+	raise ValueError(f"Unknown column kind: {kind}")
+
+
+def apply_schema(df: pd.DataFrame, schema: Optional[dict[str, str]]) -> pd.DataFrame:
+	"""Coerce the schema's columns in `df` once, so consumers never re-convert."""
+	if not schema:
+		return df
+	columns = {c: _convert(df[c], kind) for c, kind in schema.items() if c in df.columns}
+	if not columns:
+		return df
+	return df.assign(**columns)
+
+
+def widen(data: pd.DataFrame | pd.Series, schema: Optional[dict[str, str]]) -> pd.DataFrame | pd.Series:
+	"""The schema's float32 columns (or a row's values) as float64, rounded to the stored decimals.
+
+	Voltages are kept as float32 in memory, and widened bare they show
+	binary noise (10.2 reads 10.199999809265137). Frames and rows handed
+	out of battery_functions, and everything written, go through here.
+	"""
+	columns = [c for c, kind in (schema or {}).items() if kind == "float32"]
+	if isinstance(data, pd.Series):
+		values = {c: conform_value(data[c], "float32") for c in columns if c in data.index}
+		if not values:
+			return data
+		row = data.copy()
+		for column, value in values.items():
+			row[column] = np.nan if value is None else value
+		return row
+	widened = {c: data[c].astype("float64").round(FLOAT_DECIMALS) for c in columns if c in data.columns}
+	return data.assign(**widened) if widened else data
+
+
+def to_storage(df: pd.DataFrame, schema: Optional[dict[str, str]]) -> pd.DataFrame:
+	"""Typed frame ready to write: schema enforced, float32 widened back to clean decimals."""
+	if not schema:
+		return df
+	return widen(apply_schema(df, schema), schema)
+
+
+def conform_value(value: Any, kind: str) -> Any:
+	"""Scalar counterpart of the schema, for single-row writes."""
+	if value is None or value is pd.NA or value is pd.NaT:
+		return None
+	if isinstance(value, float) and np.isnan(value):
+		return None
+	if kind == "int":
+		return int(value)
+	if kind == "float32":
+		return round(float(value), FLOAT_DECIMALS)
+	if kind == "datetime":
+		ts = pd.to_datetime(value, errors="coerce")
+		return None if ts is pd.NaT else ts
+	if kind == "product":
+		return str(value).strip()
+	return str(value)
+
+
+def conform_row(row: dict, schema: Optional[dict[str, str]]) -> dict:
+	if not schema:
+		return row
+	return {c: conform_value(v, schema[c]) if c in schema else v for c, v in row.items()}
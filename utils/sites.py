@@ -0,0 +1,339 @@
+"""Several warehouse data directories ("sites") served from one app.
+
+Sites are listed in `VOLT_GUARD_SITES` as comma-separated `name=path` pairs
+(relative paths are taken from the project root):
+
+    VOLT_GUARD_SITES=north=/srv/volt-guard/north,south=/srv/volt-guard/south
+
+Sites are served in-process: each call runs under `use_data_root(site
+root)`, so battery_functions finds that directory's tables, scan index,
+KPIs, journal, replica and writer thread (one set per directory, kept warm
+between calls) and hands back its frames as they are. The data directory
+is a context variable, not process state, so calls for different sites on
+different threads never see each other's directory. Reads across sites go
+to every site at once on a thread pool and are merged. Writes go through
+the site's single writer, which holds the directory's file lock like any
+other process writing there.
+Without `VOLT_GUARD_SITES` the app runs on `DATA_DIR` as before.
+"""
+from __future__ import annotations
+
+import contextvars
+import importlib
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable, Iterator, Optional
+
+import pandas as pd
+
+from .excel_handler import use_data_root
+from .instrumentation import span
+
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+ALL_SITES = "All sites"
+
+# battery_functions API a single site serves
+SITE_FUNCTIONS = frozenset({
+	"add_battery",
+	"battery_history",
+	"bulk_update_voltages",
+	"complete_product_number",
+	"dashboard_kpis",
+	"delete_battery",
+	"filter_inventory",
+	"handover_status",
+	"import_batteries",
+	"read_batteries",
+	"read_checks",
+	"recent_alerts",
+	"recent_checks",
+	"scan_battery",
+	"start_alerts",
+	"upcoming_alerts",
+	"update_voltage",
+	"voltage_forecast",
+})
+
+
+@dataclass(frozen=True)
+class Site:
+	name: str
+	root: Path
+
+
+def parse_sites(spec: str) -> list[Site]:
+	sites: dict[str, Site] = {}
+	for item in spec.split(","):
+		if not item.strip():
+			continue
+		name, sep, root = item.partition("=")
+		name, root = name.strip(), root.strip()
+		if not sep or not name or not root:
+			raise ValueError(f"Invalid site entry {item!r}: expected name=path")
+		if name in sites or name == ALL_SITES:
+			raise ValueError(f"Duplicate or reserved site name: {name}")
+		path = Path(root)
+		sites[name] = Site(name, (path if path.is_absolute() else BASE_DIR / path).resolve())
+	return list(sites.values())
+
+
+# --- site calls ------------------------------------------------------------
+
+def _call(root: Path, module: str, name: str, args: tuple, kwargs: dict) -> Any:
+	"""`module.name(*args, **kwargs)` on the data directory `root`."""
+	with use_data_root(root):
+		return getattr(importlib.import_module(f".{module}", __package__), name)(*args, **kwargs)
+
+
+def _next(root: Path, chunks: Iterator[pd.DataFrame]) -> Optional[pd.DataFrame]:
+	with use_data_root(root):
+		return next(chunks, None)
+
+
+# --- caller side -----------------------------------------------------------
+
+class SiteClient:
+	"""The battery_functions API of one site."""
+
+	def __init__(self, registry: "SiteRegistry", site: Site):
+		self.registry = registry
+		self.site = site
+
+	def _call(self, module: str, name: str, *args: Any, **kwargs: Any) -> Any:
+		return _call(self.site.root, module, name, args, kwargs)
+
+	def __getattr__(self, name: str) -> Callable[..., Any]:
+		if name not in SITE_FUNCTIONS:
+			raise AttributeError(name)
+
+		def call(*args: Any, **kwargs: Any) -> Any:
+			with span(f"sites.{name}", "site"):
+				return self._call("battery_functions", name, *args, **kwargs)
+
+		call.__name__ = name
+		return call
+
+	def export_bytes(self, dataset: str, fmt: str, filters: Optional[dict] = None) -> bytes:
+		return self._call("exports", "export_bytes", dataset, fmt, filters)
+
+
+class AllSites:
+	"""Reads fanned out to every site and merged, with a leading `site` column.
+
+	Ids are only unique within a site, so writes name their site with a
+	`site=` keyword (bulk readings with a `site` column) and are routed to it.
+	"""
+
+	def __init__(self, registry: "SiteRegistry"):
+		self.registry = registry
+
+	def _gather(self, name: str, *args: Any, **kwargs: Any) -> dict[str, Any]:
+		with span(f"sites.{name}", "site"):
+			futures = {
+				site: self.registry.submit(site, _call, "battery_functions", name, args, kwargs)
+				for site in self.registry.names
+			}
+			return {site: future.result() for site, future in futures.items()}
+
+	def _merged(self, name: str, *args: Any, **kwargs: Any) -> pd.DataFrame:
+		frames = [
+			df.assign(site=site)[["site", *df.columns]]
+			for site, df in self._gather(name, *args, **kwargs).items()
+		]
+		frames = [f for f in frames if not f.empty] or frames[:1]
+		if not frames:
+			return pd.DataFrame(columns=["site"])
+		df = pd.concat(frames, ignore_index=True)
+		df["site"] = df["site"].astype(pd.CategoricalDtype(self.registry.names))
+		return df
+
+	def read_batteries(self) -> pd.DataFrame:
+		return self._merged("read_batteries")
+
+	def filter_inventory(self, **filters: Any) -> pd.DataFrame:
+		return self._merged("filter_inventory", **filters)
+
+	def recent_checks(self, days: float = 7) -> pd.DataFrame:
+		return self._merged("recent_checks", days)
+
+	def voltage_forecast(self, within_days: Optional[float] = None) -> pd.DataFrame:
+		df = self._merged("voltage_forecast", within_days)
+		if "days_to_critical" in df.columns:
+			df = df.sort_values("days_to_critical", kind="stable", ignore_index=True)
+		return df
+
+	def upcoming_alerts(self, limit: int = 20) -> pd.DataFrame:
+		df = self._merged("upcoming_alerts", limit)
+		if "due_at" in df.columns:
+			df = df.sort_values("due_at", kind="stable", ignore_index=True).head(limit)
+		return df
+
+	def recent_alerts(self, limit: int = 50) -> pd.DataFrame:
+		df = self._merged("recent_alerts", limit)
+		if "raised_at" in df.columns:
+			df = df.sort_values("raised_at", ascending=False, kind="stable", ignore_index=True).head(limit)
+		return df
+
+	def start_alerts(self) -> None:
+		self._gather("start_alerts")
+
+	def dashboard_kpis(self) -> dict[str, int]:
+		totals: dict[str, int] = {}
+		for kpis in self._gather("dashboard_kpis").values():
+			for key, value in kpis.items():
+				totals[key] = totals.get(key, 0) + value
+		return totals
+
+	def scan_battery(self, identifier: str) -> Optional[pd.Series]:
+		"""First match in site order, with its `site`."""
+		for site, row in self._gather("scan_battery", identifier).items():
+			if row is not None:
+				return pd.concat([pd.Series({"site": site}, dtype=object), row])
+		return None
+
+	def complete_product_number(self, prefix: str, limit: int = 10) -> list[str]:
+		matches = set()
+		for found in self._gather("complete_product_number", prefix, limit).values():
+			matches.update(found)
+		return sorted(matches, key=lambda p: (p.lower(), p))[:limit]
+
+	def __getattr__(self, name: str) -> Callable[..., Any]:
+		# Everything not merged above (writes, one battery's history) goes to one site
+		if name not in SITE_FUNCTIONS:
+			raise AttributeError(name)
+
+		def call(*args: Any, site: Optional[str] = None, **kwargs: Any) -> Any:
+			if name == "bulk_update_voltages" and site is None:
+				return self._bulk_by_site(*args, **kwargs)
+			if site is None:
+				raise ValueError(f"Choose a site for {name}: battery ids are per site")
+			return getattr(self.registry.client(site), name)(*args, **kwargs)
+
+		call.__name__ = name
+		return call
+
+	def _bulk_by_site(self, readings: pd.DataFrame | list[dict], checked_by: Optional[str] = None) -> pd.DataFrame:
+		df = pd.DataFrame(readings)
+		if "site" not in df.columns:
+			raise ValueError("Readings for several sites need a site column")
+		unknown = set(df["site"].dropna().astype(str)) - set(self.registry.names)
+		if unknown or df["site"].isna().any():
+			raise ValueError(f"Unknown site(s): {', '.join(sorted(unknown)) or 'blank'}")
+		futures = {
+			site: self.registry.submit(site, _call, "battery_functions", "bulk_update_voltages", (rows.drop(columns="site"), checked_by), {})
+			for site, rows in df.groupby(df["site"].astype(str), sort=False)
+		}
+		results = []
+		for site, future in futures.items():
+			result = future.result()
+			results.append(result.assign(site=site)[["site", *result.columns]])
+		return pd.concat(results, ignore_index=True)
+
+	def _site_chunks(self, dataset: str, filters: Optional[dict]) -> Iterator[pd.DataFrame]:
+		from .exports import dataset_chunks
+
+		for site in self.registry.names:
+			root = self.registry.root(site)
+			# Each step of the site's generator runs on its data directory
+			chunks = dataset_chunks(dataset, filters)
+			while (chunk := _next(root, chunks)) is not None:
+				chunk = chunk.copy(deep=False)
+				chunk.insert(0, "site", site)
+				yield chunk
+
+	def export_bytes(self, dataset: str, fmt: str, filters: Optional[dict] = None) -> bytes:
+		"""One export across sites: every site's rows, site by site, streamed into one file."""
+		import tempfile
+
+		from .exports import SPOOL_BYTES, write_export
+
+		with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as out:
+			write_export(self._site_chunks(dataset, filters), fmt, out)
+			out.seek(0)
+			return out.read()
+
+
+class SiteRegistry:
+	"""Sites, and the threads that fan calls out to them."""
+
+	def __init__(self, sites: list[Site], max_workers: Optional[int] = None):
+		self.sites = {site.name: site for site in sites}
+		self.max_workers = max_workers
+		self._pool: Optional[ThreadPoolExecutor] = None
+		self._lock = threading.Lock()
+
+	@property
+	def names(self) -> list[str]:
+		return list(self.sites)
+
+	def __bool__(self) -> bool:
+		return bool(self.sites)
+
+	def register(self, name: str, root: str | Path) -> Site:
+		site = parse_sites(f"{name}={root}")[0]
+		with self._lock:
+			if name in self.sites:
+				raise ValueError(f"Site already registered: {name}")
+			self.sites[name] = site
+		return site
+
+	def root(self, name: str) -> Path:
+		if name not in self.sites:
+			raise ValueError(f"Unknown site: {name}")
+		return self.sites[name].root
+
+	def _executor(self) -> ThreadPoolExecutor:
+		with self._lock:
+			if self._pool is None:
+				workers = self.max_workers or min(32, 4 * max(len(self.sites), 1))
+				self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="site")
+			return self._pool
+
+	def submit(self, name: str, fn: Callable[..., Any], *args: Any) -> Future:
+		"""Run `fn(site root, *args)` on the pool, in the caller's trace."""
+		root = self.root(name)
+		return self._executor().submit(contextvars.copy_context().run, fn, root, *args)
+
+	def client(self, name: str) -> SiteClient:
+		if name not in self.sites:
+			raise ValueError(f"Unknown site: {name}")
+		return SiteClient(self, self.sites[name])
+
+	def all(self) -> AllSites:
+		return AllSites(self)
+
+	def close(self) -> None:
+		with self._lock:
+			pool, self._pool = self._pool, None
+		if pool is not None:
+			pool.shutdown(wait=True)
+
+
+_registry: Optional[SiteRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_sites() -> SiteRegistry:
+	"""Process-wide registry built from VOLT_GUARD_SITES (empty when unset)."""
+	global _registry
+	with _registry_lock:
+		if _registry is None:
+			_registry = SiteRegistry(parse_sites(os.environ.get("VOLT_GUARD_SITES", "")))
+		return _registry
+
+
+def battery_api(site: Optional[str] = None) -> ModuleType | SiteClient | AllSites:
+	"""Where battery calls should go: one site, all sites, or in-process when no sites are set up."""
+	registry = get_sites()
+	if not registry:
+		from . import battery_functions
+
+		return battery_functions
+	if site is None or site == ALL_SITES:
+		return registry.all()
+	return registry.client(site)
@@ -1,56 +1,107 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
 
 import pandas as pd
 
-from .excel_handler import DATA_DIR, ensure_file, generate_next_id, read_excel, write_excel
+from .excel_handler import (
+	DATA_DIR,
+	append_row,
+	delete_row,
+	ensure_file,
+	find_row,
+	generate_next_id,
+	read_excel,
+	update_row,
+	write_excel,
+)
+from .instrumentation import instrument_module
+from .subscriptions import SUBSCRIPTION_COLUMNS, normalize_subscription
+from .write_queue import serialized
 
 
 STAKEHOLDERS_XLSX = DATA_DIR / "stakeholders.xlsx"
+STAKEHOLDER_COLUMNS = ["id", "name", "email"] + SUBSCRIPTION_COLUMNS
 
 
 def ensure_stakeholders_file() -> None:
-	ensure_file(STAKEHOLDERS_XLSX, ["id", "name", "email"])
+	ensure_file(STAKEHOLDERS_XLSX, STAKEHOLDER_COLUMNS)
 
 
 def read_stakeholders() -> pd.DataFrame:
+	"""Stakeholders with their subscriptions; files written before subscriptions get empty ones."""
 	ensure_stakeholders_file()
-	return read_excel(STAKEHOLDERS_XLSX)
+	df = read_excel(STAKEHOLDERS_XLSX)
+	missing = [c for c in STAKEHOLDER_COLUMNS if c not in df.columns]
+	if missing:
+		df = df.assign(**{c: pd.Series(pd.NA, index=df.index, dtype="string") for c in missing})
+	return df
 
 
 def save_stakeholders(df: pd.DataFrame) -> None:
 	write_excel(df, STAKEHOLDERS_XLSX)
 
 
-def add_stakeholder(name: str, email: str) -> pd.Series:
-	df = read_stakeholders()
-	new_id = generate_next_id(df)
-	row = {"id": new_id, "name": name, "email": email}
-	df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-	save_stakeholders(df)
-	return df.loc[df["id"] == new_id].iloc[0]
-
-
-def update_stakeholder(stakeholder_id: int, name: Optional[str] = None, email: Optional[str] = None) -> pd.Series:
-	df = read_stakeholders()
-	if df.empty or stakeholder_id not in set(df["id"]):
-		raise ValueError("Stakeholder not found")
-	row_idx = df.index[df["id"] == stakeholder_id][0]
+@serialized
+def add_stakeholder(
+	name: str,
+	email: str,
+	product_prefixes: Any = None,
+	statuses: Any = None,
+	voltage_bands: Any = None,
+	frequency: Optional[str] = None,
+) -> pd.Series:
+	"""Add a stakeholder; the subscription fields are as for `normalize_subscription`."""
+	ensure_stakeholders_file()
+	subscription = normalize_subscription(product_prefixes, statuses, voltage_bands, frequency)
+	new_id = generate_next_id(STAKEHOLDERS_XLSX)
+	row = {"id": new_id, "name": name, "email": email, **subscription}
+	return append_row(STAKEHOLDERS_XLSX, row)
+
+
+@serialized
+def update_stakeholder(
+	stakeholder_id: int,
+	name: Optional[str] = None,
+	email: Optional[str] = None,
+	product_prefixes: Any = None,
+	statuses: Any = None,
+	voltage_bands: Any = None,
+	frequency: Optional[str] = None,
+) -> pd.Series:
+	"""Update the given fields; a subscription field left as None keeps its stored value."""
+	ensure_stakeholders_file()
+	values = {}
 	if name is not None:
-		df.at[row_idx, "name"] = name
+		values["name"] = name
 	if email is not None:
-		df.at[row_idx, "email"] = email
-	save_stakeholders(df)
-	return df.loc[df["id"] == stakeholder_id].iloc[0]
+		values["email"] = email
+	subscription = {
+		"product_prefixes": product_prefixes,
+		"statuses": statuses,
+		"voltage_bands": voltage_bands,
+		"frequency": frequency,
+	}
+	given = {c: v for c, v in subscription.items() if v is not None}
+	if given:
+		# Validate every given field; keep stored values for the rest
+		normalized = normalize_subscription(**subscription)
+		values.update({c: normalized[c] for c in given})
+	if not values:
+		found = find_row(STAKEHOLDERS_XLSX, stakeholder_id)
+	else:
+		found = update_row(STAKEHOLDERS_XLSX, stakeholder_id, values)
+	if found is None:
+		raise ValueError("Stakeholder not found")
+	return found
 
 
+@serialized
 def delete_stakeholder(stakeholder_id: int) -> bool:
-	df = read_stakeholders()
-	before = len(df)
-	df = df.loc[df["id"] != stakeholder_id]
-	save_stakeholders(df)
-	return len(df) < before
+	ensure_stakeholders_file()
+	return delete_row(STAKEHOLDERS_XLSX, stakeholder_id)
 
 
+# Every public function above is timed and counted when a trace is active
+instrument_module(__name__)
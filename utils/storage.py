@@ -0,0 +1,561 @@
+from __future__ import annotations
+
+import math
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, ContextManager, Iterable, Iterator, Optional
+
+import pandas as pd
+
+from .instrumentation import record_io
+
+
+# Columns that get a lookup index in engines that support one
+INDEXED_COLUMNS = ("id", "product_number", "battery_id")
+
+SQLITE_DB_NAME = "volt_guard.sqlite3"
+# Legacy check table: it only seeds the check journal, which holds the history since
+CHECKS_XLSX_NAME = "battery_checks.xlsx"
+# Per-table write counters kept in the SQLite database
+VERSIONS_TABLE = "_versions"
+
+
+def table_name(file_path: str | Path) -> str:
+	"""Tables are addressed by their Excel path; the stem is the table name."""
+	return Path(file_path).stem
+
+
+class StorageBackend:
+	"""Interface implemented by every storage engine.
+
+	Tables are addressed by the Excel file path used throughout `utils`, so
+	callers stay the same regardless of where the rows actually live.
+	"""
+
+	name = "base"
+
+	def ensure(self, file_path: str | Path, columns: list[str]) -> None:
+		raise NotImplementedError
+
+	def read(self, file_path: str | Path) -> pd.DataFrame:
+		raise NotImplementedError
+
+	def write(self, df: pd.DataFrame, file_path: str | Path) -> None:
+		raise NotImplementedError
+
+	def append(self, file_path: str | Path, rows: list[dict]) -> None:
+		raise NotImplementedError
+
+	def find(self, file_path: str | Path, key: Any, key_column: str = "id") -> Optional[pd.Series]:
+		raise NotImplementedError
+
+	def update(self, file_path: str | Path, key: Any, values: dict, key_column: str = "id") -> Optional[pd.Series]:
+		"""Update the first row matching `key` and return it, or None if missing."""
+		raise NotImplementedError
+
+	def update_many(self, file_path: str | Path, updates: pd.DataFrame, key_column: str = "id") -> int:
+		"""Apply one row of `updates` per key in a single write; returns rows updated."""
+		raise NotImplementedError
+
+	def delete(self, file_path: str | Path, key: Any, key_column: str = "id") -> int:
+		"""Delete rows matching `key` and return how many were removed."""
+		raise NotImplementedError
+
+	def max_id(self, file_path: str | Path, id_column: str = "id") -> int:
+		raise NotImplementedError
+
+	def version(self, file_path: str | Path) -> tuple:
+		"""Token that changes whenever the table's on-disk contents may have changed."""
+		raise NotImplementedError
+
+	def transaction(self, root: str | Path) -> ContextManager:
+		"""Group every write this thread makes under `root` into one commit.
+
+		Nested calls act as savepoints: an exception rolls back only the
+		inner block before propagating.
+		"""
+		return nullcontext()
+
+	def in_transaction(self) -> bool:
+		return False
+
+
+def _stat_token(*paths: Path) -> tuple:
+	token = []
+	for path in paths:
+		try:
+			st = path.stat()
+		except FileNotFoundError:
+			token.append(None)
+			continue
+		# The inode catches a file replaced by another of the same size within the mtime resolution
+		token.append((st.st_ino, st.st_mtime_ns, st.st_size))
+	return tuple(token)
+
+
+def _read_xlsx(path: str | Path) -> pd.DataFrame:
+	df = pd.read_excel(path)
+	record_io(bytes_read=Path(path).stat().st_size)
+	return df
+
+
+def _write_xlsx(df: pd.DataFrame, path: str | Path) -> None:
+	# Written aside and swapped in, so readers in other processes never see a half-written workbook
+	path = Path(path)
+	tmp = path.with_name(f".{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp{path.suffix}")
+	try:
+		df.to_excel(tmp, index=False)
+		os.replace(tmp, path)
+	finally:
+		tmp.unlink(missing_ok=True)
+	record_io(bytes_written=path.stat().st_size)
+
+
+def _frame_bytes(df: pd.DataFrame) -> int:
+	"""Rough payload size of rows moved through SQLite, which does not report its own I/O."""
+	return int(df.memory_usage(index=False).sum())
+
+
+class ExcelBackend(StorageBackend):
+	"""Whole-workbook storage: every mutation rewrites the xlsx file."""
+
+	name = "excel"
+
+	def __init__(self):
+		self._local = threading.local()
+
+	def _session(self) -> Optional[dict]:
+		return getattr(self._local, "session", None)
+
+	def in_transaction(self) -> bool:
+		return self._session() is not None
+
+	@contextmanager
+	def transaction(self, root: str | Path) -> Iterator[None]:
+		# Inside a transaction tables live in memory and are written once at commit
+		session = self._session()
+		if session is None:
+			self._local.session = {"tables": {}, "dirty": set()}
+			try:
+				yield
+				session = self._local.session
+				for path in session["dirty"]:
+					_write_xlsx(session["tables"][path], path)
+			finally:
+				self._local.session = None
+			return
+		saved = (dict(session["tables"]), set(session["dirty"]))
+		try:
+			yield
+		except BaseException:
+			session["tables"], session["dirty"] = saved
+			raise
+
+	def ensure(self, file_path: str | Path, columns: list[str]) -> None:
+		path = Path(file_path)
+		path.parent.mkdir(parents=True, exist_ok=True)
+		if not path.exists():
+			_write_xlsx(pd.DataFrame(columns=columns), path)
+
+	def read(self, file_path: str | Path) -> pd.DataFrame:
+		session = self._session()
+		if session is None:
+			return _read_xlsx(file_path)
+		path = Path(file_path)
+		if path not in session["tables"]:
+			session["tables"][path] = _read_xlsx(path)
+		return session["tables"][path].copy(deep=False)
+
+	def write(self, df: pd.DataFrame, file_path: str | Path) -> None:
+		session = self._session()
+		if session is None:
+			_write_xlsx(df, file_path)
+			return
+		path = Path(file_path)
+		session["tables"][path] = df.copy(deep=False)
+		session["dirty"].add(path)
+
+	def append(self, file_path: str | Path, rows: list[dict]) -> None:
+		df = self.read(file_path)
+		df = pd.concat([df, pd.DataFrame(rows)], ignore_index=True)
+		self.write(df, file_path)
+
+	def find(self, file_path: str | Path, key: Any, key_column: str = "id") -> Optional[pd.Series]:
+		df = self.read(file_path)
+		match = df.loc[df[key_column] == key]
+		if match.empty:
+			return None
+		return match.iloc[0]
+
+	def update(self, file_path: str | Path, key: Any, values: dict, key_column: str = "id") -> Optional[pd.Series]:
+		df = self.read(file_path)
+		if df.empty or key not in set(df[key_column]):
+			return None
+		row_idx = df.index[df[key_column] == key][0]
+		for column, value in values.items():
+			_assign(df, [row_idx], column, [value])
+		self.write(df, file_path)
+		return df.loc[row_idx]
+
+	def update_many(self, file_path: str | Path, updates: pd.DataFrame, key_column: str = "id") -> int:
+		df = self.read(file_path)
+		if df.empty or updates.empty:
+			return 0
+		# Label of the first row for each key, as the single-row update would pick
+		first = pd.Series(df.index, index=df[key_column]).groupby(level=0).first()
+		hits = updates.loc[updates[key_column].isin(first.index)].drop_duplicates(key_column, keep="last")
+		labels = first.loc[hits[key_column]].to_numpy()
+		for column in hits.columns:
+			if column != key_column:
+				_assign(df, labels, column, hits[column].to_numpy())
+		self.write(df, file_path)
+		return len(hits)
+
+	def delete(self, file_path: str | Path, key: Any, key_column: str = "id") -> int:
+		df = self.read(file_path)
+		before = len(df)
+		df = df.loc[df[key_column] != key]
+		self.write(df, file_path)
+		return before - len(df)
+
+	def max_id(self, file_path: str | Path, id_column: str = "id") -> int:
+		df = self.read(file_path)
+		if df.empty:
+			return 0
+		return int(df[id_column].max())
+
+	def version(self, file_path: str | Path) -> tuple:
+		return _stat_token(Path(file_path))
+
+
+def _assign(df: pd.DataFrame, labels, column: str, values) -> None:
+	"""Set cells, widening the column to object when the new values do not fit its dtype."""
+	try:
+		df.loc[labels, column] = values
+	except (TypeError, ValueError):
+		df[column] = df[column].astype(object)
+		df.loc[labels, column] = values
+
+
+def _to_sql(value: Any) -> Any:
+	"""Convert pandas/numpy scalars into values sqlite3 can bind."""
+	if value is None or value is pd.NaT or value is pd.NA:
+		return None
+	if isinstance(value, float) and math.isnan(value):
+		return None
+	if isinstance(value, (pd.Timestamp, datetime)):
+		return value.isoformat(sep=" ")
+	if isinstance(value, date):
+		return value.isoformat()
+	if hasattr(value, "item"):
+		return _to_sql(value.item())
+	return value
+
+
+def _quote(identifier: str) -> str:
+	return '"' + identifier.replace('"', '""') + '"'
+
+
+class SqliteBackend(StorageBackend):
+	"""Indexed SQLite storage with row-level updates.
+
+	One database file lives next to the Excel files it replaces, so a data
+	directory stays self-contained. On first use of a table the matching xlsx
+	(if any) is imported, which keeps existing `data/*.xlsx` files working.
+	"""
+
+	name = "sqlite"
+
+	def __init__(self, db_name: str = SQLITE_DB_NAME):
+		self.db_name = db_name
+		self._local = threading.local()
+
+	def db_path(self, file_path: str | Path) -> Path:
+		return Path(file_path).parent / self.db_name
+
+	def connect(self, file_path: str | Path) -> sqlite3.Connection:
+		"""Return this thread's connection to the database holding `file_path`."""
+		db = self.db_path(file_path)
+		conns = getattr(self._local, "conns", None)
+		if conns is None:
+			conns = self._local.conns = {}
+		conn = conns.get(db)
+		if conn is None:
+			db.parent.mkdir(parents=True, exist_ok=True)
+			conn = sqlite3.connect(db, timeout=30, isolation_level=None)
+			conn.execute("PRAGMA journal_mode=WAL")
+			conn.execute("PRAGMA synchronous=NORMAL")
+			conn.execute(
+				f"CREATE TABLE IF NOT EXISTS {_quote(VERSIONS_TABLE)} "
+				"(name TEXT PRIMARY KEY, version INTEGER NOT NULL)"
+			)
+			conns[db] = conn
+		return conn
+
+	def _conns(self) -> dict[Path, sqlite3.Connection]:
+		return getattr(self._local, "conns", {})
+
+	@contextmanager
+	def _atomic(self, conn: sqlite3.Connection) -> Iterator[None]:
+		"""BEGIN/COMMIT, or a savepoint when a transaction is already open."""
+		if conn.in_transaction:
+			conn.execute("SAVEPOINT vg_sp")
+			try:
+				yield
+			except BaseException:
+				conn.execute("ROLLBACK TO vg_sp")
+				conn.execute("RELEASE vg_sp")
+				raise
+			conn.execute("RELEASE vg_sp")
+			return
+		conn.execute("BEGIN IMMEDIATE")
+		try:
+			yield
+		except BaseException:
+			conn.execute("ROLLBACK")
+			raise
+		conn.execute("COMMIT")
+
+	def transaction(self, root: str | Path) -> ContextManager:
+		return self._atomic(self.connect(Path(root) / self.db_name))
+
+	def in_transaction(self) -> bool:
+		return any(conn.in_transaction for conn in self._conns().values())
+
+	def _bump(self, conn: sqlite3.Connection, table: str) -> None:
+		"""Advance `table`'s write counter; inside a write it commits or rolls back with the rows."""
+		conn.execute(
+			f"INSERT INTO {_quote(VERSIONS_TABLE)} (name, version) VALUES (?, 1) "
+			"ON CONFLICT(name) DO UPDATE SET version = version + 1",
+			(table,),
+		)
+
+	def _columns(self, conn: sqlite3.Connection, table: str) -> list[str]:
+		return [row[1] for row in conn.execute(f"PRAGMA table_info({_quote(table)})")]
+
+	def _ensure_table(self, conn: sqlite3.Connection, table: str, columns: Iterable[str]) -> None:
+		"""Create `table` or add any of `columns` it lacks, plus lookup indexes."""
+		columns = list(columns)
+		existing = set(self._columns(conn, table))
+		if not existing:
+			names = ", ".join(_quote(c) for c in columns)
+			conn.execute(f"CREATE TABLE IF NOT EXISTS {_quote(table)} ({names})")
+			self._bump(conn, table)
+		else:
+			missing = [c for c in columns if c not in existing]
+			for column in missing:
+				conn.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(column)}")
+			if missing:
+				self._bump(conn, table)
+		for column in INDEXED_COLUMNS:
+			if column in columns or column in existing:
+				conn.execute(
+					f"CREATE INDEX IF NOT EXISTS {_quote(f'ix_{table}_{column}')} "
+					f"ON {_quote(table)} ({_quote(column)})"
+				)
+
+	def _insert(self, conn: sqlite3.Connection, table: str, columns: list[str], rows: Iterable[Iterable[Any]]) -> None:
+		placeholders = ", ".join("?" for _ in columns)
+		names = ", ".join(_quote(c) for c in columns)
+		conn.executemany(
+			f"INSERT INTO {_quote(table)} ({names}) VALUES ({placeholders})",
+			([_to_sql(v) for v in row] for row in rows),
+		)
+
+	def ensure(self, file_path: str | Path, columns: list[str]) -> None:
+		conn = self.connect(file_path)
+		table = table_name(file_path)
+		created = not self._columns(conn, table)
+		self._ensure_table(conn, table, columns)
+		if created and Path(file_path).exists():
+			import_excel(file_path, backend=self)
+
+	def read(self, file_path: str | Path) -> pd.DataFrame:
+		conn = self.connect(file_path)
+		df = pd.read_sql_query(f"SELECT * FROM {_quote(table_name(file_path))} ORDER BY rowid", conn)
+		record_io(bytes_read=_frame_bytes(df))
+		return df
+
+	def write(self, df: pd.DataFrame, file_path: str | Path) -> None:
+		conn = self.connect(file_path)
+		table = table_name(file_path)
+		columns = [str(c) for c in df.columns]
+		with self._atomic(conn):
+			self._ensure_table(conn, table, columns)
+			conn.execute(f"DELETE FROM {_quote(table)}")
+			self._insert(conn, table, columns, df.itertuples(index=False, name=None))
+			self._bump(conn, table)
+		record_io(bytes_written=_frame_bytes(df))
+
+	def append(self, file_path: str | Path, rows: list[dict]) -> None:
+		if not rows:
+			return
+		conn = self.connect(file_path)
+		table = table_name(file_path)
+		columns = list(dict.fromkeys(c for row in rows for c in row))
+		with self._atomic(conn):
+			self._ensure_table(conn, table, columns)
+			self._insert(conn, table, columns, ([row.get(c) for c in columns] for row in rows))
+			self._bump(conn, table)
+
+	def find(self, file_path: str | Path, key: Any, key_column: str = "id") -> Optional[pd.Series]:
+		conn = self.connect(file_path)
+		df = pd.read_sql_query(
+			f"SELECT * FROM {_quote(table_name(file_path))} WHERE {_quote(key_column)} = ? ORDER BY rowid LIMIT 1",
+			conn,
+			params=(_to_sql(key),),
+		)
+		if df.empty:
+			return None
+		return df.iloc[0]
+
+	def update(self, file_path: str | Path, key: Any, values: dict, key_column: str = "id") -> Optional[pd.Series]:
+		conn = self.connect(file_path)
+		table = table_name(file_path)
+		assignments = ", ".join(f"{_quote(c)} = ?" for c in values)
+		params = [_to_sql(v) for v in values.values()] + [_to_sql(key)]
+		with self._atomic(conn):
+			self._ensure_table(conn, table, values)
+			cur = conn.execute(
+				f"UPDATE {_quote(table)} SET {assignments} WHERE rowid = "
+				f"(SELECT rowid FROM {_quote(table)} WHERE {_quote(key_column)} = ? ORDER BY rowid LIMIT 1)",
+				params,
+			)
+			if cur.rowcount:
+				self._bump(conn, table)
+		if cur.rowcount == 0:
+			return None
+		return self.find(file_path, key, key_column)
+
+	def update_many(self, file_path: str | Path, updates: pd.DataFrame, key_column: str = "id") -> int:
+		if updates.empty:
+			return 0
+		conn = self.connect(file_path)
+		table = table_name(file_path)
+		columns = [str(c) for c in updates.columns if c != key_column]
+		assignments = ", ".join(f"{_quote(c)} = ?" for c in columns)
+		params = (
+			[_to_sql(v) for v in row[1:]] + [_to_sql(row[0])]
+			for row in updates[[key_column] + columns].itertuples(index=False, name=None)
+		)
+		with self._atomic(conn):
+			self._ensure_table(conn, table, columns)
+			cur = conn.executemany(
+				f"UPDATE {_quote(table)} SET {assignments} WHERE rowid = "
+				f"(SELECT rowid FROM {_quote(table)} WHERE {_quote(key_column)} = ? ORDER BY rowid LIMIT 1)",
+				params,
+			)
+			if cur.rowcount:
+				self._bump(conn, table)
+		record_io(bytes_written=_frame_bytes(updates))
+		return cur.rowcount
+
+	def delete(self, file_path: str | Path, key: Any, key_column: str = "id") -> int:
+		conn = self.connect(file_path)
+		table = table_name(file_path)
+		with self._atomic(conn):
+			cur = conn.execute(f"DELETE FROM {_quote(table)} WHERE {_quote(key_column)} = ?", (_to_sql(key),))
+			if cur.rowcount:
+				self._bump(conn, table)
+		return cur.rowcount
+
+	def max_id(self, file_path: str | Path, id_column: str = "id") -> int:
+		conn = self.connect(file_path)
+		row = conn.execute(f"SELECT MAX({_quote(id_column)}) FROM {_quote(table_name(file_path))}").fetchone()
+		return int(row[0]) if row and row[0] is not None else 0
+
+	def version(self, file_path: str | Path) -> tuple:
+		# The table's own write counter, so writes to other tables in the database leave it alone;
+		# the inode tells a recreated database (whose counters restart) from the old one
+		db = self.db_path(file_path)
+		try:
+			inode = db.stat().st_ino
+		except FileNotFoundError:
+			return (None,)
+		row = self.connect(file_path).execute(
+			f"SELECT version FROM {_quote(VERSIONS_TABLE)} WHERE name = ?", (table_name(file_path),)
+		).fetchone()
+		return (inode, row[0] if row else 0)
+
+
+BACKENDS = {
+	ExcelBackend.name: ExcelBackend,
+	SqliteBackend.name: SqliteBackend,
+}
+
+
+def create_backend(name: str | None = None) -> StorageBackend:
+	"""Build the backend named by `name` or the VOLT_GUARD_STORAGE env var (default excel)."""
+	name = (name or os.environ.get("VOLT_GUARD_STORAGE") or ExcelBackend.name).strip().lower()
+	if name not in BACKENDS:
+		raise ValueError(f"Unknown storage backend: {name}")
+	return BACKENDS[name]()
+
+
+def import_excel(file_path: str | Path, backend: StorageBackend, source: str | Path | None = None) -> int:
+	"""Load an xlsx file (defaults to `file_path` itself) into `backend`; returns rows imported."""
+	df = pd.read_excel(source or file_path)
+	backend.write(df, file_path)
+	return len(df)
+
+
+def export_excel(file_path: str | Path, backend: StorageBackend, dest: str | Path | None = None) -> int:
+	"""Write a table from `backend` out as xlsx (defaults to `file_path`); returns rows exported."""
+	df = backend.read(file_path)
+	df.to_excel(dest or file_path, index=False)
+	return len(df)
+
+
+def export_checks(file_path: str | Path, dest: str | Path | None = None) -> int:
+	"""Write the check history of `file_path`'s data directory as xlsx; returns rows exported.
+
+	The rows come from the check journal (segments and monthly partitions),
+	streamed a chunk at a time, not from the stale legacy table.
+	"""
+	from .excel_handler import use_data_root
+	from .exports import dataset_chunks, write_export
+
+	rows = 0
+
+	def counted(chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+		nonlocal rows
+		for chunk in chunks:
+			rows += len(chunk)
+			yield chunk
+
+	with use_data_root(Path(file_path).parent), open(dest or file_path, "wb") as out:
+		write_export(counted(dataset_chunks("checks")), "xlsx", out)
+	return rows
+
+
+def main(argv: list[str] | None = None) -> None:
+	"""CLI: python -m utils.storage {import,export} [--backend sqlite] [xlsx ...]"""
+	import argparse
+
+	from .excel_handler import DATA_DIR, set_backend
+
+	parser = argparse.ArgumentParser(description="Move tables between Excel files and a storage backend.")
+	parser.add_argument("action", choices=["import", "export"])
+	parser.add_argument("files", nargs="*", help="xlsx table paths (default: all in the data directory)")
+	parser.add_argument("--backend", default=SqliteBackend.name)
+	args = parser.parse_args(argv)
+
+	# The check journal reads through the shared handler, so it must see the same engine
+	backend = set_backend(args.backend)
+	files = [Path(f) for f in args.files] or sorted(DATA_DIR.glob("*.xlsx"))
+	for path in files:
+		if args.action == "import":
+			count = import_excel(path, backend)
+		elif path.name == CHECKS_XLSX_NAME:
+			count = export_checks(path)
+		else:
+			count = export_excel(path, backend)
+		print(f"{args.action}ed {count} rows: {path}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import re
+from typing import Any, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .schema import STATUSES
+from .thresholds import BUCKETS, get_profiles
+
+
+# How often a stakeholder's digest is sent; blank means daily
+FREQUENCIES = ("daily", "weekly", "monthly")
+# Stakeholder columns holding a subscription, each a comma-separated list
+SUBSCRIPTION_COLUMNS = ["product_prefixes", "statuses", "voltage_bands", "frequency"]
+RULE_COLUMNS = ["prefixes", "statuses", "bands", "frequency"]
+
+_SPLIT = re.compile(r"[,;\n]")
+
+
+def _tokens(value: Any) -> list[str]:
+	if value is None or value is pd.NA or (isinstance(value, float) and value != value):
+		return []
+	if isinstance(value, (list, tuple, set)):
+		value = ",".join(str(v) for v in value)
+	return [t.strip() for t in _SPLIT.split(str(value)) if t.strip()]
+
+
+def _pick(value: Any, allowed: Iterable[str], what: str) -> list[str]:
+	"""Tokens of `value` matched case-insensitively against `allowed`, in `allowed` order."""
+	allowed = list(allowed)
+	canonical = {a.lower(): a for a in allowed}
+	picked = set()
+	for token in _tokens(value):
+		if token.lower() not in canonical:
+			raise ValueError(f"Unknown {what}: {token} (expected one of {', '.join(allowed)})")
+		picked.add(canonical[token.lower()])
+	return [a for a in allowed if a in picked]
+
+
+def _covering(prefixes: Iterable[str]) -> tuple[str, ...]:
+	"""Sorted prefixes without those another one already covers ("LFP" makes "LFP-12" redundant).
+
+	What remains selects disjoint ranges of sorted product numbers.
+	"""
+	kept: list[str] = []
+	for prefix in sorted(set(prefixes)):
+		if not kept or not prefix.startswith(kept[-1]):
+			kept.append(prefix)
+	return tuple(kept)
+
+
+def normalize_subscription(
+	product_prefixes: Any = None,
+	statuses: Any = None,
+	voltage_bands: Any = None,
+	frequency: Any = None,
+) -> dict[str, str]:
+	"""Subscription fields as stored on the stakeholder row; unknown values raise ValueError.
+
+	Each field takes a list or a comma-separated string. An empty field
+	places no restriction: a stakeholder with no subscription gets every
+	battery in the report.
+	"""
+	prefixes = list(dict.fromkeys(t.upper() for t in _tokens(product_prefixes)))
+	frequencies = _pick(frequency, FREQUENCIES, "frequency")
+	if len(frequencies) > 1:
+		raise ValueError("Choose one digest frequency")
+	return {
+		"product_prefixes": ", ".join(prefixes),
+		"statuses": ", ".join(_pick(statuses, STATUSES, "status")),
+		"voltage_bands": ", ".join(_pick(voltage_bands, BUCKETS, "voltage band")),
+		"frequency": frequencies[0] if frequencies else FREQUENCIES[0],
+	}
+
+
+def subscription_rules(stakeholders: pd.DataFrame, frequency: Optional[str] = None) -> pd.DataFrame:
+	"""Distinct subscriptions with the stakeholders sharing each.
+
+	One row per rule: `prefixes`, `statuses`, `bands` (tuples, empty for no
+	restriction), `frequency`, and the `stakeholder_ids` and `emails` that
+	subscribe to it. Rows with malformed values are read leniently: unknown
+	statuses and bands are dropped. `frequency` keeps only that digest.
+	Prefixes are upper-cased and matched without regard to case.
+	"""
+	columns = RULE_COLUMNS + ["stakeholder_ids", "emails"]
+	if stakeholders is None or stakeholders.empty:
+		return pd.DataFrame(columns=columns)
+	df = stakeholders.reindex(columns=["id", "email"] + SUBSCRIPTION_COLUMNS)
+
+	def known(value: Any, allowed: Iterable[str]) -> tuple[str, ...]:
+		tokens = {t.lower() for t in _tokens(value)}
+		return tuple(a for a in allowed if a.lower() in tokens)
+
+	rules = pd.DataFrame({
+		"prefixes": [_covering(t.upper() for t in _tokens(v)) for v in df["product_prefixes"]],
+		"statuses": [known(v, STATUSES) for v in df["statuses"]],
+		"bands": [known(v, BUCKETS) for v in df["voltage_bands"]],
+		"frequency": [(known(v, FREQUENCIES) or FREQUENCIES[:1])[0] for v in df["frequency"]],
+		"stakeholder_ids": df["id"].to_numpy(),
+		"emails": df["email"].to_numpy(),
+	})
+	if frequency is not None:
+		rules = rules[rules["frequency"] == frequency]
+	if rules.empty:
+		return pd.DataFrame(columns=columns)
+	return rules.groupby(RULE_COLUMNS, sort=False, as_index=False).agg({"stakeholder_ids": list, "emails": list})[columns]
+
+
+def _allowed(rules: pd.DataFrame) -> np.ndarray:
+	"""(rule, status code * len(BUCKETS) + band code) -> whether the rule admits that combination."""
+	status_ok = np.ones((len(rules), len(STATUSES) + 1), dtype=bool)
+	band_ok = np.ones((len(rules), len(BUCKETS)), dtype=bool)
+	for i, (statuses, bands) in enumerate(zip(rules["statuses"], rules["bands"])):
+		if statuses:
+			status_ok[i] = [s in statuses for s in STATUSES] + [False]
+		if bands:
+			band_ok[i] = [b in bands for b in BUCKETS]
+	return (status_ok[:, :, None] & band_ok[:, None, :]).reshape(len(rules), -1)
+
+
+def match_subscriptions(batteries: pd.DataFrame, rules: pd.DataFrame) -> pd.DataFrame:
+	"""Every (rule, row) pair where a rule in `rules` selects row `row` of `batteries`.
+
+	All rules are evaluated in one vectorized pass. Product numbers are
+	sorted once, so each prefix is a contiguous range found by binary
+	search. The ranges of every rule are expanded together into candidate
+	pairs, and a lookup table of admitted (status, band) combinations per
+	rule filters them. The work is proportional to the pairs produced, not
+	to rules x batteries. `rule` is the position in `rules`; `row` the
+	position in `batteries`.
+	"""
+	n, k = len(batteries), len(rules)
+	if n == 0 or k == 0:
+		return pd.DataFrame({"rule": np.empty(0, dtype="int64"), "row": np.empty(0, dtype="int64")})
+	keys = batteries["product_number"].astype("string").str.upper().fillna("").to_numpy(dtype=str)
+	order = np.argsort(keys, kind="stable")
+	ordered = keys[order]
+
+	# Statuses outside STATUSES (hand-edited files, blanks) get the extra code no rule admits
+	status = pd.Index(STATUSES).get_indexer(batteries["status"].astype(object)).astype("int64")
+	status[status < 0] = len(STATUSES)
+	# Classification codes are positions in BUCKETS, each under the battery's own profile
+	band = get_profiles().classify(batteries["current_voltage"], batteries["product_number"])
+	combo = status * len(BUCKETS) + band
+
+	# One (rule, prefix) pair per prefix; rules without prefixes span the whole table.
+	# A rule's covering prefixes select disjoint ranges, so no row is produced twice
+	covering = [_covering(p) or ("",) for p in rules["prefixes"]]
+	rule_of = np.repeat(np.arange(k), [len(p) for p in covering])
+	prefixes = np.array([p for ps in covering for p in ps], dtype=str)
+	lo = np.searchsorted(ordered, prefixes, side="left")
+	hi = np.searchsorted(ordered, np.char.add(prefixes, "\U0010ffff"), side="left")
+	lengths = hi - lo
+	total = int(lengths.sum())
+	rule = np.repeat(rule_of, lengths)
+	offset = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+	row = order[np.repeat(lo, lengths) + offset]
+
+	keep = _allowed(rules)[rule, combo[row]]
+	return pd.DataFrame({"rule": rule[keep], "row": row[keep]})
+
+
+def describe_rule(rule: pd.Series) -> str:
+	"""Short human-readable scope of a rule, e.g. "LFP*, active, red/yellow"."""
+	parts = []
+	if rule["prefixes"]:
+		parts.append(" ".join(f"{p}*" for p in rule["prefixes"]))
+	if rule["statuses"]:
+		parts.append("/".join(rule["statuses"]))
+	if rule["bands"]:
+		parts.append("/".join(rule["bands"]))
+	return ", ".join(parts) or "all batteries"
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import fnmatch
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .excel_handler import DATA_DIR, data_root
+
+
+# Default thresholds, for products no profile matches
+CRITICAL_VOLTAGE = 10.5
+LOW_VOLTAGE = 11.0
+
+# Classification codes are positions in BUCKETS: red < critical <= yellow < low <= green; gray if unknown
+BUCKETS = ("red", "yellow", "green", "gray")
+GRAY = BUCKETS.index("gray")
+
+# Threshold profiles, one file per data directory; VOLT_GUARD_PROFILES points every site at one shared file
+PROFILES_NAME = "voltage_profiles.json"
+_SHARED_PROFILES = os.environ.get("VOLT_GUARD_PROFILES")
+PROFILES_JSON = Path(_SHARED_PROFILES or DATA_DIR / PROFILES_NAME)
+
+_BUCKET_NAMES = np.array(BUCKETS, dtype=object)
+
+
+@dataclass(frozen=True)
+class ThresholdProfile:
+	"""Voltage thresholds for the products whose family or pattern matches.
+
+	`family` is the leading letters of a product number ("LFP" for
+	"LFP4821-000123"); `pattern` a shell-style glob on the whole number
+	("PN6*"). Both match without regard to case.
+	"""
+
+	name: str
+	critical: float
+	low: float
+	family: tuple[str, ...] = ()
+	pattern: tuple[str, ...] = ()
+
+	def __post_init__(self):
+		if not self.critical < self.low:
+			raise ValueError(f"Profile {self.name}: critical voltage must be below low voltage")
+
+	def regex(self) -> str:
+		"""One regex, matched from the start of upper-cased product numbers, for every family and pattern."""
+		parts = [f"{re.escape(f.upper())}(?![A-Z])" for f in self.family]
+		parts += [fnmatch.translate(p.upper()) for p in self.pattern]
+		return f"(?:{'|'.join(parts)})" if parts else "(?!)"
+
+
+DEFAULT_PROFILE = ThresholdProfile("default", CRITICAL_VOLTAGE, LOW_VOLTAGE)
+
+
+def _keys(product_numbers: Any) -> pd.Series:
+	keys = product_numbers if isinstance(product_numbers, pd.Series) else pd.Series(product_numbers, dtype=object)
+	return keys.astype("string").fillna("")
+
+
+class ThresholdProfiles:
+	"""Ordered profiles plus the default; the first profile that matches a product wins.
+
+	Classification is one pass over arrays: each product number resolves to
+	a profile code, its thresholds are gathered from a (profile, threshold)
+	table, and a reading's bucket is the number of thresholds it reaches.
+	Resolutions are cached by product number, so matching runs once per
+	product rather than once per read.
+	"""
+
+	def __init__(self, profiles: Iterable[ThresholdProfile] = (), default: ThresholdProfile = DEFAULT_PROFILE):
+		self.profiles = list(profiles)
+		self.default = default
+		names = [p.name for p in self.profiles]
+		if len(set(names)) != len(names) or default.name in names:
+			raise ValueError("Profile names must be unique")
+		everything = self.profiles + [default]
+		# (profile code, [critical, low]); the default is the last code
+		self.bounds = np.array([[p.critical, p.low] for p in everything], dtype="float64")
+		# Readings are stored as float32, so they are compared at that precision:
+		# 12.4 typed in and 12.4 read back from the table fall in the same bucket
+		self._limits = self.bounds.astype("float32")
+		self._patterns = [re.compile(p.regex()) for p in self.profiles]
+		self._lock = threading.Lock()
+		self._known = pd.Index([], dtype="string")
+		self._codes = np.empty(0, dtype="int64")
+
+	def __len__(self) -> int:
+		return len(self.profiles)
+
+	def _match(self, keys: pd.Series) -> np.ndarray:
+		# Python's re rather than the str accessor: Arrow's regex engine has no lookahead.
+		# `keys` arrive stripped and upper-cased; the cache itself is keyed by product numbers as stored
+		values = keys.tolist()
+		codes = np.full(len(values), len(self.profiles), dtype="int64")
+		# Last profile first, so earlier ones overwrite and the first match wins
+		for code in range(len(self.profiles) - 1, -1, -1):
+			match = self._patterns[code].match
+			codes[np.fromiter((match(k) is not None for k in values), dtype=bool, count=len(values))] = code
+		return codes
+
+	def resolve(self, product_numbers: Any) -> np.ndarray:
+		"""Profile code per product number; `len(self)` is the default profile."""
+		n = len(product_numbers)
+		if not self.profiles:
+			return np.full(n, 0, dtype="int64")
+		keys = _keys(product_numbers)
+		with self._lock:
+			known, codes = self._known, self._codes
+		position = known.get_indexer(keys)
+		missing = position < 0
+		if missing.any():
+			new = pd.Series(keys[missing].unique(), dtype="string")
+			with self._lock:
+				new = new[~new.isin(self._known)]
+				self._known = self._known.append(pd.Index(new, dtype="string"))
+				self._codes = np.concatenate([self._codes, self._match(new.str.strip().str.upper())])
+				known, codes = self._known, self._codes
+			position = known.get_indexer(keys)
+		return codes[position]
+
+	def classify(self, voltages: Any, product_numbers: Any = None) -> np.ndarray:
+		"""Bucket code (position in BUCKETS) per reading, under each product's profile."""
+		v = pd.to_numeric(pd.Series(voltages) if not isinstance(voltages, pd.Series) else voltages, errors="coerce")
+		v = v.to_numpy(dtype="float32", na_value=np.nan)
+		bounds = self._limits[-1] if product_numbers is None else self._limits[self.resolve(product_numbers)]
+		codes = (v[:, None] >= bounds).sum(axis=1)
+		codes[np.isnan(v)] = GRAY
+		return codes.astype("int64")
+
+	def buckets(self, voltages: Any, product_numbers: Any = None) -> np.ndarray:
+		return _BUCKET_NAMES[self.classify(voltages, product_numbers)]
+
+	def bucket(self, voltage: Any, product_number: Any = None) -> str:
+		try:
+			v = float(voltage)
+		except (TypeError, ValueError):
+			return "gray"
+		return self.buckets([v], None if product_number is None else [product_number])[0]
+
+	def critical(self, product_numbers: Any) -> np.ndarray:
+		"""Critical voltage per product number."""
+		return self.bounds[self.resolve(product_numbers), 0]
+
+	def label(self, bucket: str) -> str:
+		"""Voltage range of `bucket` under every profile, e.g. "<10.5V; 6V packs <5.25V"."""
+		def one(p: ThresholdProfile) -> str:
+			return {"red": f"<{p.critical:g}V", "yellow": f"{p.critical:g}-{p.low:g}V", "green": f">={p.low:g}V"}[bucket]
+
+		return "; ".join([one(self.default)] + [f"{p.name} {one(p)}" for p in self.profiles])
+
+	def frame(self) -> pd.DataFrame:
+		"""The profiles in match order, the default last."""
+		return pd.DataFrame({
+			"profile": [p.name for p in self.profiles] + [self.default.name],
+			"family": [", ".join(p.family) for p in self.profiles] + [""],
+			"pattern": [", ".join(p.pattern) for p in self.profiles] + [""],
+			"critical": self.bounds[:, 0],
+			"low": self.bounds[:, 1],
+		})
+
+
+def _strings(value: Any) -> tuple[str, ...]:
+	if value is None:
+		return ()
+	values = [value] if isinstance(value, str) else list(value)
+	return tuple(str(v).strip() for v in values if str(v).strip())
+
+
+def parse_profiles(doc: dict) -> ThresholdProfiles:
+	"""Profiles from `{"default": {...}, "profiles": [{...}, ...]}`; invalid entries raise ValueError.
+
+	Each profile has a `name`, `critical` and `low` voltage, and one or more
+	of `family` and `pattern` (a string or a list). `default` is optional.
+	"""
+	try:
+		default = doc.get("default") or {}
+		fallback = ThresholdProfile(
+			"default",
+			float(default.get("critical", CRITICAL_VOLTAGE)),
+			float(default.get("low", LOW_VOLTAGE)),
+		)
+		profiles = []
+		for i, entry in enumerate(doc.get("profiles") or []):
+			name = str(entry.get("name") or f"profile {i + 1}")
+			family, pattern = _strings(entry.get("family")), _strings(entry.get("pattern"))
+			if not family and not pattern:
+				raise ValueError(f"Profile {name}: give a family or a pattern")
+			profiles.append(ThresholdProfile(name, float(entry["critical"]), float(entry["low"]), family, pattern))
+	except KeyError as e:
+		raise ValueError(f"Voltage profile is missing {e}") from None
+	except (TypeError, AttributeError):
+		raise ValueError("Voltage profiles must be objects with numeric critical and low voltages") from None
+	return ThresholdProfiles(profiles, fallback)
+
+
+def load_profiles(path: str | Path = PROFILES_JSON) -> ThresholdProfiles:
+	"""Profiles from a JSON file; without the file every product uses the default thresholds."""
+	path = Path(path)
+	if not path.exists():
+		return ThresholdProfiles()
+	try:
+		doc = json.loads(path.read_text())
+	except json.JSONDecodeError as e:
+		raise ValueError(f"Invalid voltage profiles in {path.name}: {e}") from None
+	return parse_profiles(doc)
+
+
+# profiles file -> (stat token, profiles)
+_profiles: dict[Path, tuple[Any, ThresholdProfiles]] = {}
+_profiles_lock = threading.Lock()
+
+
+def profiles_path() -> Path:
+	"""Profiles file of the data directory in use (the shared file when one is set)."""
+	return PROFILES_JSON if _SHARED_PROFILES else data_root() / PROFILES_NAME
+
+
+def get_profiles() -> ThresholdProfiles:
+	"""Profiles of the data directory in use, reloaded when its profiles file changes.
+
+	The same object is returned until then, so views built with it can
+	tell from identity alone whether they are still current.
+	"""
+	path = profiles_path()
+	try:
+		st = path.stat()
+		token: Any = (st.st_mtime_ns, st.st_size)
+	except FileNotFoundError:
+		token = None
+	current = _profiles.get(path)
+	if current is not None and current[0] == token:
+		return current[1]
+	with _profiles_lock:
+		current = _profiles.get(path)
+		if current is None or current[0] != token:
+			current = _profiles[path] = (token, load_profiles(path))
+		return current[1]
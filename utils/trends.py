@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .check_journal import CheckJournal
+from .schema import CHECK_SCHEMA, apply_schema
+from .thresholds import CRITICAL_VOLTAGE
+
+
+# Check times are regressed as days since this epoch
+EPOCH = pd.Timestamp("2020-01-01")
+DAY = pd.Timedelta(days=1)
+
+# Per-battery least-squares sums; rollups merge by adding them
+SUM_COLUMNS = ["n", "sum_t", "sum_v", "sum_tt", "sum_tv"]
+# Span and most recent reading, merged by min/max
+EDGE_COLUMNS = ["first_t", "last_t", "last_v"]
+STAT_COLUMNS = SUM_COLUMNS + EDGE_COLUMNS
+
+# A slope needs this many checks spread over at least this many days
+MIN_CHECKS = 2
+MIN_SPAN_DAYS = 1.0
+# Crossings further out than this are not forecast
+MAX_FORECAST_DAYS = 3650
+
+
+def _empty_stats() -> pd.DataFrame:
+	return pd.DataFrame(
+		{c: pd.Series(dtype="float64") for c in STAT_COLUMNS},
+		index=pd.Index([], dtype="int64", name="battery_id"),
+	)
+
+
+def check_stats(checks: pd.DataFrame) -> pd.DataFrame:
+	"""Regression sums per battery for a batch of checks, in one grouped pass."""
+	df = checks[["battery_id", "checked_at", "voltage_reading"]].dropna()
+	if df.empty:
+		return _empty_stats()
+	t = ((df["checked_at"] - EPOCH) / DAY).to_numpy(dtype="float64")
+	v = df["voltage_reading"].to_numpy(dtype="float64")
+	frame = pd.DataFrame({
+		"battery_id": df["battery_id"].to_numpy(dtype="int64"),
+		"n": 1.0,
+		"sum_t": t,
+		"sum_v": v,
+		"sum_tt": t * t,
+		"sum_tv": t * v,
+		"first_t": t,
+		"last_t": t,
+		"last_v": v,
+	}).sort_values("last_t", kind="stable")
+	grouped = frame.groupby("battery_id", sort=False)
+	stats = grouped[SUM_COLUMNS].sum()
+	stats["first_t"] = grouped["first_t"].min()
+	stats[["last_t", "last_v"]] = grouped[["last_t", "last_v"]].last()
+	return stats[STAT_COLUMNS]
+
+
+def merge_stats(stats: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+	"""Fold `delta` into `stats`; only the batteries in `delta` change."""
+	if delta.empty:
+		return stats
+	if stats.empty:
+		return delta
+	added = delta.index.difference(stats.index)
+	out = pd.concat([stats, delta.loc[added]]) if len(added) else stats.copy()
+	seen = delta.index.intersection(stats.index)
+	if len(seen):
+		cur, inc = stats.loc[seen], delta.loc[seen]
+		out.loc[seen, SUM_COLUMNS] = cur[SUM_COLUMNS] + inc[SUM_COLUMNS]
+		out.loc[seen, "first_t"] = np.minimum(cur["first_t"], inc["first_t"])
+		newer = seen[(inc["last_t"] >= cur["last_t"]).to_numpy()]
+		out.loc[newer, ["last_t", "last_v"]] = delta.loc[newer, ["last_t", "last_v"]]
+	return out
+
+
+def fit(stats: pd.DataFrame, critical: float | pd.Series = CRITICAL_VOLTAGE, now: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+	"""Vectorized least-squares slope per battery and the date it reaches `critical`.
+
+	`critical` is one voltage, or one per battery id (batteries it lacks use
+	CRITICAL_VOLTAGE). The forecast extrapolates from the most recent
+	reading along the fitted slope. Batteries that are not discharging, are
+	already below `critical`, have too few checks or would take over
+	MAX_FORECAST_DAYS get no date.
+	"""
+	if isinstance(critical, pd.Series):
+		critical = critical.reindex(stats.index).fillna(CRITICAL_VOLTAGE).to_numpy("float64")
+	n = stats["n"].to_numpy()
+	st, sv = stats["sum_t"].to_numpy(), stats["sum_v"].to_numpy()
+	denom = n * stats["sum_tt"].to_numpy() - st * st
+	last_t, last_v = stats["last_t"].to_numpy(), stats["last_v"].to_numpy()
+	valid = (n >= MIN_CHECKS) & (last_t - stats["first_t"].to_numpy() >= MIN_SPAN_DAYS) & (denom > 0)
+	with np.errstate(divide="ignore", invalid="ignore"):
+		slope = np.where(valid, (n * stats["sum_tv"].to_numpy() - st * sv) / denom, np.nan)
+		falling = (slope < 0) & (last_v >= critical)
+		critical_t = np.where(falling, last_t + (last_v - critical) / -slope, np.nan)
+	critical_t[critical_t - last_t > MAX_FORECAST_DAYS] = np.nan
+	now = pd.Timestamp.now() if now is None else now
+	now_t = (now - EPOCH) / DAY
+	return pd.DataFrame(
+		{
+			"checks": n.astype("int64"),
+			"discharge_per_day": -slope,
+			"last_check": EPOCH + pd.to_timedelta(last_t, unit="D"),
+			"last_voltage": last_v,
+			"critical_voltage": np.broadcast_to(np.asarray(critical, dtype="float64"), n.shape),
+			"critical_on": EPOCH + pd.to_timedelta(critical_t, unit="D"),
+			"days_to_critical": np.clip(critical_t - now_t, 0, None),
+		},
+		index=stats.index,
+	)
+
+
+class VoltageTrends:
+	"""Rollup of per-battery regression sums over the check journal.
+
+	`refresh()` reads only checks newer than the last one folded in (the
+	watermark) and updates just the batteries they belong to. The rollup is
+	persisted next to the journal so a restart resumes from the watermark
+	instead of rescanning the history.
+	"""
+
+	def __init__(self, path: Optional[str | Path] = None):
+		self.path = Path(path) if path is not None else None
+		self.lock = threading.Lock()
+		self.stats = _empty_stats()
+		self.watermark = 0
+		self._loaded = False
+
+	def _load(self) -> None:
+		self._loaded = True
+		if self.path is None or not self.path.exists():
+			return
+		try:
+			table = pq.read_table(self.path)
+		except (OSError, pa.ArrowException):
+			return
+		stats = table.to_pandas()
+		if list(stats.columns) != STAT_COLUMNS:
+			return
+		self.stats = stats
+		self.watermark = int((table.schema.metadata or {}).get(b"watermark", b"0"))
+
+	def _save(self) -> None:
+		if self.path is None:
+			return
+		table = pa.Table.from_pandas(self.stats)
+		metadata = {**(table.schema.metadata or {}), b"watermark": str(self.watermark).encode()}
+		tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+		pq.write_table(table.replace_schema_metadata(metadata), tmp)
+		os.replace(tmp, self.path)
+
+	def refresh(self, journal: CheckJournal) -> int:
+		"""Fold in checks appended since the last refresh; returns how many."""
+		with self.lock:
+			if not self._loaded:
+				self._load()
+			new = apply_schema(journal.read_since(self.watermark), CHECK_SCHEMA)
+			if new.empty:
+				return 0
+			self.stats = merge_stats(self.stats, check_stats(new))
+			self.watermark = int(new["id"].max())
+			self._save()
+			return len(new)
+
+	def rebuild(self, journal: CheckJournal) -> None:
+		with self.lock:
+			self._loaded = True
+			self.stats, self.watermark = _empty_stats(), 0
+		self.refresh(journal)
+
+	def forecast(self, critical: float | pd.Series = CRITICAL_VOLTAGE, now: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+		with self.lock:
+			stats = self.stats
+		return fit(stats, critical, now)
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import contextvars
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from .excel_handler import DATA_DIR, AfterCommitError, data_root, deferred_count, transaction
+from .file_lock import FileLock, file_lock
+from .instrumentation import add_span, collect
+
+
+LOCK_FILE_NAME = ".volt_guard.lock"
+
+
+class WriteQueue:
+	"""Single writer thread that applies mutations from every session.
+
+	Mutations are queued as callables. The writer takes everything waiting
+	(up to `max_batch`), runs it inside one storage transaction while holding
+	the data directory's advisory lock, and commits once: concurrent writers
+	share a commit instead of each rewriting the tables. Each mutation runs in
+	its own savepoint, so one that raises is rolled back and reported to its
+	caller without affecting the rest of the group; check rows it journaled
+	are dropped with it, since journal appends wait for the commit. Because
+	ids are assigned on the writer under the lock, they are never handed out
+	twice. If a journal append still fails after the commit, only the callers
+	whose appends failed get the AfterCommitError; their changes stay saved.
+	"""
+
+	def __init__(self, root: str | Path = DATA_DIR, max_batch: int = 128):
+		self.root = Path(root)
+		self.max_batch = max_batch
+		self.lock: FileLock = file_lock(self.root / LOCK_FILE_NAME)
+		self.commits = 0
+		self.mutations = 0
+		self._queue: queue.Queue = queue.Queue()
+		self._thread: Optional[threading.Thread] = None
+		self._start_lock = threading.Lock()
+
+	def _ensure_started(self) -> None:
+		if self._thread is not None and self._thread.is_alive():
+			return
+		with self._start_lock:
+			if self._thread is None or not self._thread.is_alive():
+				self._thread = threading.Thread(target=self._loop, name=f"writer:{self.root.name}", daemon=True)
+				self._thread.start()
+
+	def submit(self, fn: Callable, *args: Any, **kwargs: Any) -> Future:
+		future: Future = Future()
+		self._ensure_started()
+		# The mutation runs in the caller's context, so its trace sees the writer's work
+		self._queue.put((future, contextvars.copy_context(), fn, args, kwargs))
+		return future
+
+	def run(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+		"""Submit and wait. Mutations issued from the writer itself run inline."""
+		if threading.current_thread() is self._thread:
+			return fn(*args, **kwargs)
+		return self.submit(fn, *args, **kwargs).result()
+
+	def _loop(self) -> None:
+		while True:
+			batch = [self._queue.get()]
+			while len(batch) < self.max_batch:
+				try:
+					batch.append(self._queue.get_nowait())
+				except queue.Empty:
+					break
+			self._commit(batch)
+
+	def _commit(self, batch: list) -> None:
+		outcomes: list[tuple[bool, Any]] = []
+		# Positions of each mutation's after_commit callbacks: [start, end)
+		spans: list[tuple[int, int]] = []
+		started = time.perf_counter()
+		try:
+			with collect("write_queue.commit") as commit, self.lock, transaction(self.root):
+				for future, ctx, fn, args, kwargs in batch:
+					mark = deferred_count()
+					if not future.set_running_or_notify_cancel():
+						outcomes.append((False, None))
+					else:
+						try:
+							with transaction(self.root):
+								outcomes.append((True, ctx.run(fn, *args, **kwargs)))
+						except Exception as e:
+							outcomes.append((False, e))
+					spans.append((mark, deferred_count()))
+		except AfterCommitError as e:
+			# Committed: callers whose deferred work failed learn that, the rest get their results
+			failed = set(e.failed)
+			for i, (start, end) in enumerate(spans):
+				if outcomes[i][0] and failed.intersection(range(start, end)):
+					outcomes[i] = (False, e)
+		except BaseException as e:
+			# The commit itself failed: nothing in the group was applied
+			for future, *_ in batch:
+				if not future.done():
+					future.set_exception(e)
+			return
+		self.commits += 1
+		self.mutations += len(batch)
+		# Each caller's trace gets the shared commit (lock wait and final write)
+		duration = time.perf_counter() - started
+		for _, ctx, *_ in batch:
+			ctx.run(add_span, "write_queue.commit", "io", duration, len(batch), commit.bytes_written)
+		for (future, *_), (ok, value) in zip(batch, outcomes):
+			if future.done():
+				continue
+			if ok:
+				future.set_result(value)
+			else:
+				future.set_exception(value)
+
+
+_writers: dict[Path, WriteQueue] = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(root: Optional[str | Path] = None) -> WriteQueue:
+	"""Process-wide writer for a data directory (default: `data_root()`)."""
+	root = Path(data_root() if root is None else root).resolve()
+	with _writers_lock:
+		writer = _writers.get(root)
+		if writer is None:
+			writer = _writers[root] = WriteQueue(root)
+		return writer
+
+
+def serialized(fn: Callable) -> Callable:
+	"""Route calls to `fn` through the single writer of the data directory in use.
+
+	The call runs on the writer in the caller's context, so it works on the
+	same data directory.
+	"""
+
+	@functools.wraps(fn)
+	def wrapper(*args: Any, **kwargs: Any) -> Any:
+		return get_writer().run(fn, *args, **kwargs)
+
+	return wrapper